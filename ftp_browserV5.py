@@ -1,21 +1,3899 @@
 import sys
 import os
-from ftplib import FTP
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QListWidget, QDialog, 
+import errno
+import re
+import fnmatch
+import json
+import calendar
+import posixpath
+import socket
+import ssl
+import contextlib
+import functools
+import heapq
+import mmap
+from bisect import bisect_right
+import operator
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import Sequence
+from itertools import compress, repeat, islice, accumulate
+import threading
+import time
+try:
+    import fcntl
+except ImportError:  # Windows: sem clonagem de arquivos (reflink)
+    fcntl = None
+from queue import Queue, Empty
+from ftplib import FTP, FTP_TLS, Error, error_perm, error_temp, error_reply, error_proto, parse150, parse227, parse229
+# Instante de início do arranque, lido antes de carregar o PyQt (a maior parte de um arranque a frio)
+STARTUP_STARTED = time.perf_counter()
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QListWidget, QListWidgetItem, QDialog,  # noqa: E402
                              QPushButton, QFileDialog, QMessageBox, QLineEdit, QTabWidget, 
                              QWidget, QHBoxLayout, QLabel, QInputDialog, QMenu, QAction, 
-                             QDockWidget, QToolBar)
-from PyQt5.QtCore import Qt
+                             QDockWidget, QToolBar, QCheckBox, QTreeView, QComboBox, QHeaderView,
+                             QProgressDialog, QTreeWidget, QTreeWidgetItem, QAbstractItemView, QPlainTextEdit,
+                             QSpinBox, QSplitter)
+from PyQt5.QtGui import QPixmap, QFontDatabase  # noqa: E402
+from PyQt5.QtCore import (Qt, QObject, QSettings, QTimer, QAbstractTableModel, QAbstractItemModel, QModelIndex,  # noqa: E402
+                          QThread, pyqtSignal, QMimeData, QEvent, QItemSelection, QItemSelectionModel)
 
-# Classe que gerencia a conexão FTP e a exibição do diretório atual
-class FTPClient(QDialog):
-    def __init__(self, parent=None, ftp_host="", ftp_user="anonymous", ftp_passwd="", ftp_port=21):
+# Diretório de configuração do utilizador (segue XDG_CONFIG_HOME quando definido)
+CONFIG_DIR = os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config"),
+                          "ftp_browser")
+# Diretório de cache do utilizador (segue XDG_CACHE_HOME quando definido)
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                         "ftp_browser")
+# Ficheiro CSV usado pelas versões anteriores para o histórico de conexões
+LEGACY_HISTORY_FILE = "connection_history.txt"
+# Número máximo de entradas mantidas no histórico de conexões
+MAX_HISTORY_ENTRIES = 500
+# Número de entradas carregadas de cada vez no diálogo de histórico
+HISTORY_PAGE_SIZE = 100
+# Tempo máximo (em segundos) de espera pelas operações de rede das sessões FTP
+FTP_TIMEOUT = 30
+# Tempo (em segundos) sem atividade após o qual a conexão é verificada com NOOP antes de ser usada
+KEEPALIVE_PROBE_INTERVAL = 60
+# Número máximo de conexões abertas ao mesmo host (muitos servidores limitam as conexões por IP)
+MAX_CONNECTIONS_PER_HOST = 4
+# Número máximo de conexões abertas ao todo, somando todas as abas e hosts
+MAX_CONNECTIONS_TOTAL = 12
+# Prioridades dos pedidos de conexão: a navegação passa à frente das transferências e do trabalho em segundo plano
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+# Intervalo (em segundos) com que uma sessão parada verifica se outro pedido espera pela sua vaga
+SCHEDULER_YIELD_INTERVAL = 1
+# Utilizadores das contas anónimas, que não precisam de palavra-passe
+ANONYMOUS_USERS = ("", "anonymous", "ftp")
+# Número máximo de sessões pré-conectadas mantidas em segundo plano
+WARMUP_MAX_SESSIONS = 3
+# Tempo (em segundos) após o qual uma sessão pré-conectada não usada é fechada
+WARMUP_IDLE_TIMEOUT = 120
+# Número de conexões usadas em paralelo para percorrer diretórios remotos
+DIRECTORY_WALK_WORKERS = 4
+# Número máximo de listagens remotas guardadas na cache e tempo (em segundos) durante o qual são válidas
+LISTING_CACHE_MAX_ENTRIES = 512
+LISTING_CACHE_TTL = 120
+# Memória máxima (em MB) ocupada pelos textos (nomes e linhas do LIST) de cada listagem; o resto vai para disco
+LISTING_MEMORY_LIMIT_MB = 64
+# Número de textos descodificados de cada vez ao percorrer uma coluna de textos
+TEXT_COLUMN_BATCH = 65536
+# Espera (em milissegundos) após a última tecla antes de aplicar o filtro de nomes
+FILTER_DEBOUNCE_DELAY = 150
+# Número máximo de subdiretórios pré-carregados por cada diretório visitado
+PREFETCH_MAX_DIRECTORIES = 32
+# Espera (em milissegundos) após a navegação antes de começar a pré-carregar
+PREFETCH_IDLE_DELAY = 300
+# Número máximo de comandos enviados sem esperar pela resposta nas operações em lote
+PIPELINE_WINDOW = 16
+# Número de comandos que cada conexão de trabalho executa de cada vez na exclusão recursiva
+DELETE_BATCH_SIZE = 64
+# Capacidade (em bytes) do buffer circular usado ao copiar entre servidores através do cliente
+RELAY_BUFFER_SIZE = 4 * 1024 * 1024
+# Tamanho dos blocos lidos e escritos ao copiar entre servidores através do cliente
+RELAY_BLOCK_SIZE = 64 * 1024
+# Número de bytes do início (ou do fim) de um arquivo obtidos para a pré-visualização de texto
+PREVIEW_BYTES = 64 * 1024
+# Número máximo de bytes obtidos para pré-visualizar uma imagem
+PREVIEW_IMAGE_BYTES = 4 * 1024 * 1024
+# Total de bytes mantidos em memória pela cache de pré-visualizações
+PREVIEW_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Extensões de arquivo pré-visualizadas como imagem
+PREVIEW_IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "bmp", "webp", "ico", "svg"}
+# Tamanho máximo (em MB) predefinido da cache local de downloads
+DOWNLOAD_CACHE_MAX_MB = 1024
+# Tamanho (em bytes) dos blocos comparados ao atualizar por diferenças um arquivo já descarregado
+DELTA_BLOCK_SIZE = 4 * 1024 * 1024
+# Amostras (posições e tamanho em bytes) comparadas quando o servidor não calcula resumos por intervalo
+DELTA_SAMPLES = 8
+DELTA_SAMPLE_SIZE = 64 * 1024
+# Algoritmos de resumo do comando HASH, com o nome correspondente no hashlib
+HASH_ALGORITHMS = {"SHA-1": "sha1", "SHA-256": "sha256", "SHA-512": "sha512", "MD5": "md5"}
+# Modos de abertura das conexões de dados, pela ordem de preferência predefinida
+TRANSFER_MODES = ("EPSV", "PASV", "ACTIVE")
+# Nomes dos modos de conexão de dados apresentados ao utilizador (None = negociação automática)
+TRANSFER_MODE_LABELS = {None: "Auto", "EPSV": "Extended passive (EPSV)", "PASV": "Passive (PASV)",
+                        "ACTIVE": "Active (PORT/EPRT)"}
+# Número de transferências da fila executadas em simultâneo
+TRANSFER_WORKERS = 2
+# Novas tentativas automáticas de um upload interrompido e espera (em segundos) antes da primeira, que duplica
+# a cada tentativa
+UPLOAD_RETRIES = 5
+UPLOAD_RETRY_DELAY = 2
+# Intervalo (em segundos) entre os registos da posição das transferências em curso no diário
+JOURNAL_CHECKPOINT_INTERVAL = 2
+# Intervalo (em segundos) entre as atualizações do progresso das transferências na interface
+TRANSFER_PROGRESS_INTERVAL = 0.25
+# Tamanho (em bytes) do diário de transferências a partir do qual é compactado
+JOURNAL_COMPACT_BYTES = 256 * 1024
+# Atraso (em milissegundos) antes de atualizar os painéis depois de transferências terminadas (agrupa as atualizações)
+TRANSFER_REFRESH_DELAY = 500
+# Pedido ioctl FICLONE do Linux, que clona um arquivo partilhando os blocos (reflink em Btrfs/XFS)
+FICLONE = 0x40049409
+# Tempo máximo (em milissegundos) entre o arranque e a primeira pintura da janela em --benchmark-startup
+STARTUP_BUDGET_MS = 1000
+# Variável de ambiente com o instante (time.perf_counter) em que --benchmark-startup lançou o processo medido
+STARTUP_ORIGIN_VARIABLE = "FTP_BROWSER_STARTUP_ORIGIN"
+# Variável de ambiente que liga o registo de spans desde o arranque e indica o ficheiro de trace a escrever
+TRACE_ENV_VAR = "FTP_BROWSER_TRACE"
+# Número máximo de spans mantidos em memória (os mais antigos são descartados)
+TRACE_MAX_EVENTS = 1000000
+
+# Registo opcional de spans (comandos FTP, transferências e slots pesados) exportado no formato de trace do
+# Chrome / Perfetto (chrome://tracing ou ui.perfetto.dev); desligado, cada span custa uma comparação
+class Tracer:
+    def __init__(self, output=None):
+        self.output = output
+        self.enabled = bool(output)
+        self.events = deque(maxlen=TRACE_MAX_EVENTS)
+        self.thread_names = {}
+        self.null_span = contextlib.nullcontext()
+
+    def set_enabled(self, enabled):
+        # Liga ou desliga o registo (os spans já registados mantêm-se até serem exportados)
+        self.enabled = bool(enabled)
+
+    @contextlib.contextmanager
+    def _span(self, name, category, args):
+        # Mede o bloco e regista-o como um evento completo ("ph": "X"), com o erro se houver um
+        thread = threading.current_thread()
+        self.thread_names.setdefault(thread.ident, thread.name)
+        started = time.perf_counter_ns()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.events.append({"name": name, "cat": category, "ph": "X", "ts": started // 1000,
+                                "dur": (time.perf_counter_ns() - started) // 1000, "pid": os.getpid(),
+                                "tid": thread.ident, "args": args})
+
+    def span(self, name, category, **args):
+        # Contexto que regista um span (ou nada, se o registo estiver desligado)
+        if not self.enabled:
+            return self.null_span
+        return self._span(name, category, args)
+
+    def export(self, path=None):
+        # Escreve os spans registados em JSON (Trace Event Format) e devolve o número de eventos
+        events = list(self.events)
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": ident, "args": {"name": name}}
+                    for ident, name in self.thread_names.items()]
+        with open(path or self.output, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+tracer = Tracer(os.environ.get(TRACE_ENV_VAR))
+
+def traced(category="qt"):
+    # Decorador que regista cada chamada da função como um span com o nome qualificado dela
+    def decorate(function):
+        name = function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def trace_command_name(cmd):
+    # Texto do comando FTP a registar no trace, sem a palavra-passe
+    return "PASS ****" if cmd[:5].upper() == "PASS " else cmd
+
+# Erro ao abrir a conexão de dados num modo (EPSV, PASV ou ativo): o modo não serve para este servidor
+class TransferModeError(error_temp):
+    pass
+
+# Códigos de erro de socket que indicam uma conexão (de controlo ou de dados) perdida; os outros OSError, como o
+# disco cheio ou a falta de permissões ao escrever o arquivo local, não se resolvem voltando a conectar
+CONNECTION_LOST_ERRNOS = frozenset((errno.ENOTCONN, errno.ENETDOWN, errno.ENETUNREACH, errno.ENETRESET,
+                                    errno.EHOSTDOWN, errno.EHOSTUNREACH, errno.ETIMEDOUT))
+
+def is_connection_lost(error):
+    # Indica se o erro significa que a conexão caiu (reset, pipe partido, timeout, erro TLS, EOF ou resposta 421)
+    if isinstance(error, ssl.SSLCertVerificationError):
+        return False
+    if isinstance(error, (EOFError, ConnectionError, socket.timeout, ssl.SSLError)):
+        return True
+    if isinstance(error, OSError) and error.errno in CONNECTION_LOST_ERRNOS:
+        return True
+    return isinstance(error, error_temp) and str(error).startswith("421")
+
+# Sessão FTP que deteta conexões mortas, volta a conectar e a autenticar e restaura o diretório de trabalho
+class ReconnectingFTP(FTP):
+    def __init__(self, timeout=FTP_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.credentials = None
+        self.working_directory = None
+        self.last_activity = 0.0
+        self.reconnect_count = 0
+        # Vaga (host, prioridade) que esta sessão ocupa no escalonador de conexões (None se não foi contada)
+        self.scheduler_slot = None
+        # Negociação do modo das conexões de dados: modo imposto pelo utilizador (ou None para automático),
+        # ordem de tentativa, modos que falharam, funcionalidades anunciadas (FEAT) e tempos de abertura
+        self.forced_transfer_mode = None
+        self.learned_transfer_mode = None
+        self.transfer_mode_order = list(TRANSFER_MODES)
+        self.failed_transfer_modes = set()
+        self.features = None
+        self.transfer_mode_timings = {}
+
+    def putline(self, line):
+        # Regista a atividade de cada comando enviado
+        self.last_activity = time.monotonic()
+        super().putline(line)
+
+    def sendcmd(self, cmd):
+        # Envia um comando e espera pela resposta (registado como span quando o trace está ligado)
+        with tracer.span(cmd.split(" ", 1)[0].upper(), "ftp", command=trace_command_name(cmd)) as args:
+            response = super().sendcmd(cmd)
+            if args is not None:
+                args["response"] = response.split("\n", 1)[0]
+            return response
+
+    def voidcmd(self, cmd):
+        # Envia um comando que deve ter uma resposta 2xx (registado como span quando o trace está ligado)
+        with tracer.span(cmd.split(" ", 1)[0].upper(), "ftp", command=trace_command_name(cmd)):
+            return super().voidcmd(cmd)
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        # Transferência de dados em binário, registada como span com o número de bytes
+        if not tracer.enabled:
+            return super().retrbinary(cmd, callback, blocksize, rest)
+        with tracer.span("transfer " + cmd.split(" ", 1)[0], "data", command=cmd, rest=rest) as args:
+            args["bytes"] = 0
+
+            def counting_callback(data):
+                args["bytes"] += len(data)
+                callback(data)
+            return super().retrbinary(cmd, counting_callback, blocksize, rest)
+
+    def retrlines(self, cmd, callback=None):
+        # Transferência de dados em texto (listagens), registada como span com o número de linhas
+        if not tracer.enabled:
+            return super().retrlines(cmd, callback)
+        with tracer.span("transfer " + cmd.split(" ", 1)[0], "data", command=cmd) as args:
+            args["lines"] = 0
+
+            def counting_callback(line):
+                args["lines"] += 1
+                (callback or print)(line)
+            return super().retrlines(cmd, counting_callback)
+
+    def storbinary(self, cmd, fp, blocksize=8192, callback=None, rest=None):
+        # Envio de dados em binário, registado como span
+        with tracer.span("transfer " + cmd.split(" ", 1)[0], "data", command=cmd, rest=rest):
+            return super().storbinary(cmd, fp, blocksize, callback, rest)
+
+    def login(self, user="", passwd="", acct=""):
+        # Guarda as credenciais para poder voltar a autenticar após uma queda
+        response = super().login(user, passwd, acct)
+        self.credentials = (user, passwd, acct)
+        return response
+
+    def cwd(self, dirname):
+        # Acompanha o diretório de trabalho para o restaurar após uma reconexão
+        response = super().cwd(dirname)
+        self.working_directory = join_remote_path(self.working_directory or "/", dirname)
+        return response
+
+    def reconnect(self):
+        # Abre uma nova conexão de controlo com os mesmos dados e restaura o diretório de trabalho
+        self.close()
+        self.connect(self.host, self.port)
+        super().login(*self.credentials)
+        if self.working_directory:
+            # O diretório pode ter deixado de existir (ex.: exclusão recursiva); nesse caso fica na raiz
+            try:
+                super().cwd(self.working_directory)
+            except error_perm:
+                self.working_directory = None
+        self.reconnect_count += 1
+
+    def ensure_alive(self):
+        # Verifica com NOOP uma conexão parada há algum tempo e volta a conectar se estiver morta
+        if self.credentials is None:
+            return
+        if self.sock is None:
+            self.reconnect()
+        elif time.monotonic() - self.last_activity > KEEPALIVE_PROBE_INTERVAL:
+            try:
+                self.voidcmd("NOOP")
+            except Exception as e:
+                if not is_connection_lost(e):
+                    raise
+                self.reconnect()
+
+    def call(self, function, *args, idempotent=True):
+        # Executa uma operação; se a conexão cair, volta a conectar e repete-a (só se for idempotente)
+        self.ensure_alive()
+        try:
+            return function(*args)
+        except Exception as e:
+            if self.credentials is None or not is_connection_lost(e):
+                raise
+            self.reconnect()
+            # Uma resposta 421 garante que o comando não foi executado, pelo que pode sempre ser repetido
+            if not idempotent and not isinstance(e, error_temp):
+                raise
+            return function(*args)
+
+    def set_transfer_mode(self, forced=None, learned=None):
+        # Impõe um modo de conexão de dados, ou negocia-o começando pelo mais rápido conhecido para o host
+        self.forced_transfer_mode = forced
+        self.transfer_mode_order = list(TRANSFER_MODES)
+        if learned in TRANSFER_MODES:
+            self.transfer_mode_order.remove(learned)
+            self.transfer_mode_order.insert(0, learned)
+        self.learned_transfer_mode = learned
+
+    def probe_features(self):
+        # Pergunta ao servidor (FEAT) o que suporta; sem EPSV anunciado, o PASV passa à frente
+        try:
+            lines = self.sendcmd("FEAT").splitlines()[1:-1]
+        except (error_perm, error_temp, error_reply, error_proto):
+            lines = []
+        self.features = {line.split()[0].upper() for line in lines if line.strip()}
+        order = self.transfer_mode_order
+        if (lines and "EPSV" not in self.features and not self.learned_transfer_mode
+                and order.index("EPSV") < order.index("PASV")):
+            order.remove("PASV")
+            order.insert(order.index("EPSV"), "PASV")
+
+    def transfer_mode_candidates(self):
+        # Modos ainda utilizáveis, pela ordem de tentativa
+        if self.forced_transfer_mode:
+            return [self.forced_transfer_mode]
+        if self.features is None:
+            self.probe_features()
+        return [mode for mode in self.transfer_mode_order if mode not in self.failed_transfer_modes]
+
+    def choose_transfer_mode(self):
+        # Experimenta uma vez cada modo passivo e depois fica com o mais rápido; o ativo é só alternativa
+        candidates = self.transfer_mode_candidates()
+        if not candidates:
+            raise TransferModeError("425 No data connection mode (EPSV, PASV or active) works with this server")
+        for mode in candidates:
+            if mode != "ACTIVE" and mode not in self.transfer_mode_timings:
+                return mode
+        return self.best_transfer_mode() or candidates[0]
+
+    def best_transfer_mode(self):
+        # Modo que funcionou com o menor tempo de abertura da conexão de dados, ou None
+        working = [mode for mode in self.transfer_mode_timings if mode not in self.failed_transfer_modes]
+        return min(working, key=self.transfer_mode_timings.get) if working else None
+
+    def ntransfercmd(self, cmd, rest=None):
+        # Abre a conexão de dados no modo escolhido, passando automaticamente ao seguinte se este falhar
+        with tracer.span("open data connection", "ftp", command=cmd, rest=rest) as args:
+            conn, size, mode = self._negotiated_transfercmd(cmd, rest)
+            if args is not None:
+                args["mode"] = mode
+            return conn, size
+
+    def _negotiated_transfercmd(self, cmd, rest):
+        # Tenta os modos de conexão de dados pela ordem negociada; devolve (conexão, tamanho, modo usado)
+        while True:
+            mode = self.choose_transfer_mode()
+            try:
+                conn, size, elapsed = self.open_data_connection(mode, cmd, rest)
+            except TransferModeError:
+                self.failed_transfer_modes.add(mode)
+                if self.forced_transfer_mode or not self.transfer_mode_candidates():
+                    raise
+                continue
+            self.transfer_mode_timings[mode] = min(elapsed, self.transfer_mode_timings.get(mode, elapsed))
+            return conn, size, mode
+
+    def open_data_connection(self, mode, cmd, rest):
+        # Abre a conexão de dados em EPSV, PASV (ignorando o endereço anunciado, por causa do NAT) ou em modo
+        # ativo e envia o comando; devolve (conexão, tamanho esperado, tempo de abertura da conexão)
+        started = time.perf_counter()
+        listener = None
+        conn = None
+        try:
+            if mode == "ACTIVE":
+                listener = self.makeport()
+            elif mode == "EPSV":
+                host, port = parse229(self.sendcmd("EPSV"), self.sock.getpeername())
+            else:
+                host, port = parse227(self.sendcmd("PASV"))
+                host = self.sock.getpeername()[0]
+        except (error_perm, error_reply, error_proto) as e:
+            if listener is not None:
+                listener.close()
+            raise TransferModeError(f"425 {mode}: {e}") from e
+        if listener is None:
+            try:
+                conn = socket.create_connection((host, port), self.timeout, source_address=self.source_address)
+            except OSError as e:
+                raise TransferModeError(f"425 {mode}: {e}") from e
+        elapsed = time.perf_counter() - started
+        try:
+            if rest is not None:
+                self.sendcmd("REST %s" % rest)
+            try:
+                resp = self.sendcmd(cmd)
+                # Alguns servidores enviam uma resposta 200 antes da 150
+                if resp[0] == "2":
+                    resp = self.getresp()
+            except error_temp as e:
+                if str(e).startswith("425"):
+                    raise TransferModeError(f"425 {mode}: {e}") from e
+                raise
+            if resp[0] != "1":
+                raise error_reply(resp)
+            if listener is not None:
+                started = time.perf_counter()
+                try:
+                    conn, _ = listener.accept()
+                except OSError as e:
+                    # O servidor não conseguiu ligar-se a nós; a conexão de controlo fica num estado incerto
+                    self.reconnect()
+                    raise TransferModeError(f"425 {mode}: {e}") from e
+                conn.settimeout(self.timeout)
+                elapsed += time.perf_counter() - started
+        except BaseException:
+            if conn is not None:
+                conn.close()
+            raise
+        finally:
+            if listener is not None:
+                listener.close()
+        size = parse150(resp) if resp[:3] == "150" else None
+        return conn, size, elapsed
+
+# Sessão FTPS explícita (AUTH TLS) com reconexão; as conexões de dados retomam a sessão TLS da conexão de
+# controlo, evitando um handshake completo por listagem ou arquivo (e cumprindo servidores que o exigem)
+class ReconnectingFTPS(ReconnectingFTP, FTP_TLS):
+    # Hosts cujo certificado não é verificado (certificados autoassinados aceites pelo utilizador)
+    unverified_hosts = set()
+
+    def __init__(self, protection="P", timeout=FTP_TIMEOUT):
+        super().__init__(timeout=timeout)
+        # Proteção das conexões de dados: "P" (cifradas) ou "C" (em claro, só o controlo é cifrado)
+        self.protection = protection
+        # Instrumentação: duração do handshake de controlo e handshakes das conexões de dados
+        self.control_handshake_time = None
+        self.data_handshakes = 0
+        self.data_handshakes_resumed = 0
+        self.data_handshake_time = 0.0
+
+    def connect(self, host="", port=0, timeout=-999, source_address=None):
+        # Verifica o certificado do servidor (cadeia e nome do host), exceto nos hosts aceites sem verificação
+        self.context = tls_context(host not in self.unverified_hosts)
+        return super().connect(host, port, timeout, source_address)
+
+    def auth(self):
+        # Negocia o TLS na conexão de controlo, medindo o tempo do handshake
+        started = time.perf_counter()
+        response = super().auth()
+        self.control_handshake_time = time.perf_counter() - started
+        return response
+
+    def login(self, user="", passwd="", acct=""):
+        # Autentica sobre TLS e aplica a proteção escolhida às conexões de dados
+        response = super().login(user, passwd, acct)
+        self.apply_protection()
+        return response
+
+    def apply_protection(self):
+        # Envia PBSZ e PROT P ou PROT C (o RFC 4217 exige o PBSZ antes de qualquer PROT)
+        if self.protection == "P":
+            self.prot_p()
+        else:
+            self.voidcmd("PBSZ 0")
+            self.prot_c()
+
+    def reconnect(self):
+        # A nova conexão de controlo precisa de voltar a negociar o TLS e a proteção dos dados
+        self._prot_p = False
+        super().reconnect()
+        self.apply_protection()
+
+    def ntransfercmd(self, cmd, rest=None):
+        # Abre a conexão de dados e cifra-a retomando a sessão TLS da conexão de controlo
+        conn, size = ReconnectingFTP.ntransfercmd(self, cmd, rest)
+        if self._prot_p:
+            started = time.perf_counter()
+            with tracer.span("TLS data handshake", "ftp"):
+                conn = self.context.wrap_socket(conn, server_hostname=self.host, session=self.sock.session)
+            self.data_handshake_time += time.perf_counter() - started
+            self.data_handshakes += 1
+            self.data_handshakes_resumed += conn.session_reused
+        return conn, size
+
+    def tls_summary(self):
+        # Resumo legível do custo dos handshakes TLS desta sessão
+        text = f"FTPS (PROT {self.protection})"
+        if self.control_handshake_time is not None:
+            text += f": control handshake {self.control_handshake_time * 1000:.1f} ms"
+        if self.data_handshakes:
+            text += (f"; data: {self.data_handshakes} handshakes, {self.data_handshakes_resumed} resumed,"
+                     f" avg {self.data_handshake_time / self.data_handshakes * 1000:.1f} ms")
+        return text
+
+def tls_context(verify=True):
+    # Contexto TLS com as autoridades de certificação do sistema; sem verify, aceita qualquer certificado
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+def create_ftp_session(tls=None, timeout=FTP_TIMEOUT):
+    # Cria uma sessão (ainda não conectada): FTP simples, ou FTPS com a proteção de dados indicada
+    if tls:
+        return ReconnectingFTPS(tls, timeout=timeout)
+    return ReconnectingFTP(timeout=timeout)
+
+def open_ftp_session(host, user, passwd, port, timeout=FTP_TIMEOUT, tls=None):
+    # Abre uma nova sessão FTP (ou FTPS) já autenticada
+    ftp = create_ftp_session(tls, timeout)
+    ftp.connect(host, port)
+    ftp.login(user, passwd)
+    return ftp
+
+# Classe que distribui as conexões de todas as abas: respeita os máximos por host e global, atende os pedidos
+# interativos antes dos de transferência e alterna entre as abas (a que foi servida há mais tempo vai primeiro)
+class ConnectionScheduler:
+    def __init__(self, max_total=MAX_CONNECTIONS_TOTAL, max_per_host=MAX_CONNECTIONS_PER_HOST):
+        self.max_total = max_total
+        self.max_per_host = max_per_host
+        self.condition = threading.Condition()
+        # Conexões abertas, ao todo e por host, e as de trabalho em massa por host
+        self.total = 0
+        self.per_host = {}
+        self.bulk_per_host = {}
+        # Pedidos à espera de vaga e vez em que cada dono (aba ou fila) foi servido pela última vez
+        self.waiting = []
+        self.sequence = 0
+        self.turn = 0
+        self.last_turn = {}
+
+    def set_limits(self, max_total, max_per_host):
+        # Altera os máximos; os pedidos em espera que passem a caber são atendidos de imediato
+        with self.condition:
+            self.max_total = max(1, int(max_total))
+            self.max_per_host = max(1, int(max_per_host))
+            self._grant()
+
+    def _fits(self, host, priority):
+        # Verifica se há vaga; o trabalho em massa deixa uma vaga livre para a navegação, exceto a primeira
+        # conexão em massa a cada host (para que as transferências avancem mesmo com várias abas abertas)
+        if self.total >= self.max_total or self.per_host.get(host, 0) >= self.max_per_host:
+            return False
+        if priority == PRIORITY_BULK and self.bulk_per_host.get(host, 0):
+            return self.total < self.max_total - 1 and self.per_host.get(host, 0) < self.max_per_host - 1
+        return True
+
+    def _take(self, request):
+        # Atribui a vaga ao pedido (chamado com a condição adquirida)
+        self.total += 1
+        self.per_host[request["host"]] = self.per_host.get(request["host"], 0) + 1
+        if request["priority"] == PRIORITY_BULK:
+            self.bulk_per_host[request["host"]] = self.bulk_per_host.get(request["host"], 0) + 1
+        self.turn += 1
+        self.last_turn[request["owner"]] = self.turn
+        request["granted"] = True
+
+    def _grant(self):
+        # Atende os pedidos em espera que cabem, por prioridade e, dentro dela, começando pelo dono servido há
+        # mais tempo (chamado com a condição adquirida)
+        for request in sorted(self.waiting, key=lambda request: (request["priority"],
+                                                                 self.last_turn.get(request["owner"], 0),
+                                                                 request["sequence"])):
+            if self._fits(request["host"], request["priority"]):
+                self._take(request)
+        self.waiting = [request for request in self.waiting if not request["granted"]]
+        self.condition.notify_all()
+
+    def acquire(self, host, owner, priority=PRIORITY_BULK, wait=True, force=False, cancelled=None):
+        # Reserva uma conexão ao host, esperando pela vez; devolve False sem vaga se wait for falso, ou se o
+        # evento cancelled for ativado durante a espera. force reserva mesmo acima dos máximos (a sessão
+        # principal de uma aba, aberta pelo utilizador)
+        with self.condition:
+            self.sequence += 1
+            request = {"host": host, "owner": owner, "priority": priority, "sequence": self.sequence,
+                       "granted": False}
+            if force:
+                self._take(request)
+                return True
+            self.waiting.append(request)
+            self._grant()
+            if not request["granted"]:
+                if not wait:
+                    self.waiting.remove(request)
+                    return False
+                with tracer.span("connection slot", "scheduler", host=host, priority=priority):
+                    while not request["granted"]:
+                        if cancelled is not None and cancelled.is_set():
+                            self.waiting.remove(request)
+                            return False
+                        self.condition.wait(SCHEDULER_YIELD_INTERVAL if cancelled is not None else None)
+        return True
+
+    def release(self, host, priority=PRIORITY_BULK):
+        # Devolve a vaga de uma conexão fechada e atende os pedidos em espera
+        with self.condition:
+            self.total -= 1
+            for counts in (self.per_host, self.bulk_per_host) if priority == PRIORITY_BULK else (self.per_host,):
+                counts[host] -= 1
+                if not counts[host]:
+                    del counts[host]
+            self._grant()
+
+    def adopt(self, ftp, host, owner):
+        # Conta a sessão principal de uma aba (que não espera pela vez); uma sessão já contada fica como está
+        if ftp.scheduler_slot is None:
+            self.acquire(host, owner, PRIORITY_INTERACTIVE, force=True)
+            ftp.scheduler_slot = (host, PRIORITY_INTERACTIVE)
+
+    def open_session(self, host, user, passwd, port, owner, priority=PRIORITY_BULK, tls=None, wait=True,
+                     cancelled=None, paired_with=None):
+        # Abre uma sessão quando houver vaga (ou devolve None, sem wait ou se a espera for cancelada); a vaga
+        # volta com close_session. A segunda sessão de um par ao mesmo host (origem e destino de uma cópia)
+        # conta como parte da reserva da primeira: esperar por ela com a primeira aberta nunca terminaria
+        # com as vagas ocupadas pelas abas
+        paired = paired_with is not None and paired_with.scheduler_slot is not None \
+            and paired_with.scheduler_slot[0] == host
+        if not self.acquire(host, owner, priority, wait, force=paired, cancelled=cancelled):
+            return None
+        try:
+            ftp = open_ftp_session(host, user, passwd, port, tls=tls)
+        except BaseException:
+            self.release(host, priority)
+            raise
+        ftp.scheduler_slot = (host, priority)
+        return ftp
+
+    def reprioritize(self, ftp, priority):
+        # Passa a vaga de uma sessão aberta para outra prioridade (ex.: uma sessão pré-conectada adotada por
+        # uma aba deixa de contar como trabalho em massa)
+        with self.condition:
+            slot = ftp.scheduler_slot
+            if slot is None or slot[1] == priority:
+                return
+            host = slot[0]
+            if slot[1] == PRIORITY_BULK:
+                self.bulk_per_host[host] -= 1
+                if not self.bulk_per_host[host]:
+                    del self.bulk_per_host[host]
+            elif priority == PRIORITY_BULK:
+                self.bulk_per_host[host] = self.bulk_per_host.get(host, 0) + 1
+            ftp.scheduler_slot = (host, priority)
+            self._grant()
+
+    def release_session(self, ftp):
+        # Devolve a vaga da sessão (uma única vez), depois de fechada
+        slot, ftp.scheduler_slot = ftp.scheduler_slot, None
+        if slot is not None:
+            self.release(*slot)
+
+    def contended(self, ftp):
+        # Verifica se algum pedido em espera ficaria com a vaga desta sessão, caso fosse fechada
+        host = ftp.scheduler_slot and ftp.scheduler_slot[0]
+        with self.condition:
+            return any(request["host"] == host or self.total >= self.max_total for request in self.waiting)
+
+    def wait_idle(self, condition, ftp, has_work, timeout=WARMUP_IDLE_TIMEOUT):
+        # Espera (com a condição da thread adquirida) por trabalho para uma thread auxiliar com uma sessão
+        # aberta; desiste antes do tempo limite quando outro pedido precisa da vaga dessa sessão
+        deadline = time.monotonic() + timeout
+        while not has_work():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (ftp is not None and self.contended(ftp)):
+                return
+            condition.wait(min(remaining, SCHEDULER_YIELD_INTERVAL))
+
+scheduler = ConnectionScheduler()
+
+# Classe que guarda o histórico de conexões numa base de dados SQLite indexada
+class ConnectionHistoryStore:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CONFIG_DIR, "history.sqlite3")
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Abre a base de dados apenas quando é usada pela primeira vez
+        if self._db is None:
+            import sqlite3  # Só carregado quando o histórico é usado, para não atrasar o arranque
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS connections ("
+                " host TEXT NOT NULL, user TEXT NOT NULL, port INTEGER NOT NULL,"
+                " use_count INTEGER NOT NULL DEFAULT 0, last_used REAL NOT NULL DEFAULT 0,"
+                " last_latency REAL, last_directory TEXT,"
+                " PRIMARY KEY (host, user, port))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS connections_mru ON connections (last_used DESC)")
+            # Bases de dados criadas antes do suporte a FTPS: acrescenta a coluna da proteção TLS
+            columns = {row["name"] for row in self._db.execute("PRAGMA table_info(connections)")}
+            if "tls" not in columns:
+                self._db.execute("ALTER TABLE connections ADD COLUMN tls TEXT")
+            # Modo de conexão de dados mais rápido aprendido e modo imposto pelo utilizador (NULL = automático)
+            if "transfer_mode" not in columns:
+                self._db.execute("ALTER TABLE connections ADD COLUMN transfer_mode TEXT")
+                self._db.execute("ALTER TABLE connections ADD COLUMN forced_transfer_mode TEXT")
+            self._import_legacy_file()
+            self._db.commit()
+        return self._db
+
+    def _import_legacy_file(self):
+        # Importa (uma única vez) o ficheiro CSV das versões anteriores, sem duplicados
+        if not os.path.exists(LEGACY_HISTORY_FILE):
+            return
+        counts = {}
+        with open(LEGACY_HISTORY_FILE, "r") as f:
+            for line in f:
+                parts = line.strip().split(",")
+                if len(parts) != 3 or not parts[2].isdigit():
+                    continue
+                key = (parts[0], parts[1], int(parts[2]))
+                counts[key] = counts.get(key, 0) + 1
+        mtime = os.path.getmtime(LEGACY_HISTORY_FILE)
+        for (host, user, port), count in counts.items():
+            self._db.execute(
+                "INSERT INTO connections (host, user, port, use_count, last_used) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (host, user, port) DO UPDATE SET use_count = use_count + excluded.use_count",
+                (host, user, port, count, mtime))
+        os.replace(LEGACY_HISTORY_FILE, LEGACY_HISTORY_FILE + ".imported")
+
+    def record_connection(self, host, user, port, latency=None, tls=None, forced_transfer_mode=None,
+                          transfer_mode=None):
+        # Regista uma conexão: incrementa o contador e move a entrada para o topo (MRU)
+        with self._lock:
+            db = self._connection()
+            db.execute(
+                "INSERT INTO connections (host, user, port, use_count, last_used, last_latency, tls,"
+                " forced_transfer_mode, transfer_mode) VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (host, user, port) DO UPDATE SET use_count = use_count + 1,"
+                " last_used = excluded.last_used,"
+                " last_latency = COALESCE(excluded.last_latency, last_latency), tls = excluded.tls,"
+                " forced_transfer_mode = excluded.forced_transfer_mode,"
+                " transfer_mode = COALESCE(excluded.transfer_mode, transfer_mode)",
+                (host, user, port, time.time(), latency, tls, forced_transfer_mode, transfer_mode))
+            # Mantém o histórico limitado, descartando as entradas usadas há mais tempo
+            db.execute(
+                "DELETE FROM connections WHERE rowid NOT IN"
+                " (SELECT rowid FROM connections ORDER BY last_used DESC LIMIT ?)",
+                (MAX_HISTORY_ENTRIES,))
+            db.commit()
+
+    def update_transfer_mode(self, host, user, port, mode):
+        # Guarda o modo de conexão de dados mais rápido encontrado para o host
+        with self._lock:
+            db = self._connection()
+            db.execute("UPDATE connections SET transfer_mode = ? WHERE host = ? AND user = ? AND port = ?",
+                       (mode, host, user, port))
+            db.commit()
+
+    def transfer_modes(self, host, user, port):
+        # Devolve (modo aprendido, modo imposto) do host, ou (None, None) se não estiver no histórico
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT transfer_mode, forced_transfer_mode FROM connections"
+                " WHERE host = ? AND user = ? AND port = ?", (host, user, port)).fetchone()
+        return tuple(row) if row else (None, None)
+
+    def update_last_directory(self, host, user, port, path):
+        # Guarda o último diretório visitado para a entrada
+        with self._lock:
+            db = self._connection()
+            db.execute("UPDATE connections SET last_directory = ? WHERE host = ? AND user = ? AND port = ?",
+                       (path, host, user, port))
+            db.commit()
+
+    def search(self, text="", limit=HISTORY_PAGE_SIZE, offset=0):
+        # Procura entradas pelo host ou utilizador, ordenadas da mais recente para a mais antiga
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self._lock:
+            return self._connection().execute(
+                "SELECT * FROM connections WHERE host LIKE ? ESCAPE '\\' OR user LIKE ? ESCAPE '\\'"
+                " ORDER BY last_used DESC LIMIT ? OFFSET ?",
+                (pattern, pattern, limit, offset)).fetchall()
+
+    def most_used(self, limit):
+        # Devolve as entradas usadas com mais frequência
+        with self._lock:
+            return self._connection().execute(
+                "SELECT * FROM connections ORDER BY use_count DESC, last_used DESC LIMIT ?", (limit,)).fetchall()
+
+# Classe que pré-conecta, em segundo plano, aos hosts mais usados do histórico
+class SessionWarmer(QObject):
+    def __init__(self, history_store, credentials, parent=None):
+        super().__init__(parent)
+        self.history_store = history_store
+        # Palavras-passe conhecidas por servidor (host, porta, utilizador): as das abas abertas nesta execução
+        self.credentials = credentials
+        self.settings = QSettings("ftp_browser", "FTP Browser")
+        # Sessões prontas: (host, user, port) -> [ftp, caminho, listagem, instante da criação, proteção TLS,
+        # palavra-passe]
+        self.sessions = {}
+        self.pending = set()
+        self.failed = set()
+        # Hosts já resolvidos (DNS) para as contas que não são pré-conectadas
+        self.resolved = set()
+        self.lock = threading.Lock()
+
+        # Fecha periodicamente as sessões que ficaram paradas tempo demais
+        self.expire_timer = QTimer(self)
+        self.expire_timer.timeout.connect(self.expire_idle)
+        self.expire_timer.start(WARMUP_IDLE_TIMEOUT * 1000 // 4)
+
+    def is_enabled(self):
+        # A pré-conexão é opcional e fica desligada por omissão
+        return self.settings.value("warmup/enabled", False, type=bool)
+
+    def set_enabled(self, enabled):
+        # Liga ou desliga a pré-conexão e guarda a preferência
+        self.settings.setValue("warmup/enabled", bool(enabled))
+        if enabled:
+            self.warm_most_used()
+        else:
+            self.close_all()
+
+    def warm_most_used(self):
+        # Pré-conecta aos hosts mais usados, ou só lhes resolve o nome se a palavra-passe não for conhecida
+        # (chamado no arranque)
+        if not self.is_enabled():
+            return
+        for row in self.history_store.most_used(WARMUP_MAX_SESSIONS):
+            self.warm(row["host"], row["user"], row["port"], row["last_directory"] or "/", row["tls"])
+
+    def password_for(self, host, user, port):
+        # Palavra-passe conhecida da conta: vazia nas anónimas, a de uma aba já aberta, ou None se não for conhecida
+        if user in ANONYMOUS_USERS:
+            return ""
+        return self.credentials.get((host, port, user))
+
+    def warm(self, host, user, port, path="/", tls=None):
+        # Inicia, numa thread, a resolução DNS e a autenticação de uma sessão para o host; só as contas com
+        # a palavra-passe conhecida são pré-conectadas (tentar outra daria uma autenticação falhada no servidor),
+        # as outras ficam apenas com o nome resolvido
+        key = (host, user, port)
+        passwd = self.password_for(host, user, port)
+        with self.lock:
+            if not self.is_enabled():
+                return
+            if passwd is None:
+                if host in self.resolved:
+                    return
+                self.resolved.add(host)
+                threading.Thread(target=self._resolve, args=(host, port), daemon=True).start()
+                return
+            if (key in self.sessions or key in self.pending or key in self.failed
+                    or len(self.sessions) + len(self.pending) >= WARMUP_MAX_SESSIONS):
+                return
+            self.pending.add(key)
+        threading.Thread(target=self._open_session, args=(key, passwd, path, tls), daemon=True).start()
+
+    def _resolve(self, host, port):
+        # Executado em segundo plano: resolve o nome, para que a cache DNS do sistema o tenha quando a aba abrir
+        try:
+            socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            pass
+
+    def _open_session(self, key, passwd, path, tls=None):
+        # Executado em segundo plano: resolve o nome, autentica e lista o último diretório
+        host, user, port = key
+        ftp = None
+        try:
+            socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            # Só pré-conecta se houver uma vaga livre; não espera pela vez de outras conexões
+            ftp = scheduler.open_session(host, user, passwd, port, "warmup", tls=tls, wait=False)
+            if ftp is None:
+                with self.lock:
+                    self.pending.discard(key)
+                return
+            learned, forced = self.history_store.transfer_modes(host, user, port)
+            ftp.set_transfer_mode(forced, learned)
+            ftp.cwd(path)
+            path = ftp.pwd()
+            listing = list_remote_directory(ftp, path)
+        except Exception:
+            with self.lock:
+                self.pending.discard(key)
+                self.failed.add(key)
+            if ftp is not None:
+                ftp.close()
+                scheduler.release_session(ftp)
+            return
+        with self.lock:
+            self.pending.discard(key)
+            self.sessions[key] = [ftp, path, listing, time.monotonic(), tls, passwd]
+
+    def take(self, host, user, port, tls=None, passwd=""):
+        # Entrega a sessão pré-conectada do host (ou None) para ser usada por uma aba
+        with self.lock:
+            entry = self.sessions.pop((host, user, port), None)
+        if entry is None:
+            return None
+        if entry[4] != tls or (entry[5] != passwd and user not in ANONYMOUS_USERS):
+            # Pré-conectada com outra segurança (FTP/FTPS) ou com outra palavra-passe da pedida agora
+            self._quit_sessions([entry])
+            return None
+        # Sem NOOP aqui (na thread da interface): se a sessão tiver caído entretanto, o primeiro comando da aba
+        # volta a conectar (ReconnectingFTP.call). A vaga passa a ser a de uma sessão interativa
+        scheduler.reprioritize(entry[0], PRIORITY_INTERACTIVE)
+        return entry
+
+    def expire_idle(self):
+        # Fecha as sessões não usadas dentro do tempo limite
+        now = time.monotonic()
+        with self.lock:
+            expired = [key for key, entry in self.sessions.items() if now - entry[3] > WARMUP_IDLE_TIMEOUT]
+            entries = [self.sessions.pop(key) for key in expired]
+        self._quit_sessions(entries)
+
+    def close_all(self):
+        # Fecha todas as sessões pré-conectadas
+        with self.lock:
+            entries = list(self.sessions.values())
+            self.sessions.clear()
+        self._quit_sessions(entries)
+
+    def _quit_sessions(self, entries):
+        # Termina as sessões numa thread para não bloquear a interface
+        def quit_all():
+            for entry in entries:
+                close_session(entry[0])
+        if entries:
+            threading.Thread(target=quit_all, daemon=True).start()
+
+# Linha de listagem no formato DOS/Windows (ex.: "10-19-26  01:31PM  <DIR>  nome")
+DOS_LIST_RE = re.compile(r"^(\d{2})-(\d{2})-(\d{2,4})\s+(\d{1,2}):(\d{2})([AaPp][Mm])?\s+(<DIR>|\d+)\s+(.+)$")
+# Abreviaturas dos meses usadas no formato Unix do LIST
+LIST_MONTHS = {month: number for number, month in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+
+def parse_unix_list_time(month, day, year_or_time):
+    # Converte a data do LIST Unix ("Oct 19 13:31" ou "Oct 19 2020") em segundos desde a época
+    month = LIST_MONTHS.get(month[:3].lower())
+    if not month or not day.isdigit():
+        return 0.0
+    try:
+        if ":" in year_or_time:
+            hour, minute = (int(part) for part in year_or_time.split(":", 1))
+            year = time.localtime().tm_year
+            timestamp = time.mktime((year, month, int(day), hour, minute, 0, 0, 0, -1))
+            # Sem ano, a data refere-se aos últimos 12 meses
+            if timestamp > time.time() + 86400:
+                timestamp = time.mktime((year - 1, month, int(day), hour, minute, 0, 0, 0, -1))
+            return timestamp
+        return time.mktime((int(year_or_time), month, int(day), 0, 0, 0, 0, 0, -1))
+    except (ValueError, OverflowError):
+        return 0.0
+
+def parse_list_line(line):
+    # Interpreta uma linha do LIST e devolve (nome, é_diretório, tamanho, data), ou None se não for reconhecida
+    parts = line.split(None, 8)
+    if len(parts) == 9 and parts[0][:1] in "-dlbcps":
+        name = parts[8]
+        if parts[0][0] == "l" and " -> " in name:
+            name = name.split(" -> ", 1)[0]
+        size = int(parts[4]) if parts[4].isdigit() else 0
+        return name, parts[0][0] == "d", size, parse_unix_list_time(parts[5], parts[6], parts[7])
+    match = DOS_LIST_RE.match(line)
+    if match:
+        month, day, year, hour, minute, meridiem, size, name = match.groups()
+        year, hour = int(year), int(hour)
+        if year < 100:
+            year += 2000 if year < 70 else 1900
+        if meridiem:
+            hour = hour % 12 + (12 if meridiem.lower() == "pm" else 0)
+        try:
+            mtime = time.mktime((year, int(month), int(day), hour, int(minute), 0, 0, 0, -1))
+        except (ValueError, OverflowError):
+            mtime = 0.0
+        return name, size == "<DIR>", 0 if size == "<DIR>" else int(size), mtime
+    return None
+
+# Sequências de dígitos nos nomes, para a ordenação natural
+DIGITS_RE = re.compile(r"\d+")
+
+def natural_sort_key(name):
+    # Chave de ordenação natural ("file2" antes de "file10"), sem distinguir maiúsculas: cada número é
+    # precedido pelo seu comprimento, pelo que a chave é uma string simples comparada em C
+    return DIGITS_RE.sub(lambda match: chr(len(match.group())) + match.group(), name.casefold())
+
+def file_extension(name):
+    # Extensão do nome em minúsculas (sem o ponto); vazia para nomes sem extensão ou ocultos
+    return name.rpartition(".")[2].lower() if "." in name.lstrip(".") else ""
+
+def format_size(size):
+    # Formata um tamanho em bytes para exibição
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+# Coluna de textos (nomes ou linhas do LIST) codificados em UTF-8 num bloco contínuo, cada um terminado por "\n",
+# com a posição de cada texto num array: sem um objeto str por entrada. Os primeiros textos ficam em memória até
+# ao limite indicado e os restantes vão para um arquivo temporário, lido através de um mapeamento em memória
+class TextColumn(Sequence):
+    def __init__(self, memory_limit):
+        self.memory_limit = memory_limit
+        self.data = bytearray()
+        # Posição (no bloco completo: memória seguida do arquivo) do início de cada texto, mais o fim do último
+        self.offsets = array("q", [0])
+        self.spill = None
+        self.mapped = None
+
+    def append(self, text):
+        encoded = text.encode("utf-8", "surrogatepass") + b"\n"
+        self._write(encoded)
+        self.offsets.append(self.offsets[-1] + len(encoded))
+
+    def extend(self, texts):
+        # Acrescenta vários textos de uma vez, por blocos
+        iterator = iter(texts)
+        while True:
+            encoded = [text.encode("utf-8", "surrogatepass") for text in islice(iterator, TEXT_COLUMN_BATCH)]
+            if not encoded:
+                break
+            self.offsets.extend(islice(accumulate((len(text) + 1 for text in encoded), initial=self.offsets[-1]),
+                                       1, None))
+            self._write(b"\n".join(encoded) + b"\n")
+
+    def _write(self, block):
+        # Guarda o bloco em memória enquanto couber no limite; a partir daí, no arquivo temporário
+        if self.spill is None and len(self.data) + len(block) > self.memory_limit:
+            import tempfile  # Só necessário em listagens muito grandes
+            # Em CACHE_DIR e não em /tmp, que pode estar em memória (tmpfs)
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            self.spill = tempfile.TemporaryFile(dir=CACHE_DIR, prefix="listing-")
+        if self.spill is None:
+            self.data += block
+        else:
+            self.spill.write(block)
+            self.mapped = None
+
+    def seal(self):
+        # Mapeia em memória a parte guardada no arquivo (refeito depois de novos acréscimos)
+        if self.spill is not None and self.mapped is None:
+            self.spill.flush()
+            self.mapped = mmap.mmap(self.spill.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.mapped
+
+    def _raw(self, start, end):
+        # Bytes entre duas posições do bloco completo
+        memory = len(self.data)
+        if end <= memory:
+            return self.data[start:end]
+        if start >= memory:
+            return self.seal()[start - memory:end - memory]
+        return self.data[start:] + self.seal()[:end - memory]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("text column index out of range")
+        return self._raw(self.offsets[index], self.offsets[index + 1] - 1).decode("utf-8", "surrogatepass")
+
+    def _batch(self, first, last):
+        # Descodifica de uma vez os textos de first a last, o que é muito mais rápido do que um a um
+        texts = self._raw(self.offsets[first], self.offsets[last]).decode("utf-8", "surrogatepass").split("\n")
+        texts.pop()
+        if len(texts) != last - first:
+            texts = [self[i] for i in range(first, last)]  # Algum nome (local) contém "\n"
+        return texts
+
+    def __iter__(self):
+        # Descodifica os textos por blocos
+        count = len(self)
+        for first in range(0, count, TEXT_COLUMN_BATCH):
+            yield from self._batch(first, min(first + TEXT_COLUMN_BATCH, count))
+
+    def mask(self, test, candidates=None):
+        # Máscara com um byte por texto; test recebe uma lista de textos e devolve um booleano por texto. Com
+        # candidates (outra máscara), os restantes textos ficam a 0 e os blocos sem candidatos não são descodificados
+        count = len(self)
+        result = bytearray()
+        for first in range(0, count, TEXT_COLUMN_BATCH):
+            last = min(first + TEXT_COLUMN_BATCH, count)
+            if candidates is None:
+                result += bytearray(test(self._batch(first, last)))
+            elif candidates.find(1, first, last) < 0:
+                result += bytes(last - first)
+            else:
+                result += bytearray(map(operator.and_, candidates[first:last], test(self._batch(first, last))))
+        return result
+
+    def find(self, text, start=0):
+        # Posição (no bloco completo) da primeira ocorrência do texto a partir de start, ou -1
+        needle = text.encode("utf-8", "surrogatepass")
+        memory = len(self.data)
+        if start < memory:
+            position = self.data.find(needle, start)
+            if position >= 0 or self.spill is None:
+                return position
+            start = memory
+        if self.spill is None:
+            return -1
+        position = self.seal().find(needle, start - memory)
+        return position + memory if position >= 0 else -1
+
+    def occurrences(self, text, limit):
+        # Número de ocorrências do texto, contado só até limit (basta para saber se o texto é raro)
+        count = self.data.count(text.encode("utf-8", "surrogatepass"))
+        position = len(self.data)
+        while self.spill is not None and count < limit:
+            position = self.find(text, position)
+            if position < 0:
+                break
+            count += 1
+            position += 1
+        return count
+
+    def row_at(self, position):
+        # Índice do texto que contém a posição indicada
+        return bisect_right(self.offsets, position) - 1
+
+# Classe que guarda uma listagem de diretório em colunas (nomes, tipos, tamanhos, datas e linhas do LIST); os
+# textos ficam em TextColumns, cujo tamanho em memória está limitado por DirectoryListing.memory_limit
+class DirectoryListing:
+    # Memória máxima (em bytes) dos textos de cada listagem (alterada nas definições)
+    memory_limit = LISTING_MEMORY_LIMIT_MB * 1024 * 1024
+
+    def __init__(self):
+        self.names = TextColumn(self.memory_limit // 4)
+        self.is_dir = bytearray()
+        self.sizes = array("q")
+        self.mtimes = array("d")
+        # Linha original do LIST de cada entrada; vazio nas listagens locais
+        self.lines = TextColumn(self.memory_limit // 2)
+        self._names_lower = None
+        # Permutações já calculadas para cada (coluna, ordem) e as respetivas posições de cada entrada
+        self._sort_orders = {}
+        self._sort_ranks = {}
+
+    @classmethod
+    def from_list_lines(cls, lines):
+        # Constrói a listagem a partir das linhas devolvidas pelo comando LIST
+        listing = cls()
+        for line in lines:
+            listing.append_line(line)
+        listing.seal()
+        return listing
+
+    def append_line(self, line):
+        # Acrescenta a entrada descrita por uma linha do LIST (ignorando "." e "..")
+        parsed = parse_list_line(line)
+        name, is_dir, size, mtime = parsed if parsed else (line, False, 0, 0.0)
+        if name in (".", ".."):
+            return
+        self.append(name, is_dir, 0 if is_dir else size, mtime)
+        self.lines.append(line)
+
+    def seal(self):
+        # Termina a construção: mapeia em memória as partes das colunas de texto que foram para disco e calcula já
+        # os nomes em minúsculas do filtro (as listagens são construídas fora da thread da interface)
+        self.names.seal()
+        self.lines.seal()
+        self._names_lower = None
+        self.names_lower
+
+    @classmethod
+    def from_local(cls, path):
+        # Constrói a listagem de um diretório local
+        listing = cls()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                    stat = entry.stat()
+                    listing.append(entry.name, is_dir, 0 if is_dir else stat.st_size, stat.st_mtime)
+                except OSError:
+                    listing.append(entry.name, False, 0, 0.0)
+        listing.seal()
+        return listing
+
+    def append(self, name, is_dir, size, mtime):
+        # Acrescenta uma entrada às colunas
+        self.names.append(name)
+        self.is_dir.append(is_dir)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+
+    def __len__(self):
+        return len(self.is_dir)
+
+    def type_name(self, index):
+        # Tipo exibido: "Folder" ou a extensão do arquivo
+        return "Folder" if self.is_dir[index] else file_extension(self.names[index])
+
+    def sort_order(self, column, descending=False):
+        # Permutação dos índices ordenada pela coluna (estável), guardada num array compacto; calculada uma vez
+        # por listagem e ordem
+        key = (column, descending)
+        if key not in self._sort_orders:
+            if column in (LISTING_COLUMNS.index("Size"), LISTING_COLUMNS.index("Modified")):
+                keys = self.sort_keys(column)
+                order = sorted(range(len(self)), key=keys.__getitem__, reverse=descending)
+            elif self.names.spill is None:
+                order = sorted(range(len(self)), key=self.sort_keys(column).__getitem__, reverse=descending)
+            else:
+                # Listagem acima do limite de memória: ordena blocos de entradas e junta-os, para que só existam as
+                # chaves de texto de um bloco de cada vez (e não uma string por entrada)
+                key_of = self.sort_key_function(column)
+                runs = [array("q", sorted(range(first, min(first + TEXT_COLUMN_BATCH, len(self))),
+                                          key=key_of, reverse=descending))
+                        for first in range(0, len(self), TEXT_COLUMN_BATCH)]
+                order = heapq.merge(*runs, key=key_of, reverse=descending)
+            self._sort_orders[key] = array("q", order)
+        return self._sort_orders[key]
+
+    def sort_ranks(self, column, descending=False):
+        # Posição de cada entrada na permutação de sort_order (a permutação inversa), calculada uma vez
+        key = (column, descending)
+        if key not in self._sort_ranks:
+            ranks = array("q", bytes(8 * len(self)))
+            for rank, index in enumerate(self.sort_order(column, descending)):
+                ranks[index] = rank
+            self._sort_ranks[key] = ranks
+        return self._sort_ranks[key]
+
+    def sort_keys(self, column):
+        # Chaves de ordenação da coluna
+        if column == LISTING_COLUMNS.index("Size"):
+            return self.sizes
+        if column == LISTING_COLUMNS.index("Modified"):
+            return self.mtimes
+        if column == LISTING_COLUMNS.index("Type"):
+            return [("1" + file_extension(name)) if not is_dir else "0" for name, is_dir in zip(self.names, self.is_dir)]
+        return [natural_sort_key(name) for name in self.names]
+
+    def sort_key_function(self, column):
+        # Função que calcula a chave de ordenação de uma entrada (para as colunas de texto)
+        if column == LISTING_COLUMNS.index("Type"):
+            return lambda i: ("1" + file_extension(self.names[i])) if not self.is_dir[i] else "0"
+        return lambda i: natural_sort_key(self.names[i])
+
+    @property
+    def names_lower(self):
+        # Nomes em minúsculas (usados pelo filtro), com o mesmo limite de memória; calculados em seal()
+        if self._names_lower is None:
+            names_lower = TextColumn(self.memory_limit // 4)
+            names_lower.extend(name.lower() for name in self.names)
+            names_lower.seal()
+            self._names_lower = names_lower
+        return self._names_lower
+
+    def containing(self, literal):
+        # Índices das entradas cujo nome contém o literal, procurado de uma vez no bloco dos nomes em minúsculas
+        names_lower = self.names_lower
+        result = []
+        position = names_lower.find(literal)
+        while position >= 0:
+            index = names_lower.row_at(position)
+            result.append(index)
+            position = names_lower.find(literal, names_lower.offsets[index + 1])
+        return result
+
+# Modos do filtro de listagens
+FILTER_MODES = ("Substring", "Prefix", "Glob", "Regex")
+
+# Partes de um padrão glob que não são texto literal
+GLOB_SPECIAL_RE = re.compile(r"[*?]|\[[^\]]*\]")
+# Um literal do filtro é raro (procurado diretamente no bloco dos nomes, em vez de verificar todos os nomes)
+# quando aparece em menos de 1/FILTER_RARE_FRACTION das entradas
+FILTER_RARE_FRACTION = 32
+
+def filter_mask(listing, mode, text, candidates=None, case_sensitive=False):
+    # Máscara (um byte por entrada) das entradas cujo nome corresponde ao filtro; com candidates (máscara de
+    # um filtro anterior), só as entradas marcadas nela são verificadas. Os nomes são lidos por blocos
+    if mode == "Regex":
+        try:
+            search = re.compile(text, 0 if case_sensitive else re.IGNORECASE).search
+        except re.error:
+            return bytearray(b"\x01" * len(listing)) if candidates is None else candidates
+        return listing.names.mask(lambda names: map(bool, map(search, names)), candidates)
+    if case_sensitive:
+        names = listing.names
+    else:
+        text = text.lower()
+        names = listing.names_lower
+    literals = GLOB_SPECIAL_RE.split(text) if mode == "Glob" else [text]
+    if mode == "Glob" and len(literals) == 3 and text == f"*{literals[1]}*":
+        # "*texto*" é uma procura de substring
+        mode, text, literals = "Substring", literals[1], literals[1:2]
+    # test recebe uma lista de nomes e devolve um booleano por nome
+    if mode == "Glob" and len(literals) == 2 and text.count("*") == 1:
+        # Padrões "prefixo*sufixo" são verificados com startswith/endswith, sem expressões regulares
+        head, tail = literals
+        if not head:
+            def test(names):
+                return map(str.endswith, names, repeat(tail))
+        elif not tail:
+            def test(names):
+                return map(str.startswith, names, repeat(head))
+        else:
+            def test(names):
+                return map(operator.and_, map(str.startswith, names, repeat(head)),
+                           map(str.endswith, names, repeat(tail)))
+    elif mode == "Substring":
+        def test(names):
+            return map(operator.contains, names, repeat(text))
+    elif mode == "Prefix":
+        def test(names):
+            return map(str.startswith, names, repeat(text))
+    else:
+        match = re.compile(fnmatch.translate(text)).match
+
+        def test(names):
+            return map(bool, map(match, names))
+    if candidates is None:
+        # Quando um literal do padrão é raro, procura-o de uma vez no bloco dos nomes
+        limit = len(names) // FILTER_RARE_FRACTION + 1
+        counts = [(names.occurrences(literal, limit), literal) for literal in literals
+                  if literal and "\n" not in literal]
+        if counts and min(counts)[0] * FILTER_RARE_FRACTION < len(names):
+            # (em minúsculas, containing devolve também os nomes que só diferem nas maiúsculas, que test exclui)
+            rows = listing.containing(min(counts)[1].lower())
+        else:
+            return names.mask(test)
+    elif candidates.count(1) * 4 < len(names):
+        # Descodificar um nome sozinho custa cerca de quatro vezes mais do que num bloco
+        rows = list(compress(range(len(names)), candidates))
+    else:
+        return names.mask(test, candidates)
+    # Poucos candidatos: só esses nomes são descodificados (um a um) e verificados
+    mask = bytearray(len(names))
+    for i in compress(rows, test([names[i] for i in rows])):
+        mask[i] = 1
+    return mask
+
+def filter_listing(listing, mode, text, case_sensitive=False):
+    # Devolve os índices das entradas cujo nome corresponde ao filtro
+    return list(compress(range(len(listing)), filter_mask(listing, mode, text, case_sensitive=case_sensitive)))
+
+# Colunas exibidas nas listagens
+LISTING_COLUMNS = ("Name", "Size", "Modified", "Type")
+# Tipo MIME dos itens arrastados entre painéis
+LISTING_MIME_TYPE = "application/x-ftp-browser-items"
+
+# Modelo que exibe uma DirectoryListing filtrada e ordenada sem recriar widgets
+class ListingModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.listing = DirectoryListing()
+        # Índices (na listagem) das linhas visíveis, pela ordem em que são exibidas, e máscara do filtro atual
+        # (um byte por entrada; None sem filtro)
+        self.rows = []
+        self.mask = None
+        self.filter_mode = FILTER_MODES[0]
+        self.filter_text = ""
+        self.sort_column = 0
+        self.sort_descending = False
+        # Arrastar e largar: função que descreve as entradas arrastadas (índices -> dicionário serializável)
+        # e função que recebe itens largados (dicionário, subdiretório alvo ou None -> aceite)
+        self.drag_source = None
+        self.drop_target = None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled if self.drop_target else Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if self.drag_source:
+            flags |= Qt.ItemIsDragEnabled
+        if self.drop_target and self.listing.is_dir[self.rows[index.row()]]:
+            flags |= Qt.ItemIsDropEnabled
+        return flags
+
+    def mimeTypes(self):
+        return [LISTING_MIME_TYPE]
+
+    def supportedDropActions(self):
+        return Qt.CopyAction
+
+    def mimeData(self, indexes):
+        # Serializa as entradas arrastadas (uma vez por linha, ignorando as outras colunas)
+        entries = sorted({self.rows[index.row()] for index in indexes if index.isValid()})
+        data = QMimeData()
+        data.setData(LISTING_MIME_TYPE, json.dumps(self.drag_source(entries)).encode())
+        return data
+
+    def dropMimeData(self, data, action, row, column, parent):
+        # Entrega os itens largados ao painel (num subdiretório, se largados sobre uma pasta)
+        if not self.drop_target or not data.hasFormat(LISTING_MIME_TYPE):
+            return False
+        target = None
+        if parent.isValid() and self.listing.is_dir[self.rows[parent.row()]]:
+            target = self.listing.names[self.rows[parent.row()]]
+        return self.drop_target(json.loads(bytes(data.data(LISTING_MIME_TYPE)).decode()), target)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(LISTING_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return LISTING_COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return self.listing.names[entry]
+            if column == 1:
+                return "" if self.listing.is_dir[entry] else format_size(self.listing.sizes[entry])
+            if column == 2:
+                mtime = self.listing.mtimes[entry]
+                return time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime)) if mtime else ""
+            return self.listing.type_name(entry)
+        if role == Qt.TextAlignmentRole and column == 1:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        if role == Qt.ToolTipRole and self.listing.lines:
+            return self.listing.lines[entry]
+        if role == Qt.UserRole:
+            return entry
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Ordena pela coluna clicada reordenando apenas os índices das linhas visíveis
+        self.layoutAboutToBeChanged.emit()
+        self.sort_column = column
+        self.sort_descending = order == Qt.DescendingOrder
+        self.rows = self._ordered(self.mask)
+        self.layoutChanged.emit()
+
+    def _ordered(self, mask):
+        # Aplica a ordenação atual às entradas marcadas na máscara (todas, sem máscara)
+        order = self.listing.sort_order(self.sort_column, self.sort_descending)
+        if mask is None:
+            return order
+        visible = mask.count(1)
+        if visible == len(order):
+            return order
+        if visible * 2 < len(order):
+            # Menos de metade visível: ordena só essas entradas pela sua posição na ordenação, em vez de
+            # percorrer a permutação inteira
+            ranks = self.listing.sort_ranks(self.sort_column, self.sort_descending)
+            return array("q", sorted(compress(range(len(order)), mask), key=ranks.__getitem__))
+        return array("q", compress(order, map(mask.__getitem__, order)))
+
+    def set_listing(self, listing):
+        # Substitui a listagem exibida, mantendo o filtro e a ordenação atuais
+        self.beginResetModel()
+        self.listing = listing
+        self.mask = self._filter_mask(self.filter_mode, self.filter_text)
+        self.rows = self._ordered(self.mask)
+        self.endResetModel()
+
+    def set_filter(self, mode, text):
+        # Aplica um novo filtro; quando o texto só cresce, verifica apenas as entradas já visíveis
+        incremental = (mode == self.filter_mode and mode in ("Substring", "Prefix")
+                       and self.filter_text and text.startswith(self.filter_text))
+        mask = self._filter_mask(mode, text, self.mask if incremental else None)
+        if incremental:
+            rows = array("q", compress(self.rows, map(mask.__getitem__, self.rows)))
+        else:
+            rows = self._ordered(mask)
+        self.filter_mode = mode
+        self.filter_text = text
+        self.beginResetModel()
+        self.mask = mask
+        self.rows = rows
+        self.endResetModel()
+
+    def _filter_mask(self, mode, text, candidates=None):
+        # Calcula a máscara das entradas visíveis para o filtro indicado (None sem filtro)
+        if not text:
+            return None
+        return filter_mask(self.listing, mode, text, candidates)
+
+    def entry_index(self, index):
+        # Converte um índice do modelo no índice da entrada na listagem
+        return self.rows[index.row()] if index.isValid() else None
+
+# Barra de filtro por nome (substring, prefixo, glob ou expressão regular)
+class FilterBar(QWidget):
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.model = model
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter")
+        self.filter_input.setClearButtonEnabled(True)
+        # Enquanto se escreve, o filtro só é aplicado quando a escrita pára (ou ao carregar em Enter)
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(FILTER_DEBOUNCE_DELAY)
+        self.debounce.timeout.connect(self.apply_filter)
+        self.filter_input.textChanged.connect(lambda text: self.debounce.start())
+        self.filter_input.returnPressed.connect(self.apply_filter)
+        layout.addWidget(self.filter_input)
+
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(FILTER_MODES)
+        self.mode_combo.currentTextChanged.connect(self.apply_filter)
+        layout.addWidget(self.mode_combo)
+
+        self.setLayout(layout)
+
+    def apply_filter(self):
+        # Filtra a listagem com o texto e o modo atuais
+        self.debounce.stop()
+        self.model.set_filter(self.mode_combo.currentText(), self.filter_input.text())
+
+    def clear(self):
+        # Limpa o filtro de imediato (por exemplo, ao mudar de diretório)
+        self.filter_input.clear()
+        self.apply_filter()
+
+def create_listing_view(owner, model):
+    # Cria a vista da listagem com o menu contextual e a navegação por duplo clique do painel
+    view = QTreeView()
+    view.setModel(model)
+    view.setRootIsDecorated(False)
+    view.setUniformRowHeights(True)
+    view.setSortingEnabled(True)
+    view.sortByColumn(0, Qt.AscendingOrder)
+    view.header().setSectionResizeMode(0, QHeaderView.Stretch)
+    view.header().setStretchLastSection(False)
+    view.doubleClicked.connect(owner.navigate_to_directory)
+    view.setContextMenuPolicy(Qt.CustomContextMenu)
+    view.customContextMenuRequested.connect(owner.show_context_menu)
+    if model.drag_source or model.drop_target:
+        view.setDragEnabled(bool(model.drag_source))
+        view.setAcceptDrops(bool(model.drop_target))
+        view.setDropIndicatorShown(True)
+        view.setDragDropMode(QAbstractItemView.DragDrop)
+        view.setDefaultDropAction(Qt.CopyAction)
+    return view
+
+def join_remote_path(base, name):
+    # Junta e normaliza caminhos remotos (sempre absolutos)
+    path = posixpath.normpath(posixpath.join(base, name))
+    return "/" + path.lstrip("/")
+
+def list_remote_directory(ftp, path):
+    # Lista um diretório remoto e devolve a DirectoryListing correspondente
+    ftp.cwd(path)
+    listing = DirectoryListing()
+    # Cada linha é interpretada à medida que chega, sem guardar a resposta inteira
+    ftp.retrlines('LIST', listing.append_line)
+    listing.seal()
+    return listing
+
+def nlst_matches(ftp, directory, pattern, case_sensitive=True):
+    # Pede ao servidor só os nomes que correspondem ao padrão glob (NLST diretório/padrão) e confirma com SIZE,
+    # em pipeline, quais são arquivos. Devolve os caminhos, ou None se o servidor não aplicou o padrão (nesse
+    # caso, ou se nada corresponder, quem chama filtra a listagem completa). Os servidores distinguem
+    # maiúsculas de minúsculas: sem case_sensitive, um padrão com letras deixaria de fora nomes que lhe
+    # correspondem, e só os padrões sem letras são enviados
+    if not case_sensitive and pattern.lower() != pattern.upper():
+        return None
+    try:
+        names = ftp.nlst(join_remote_path(directory, pattern))
+    except (error_perm, error_temp):
+        return None
+    names = [posixpath.basename(name.rstrip("/")) for name in names]
+    if ftp.features is None:
+        ftp.probe_features()
+    match = re.compile(fnmatch.translate(pattern), 0 if case_sensitive else re.IGNORECASE).match
+    if not names or not all(match(name) for name in names) or "SIZE" not in (ftp.features or ()):
+        return None
+    paths = [join_remote_path(directory, name) for name in names]
+    ftp.voidcmd("TYPE I")
+    replies = pipeline_commands(ftp, [[f"SIZE {path}"] for path in paths])
+    return [path for path, (ok, _) in zip(paths, replies) if ok]
+
+def remote_directory_mtime(ftp, path):
+    # Data de modificação de um diretório via MLST (sem conexão de dados), ou None se não estiver disponível
+    try:
+        response = ftp.sendcmd("MLST " + path)
+    except error_perm:
+        return None
+    for line in response.splitlines()[1:-1]:
+        for fact in line.strip().split(" ", 1)[0].split(";"):
+            key, _, value = fact.partition("=")
+            if key.lower() == "modify":
+                try:
+                    return float(calendar.timegm(time.strptime(value[:14], "%Y%m%d%H%M%S")))
+                except ValueError:
+                    return None
+    return None
+
+# Cache dos tamanhos dos diretórios remotos, indexada por host, caminho e data de modificação
+class DirectorySizeCache:
+    def __init__(self):
+        # (host, porta, utilizador) -> {caminho: (data, arquivos, bytes, [(subdiretório, data)])}
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, server, path, mtime):
+        # Devolve o resumo do diretório se a data de modificação não mudou
+        with self.lock:
+            entry = self.entries.get(server, {}).get(path)
+        if entry is None or not mtime or entry[0] != mtime:
+            return None
+        return entry[1:]
+
+    def put(self, server, path, mtime, summary):
+        # Guarda o resumo do diretório (só com data conhecida, para poder validá-lo depois)
+        if mtime:
+            with self.lock:
+                self.entries.setdefault(server, {})[path] = (mtime,) + tuple(summary)
+
+# Thread que calcula o tamanho de uma árvore remota com várias conexões em paralelo
+class DirectorySizeWorker(QThread):
+    progress = pyqtSignal(int, int, int)
+    completed = pyqtSignal(dict, list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, open_session, server, path, mtime, cache, parent=None):
+        super().__init__(parent)
+        self.open_session = open_session
+        self.server = server
+        self.path = path
+        self.mtime = mtime
+        self.cache = cache
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        # Pede às conexões de trabalho que parem
+        self.cancelled.set()
+
+    def run(self):
+        # Percorre a árvore: cada diretório só é listado se a sua data mudou desde o último cálculo
+        lock = threading.Lock()
+        counters = [0, 0, 0]
+        # A data exata de cada diretório vem do MLST; sem MLST usa-se a data da listagem do pai
+        use_mlst = [True]
+
+        def visit(ftp, path, mtime):
+            # Resumo (arquivos, bytes, [(subdiretório, data)]) do diretório, da cache ou da listagem
+            if use_mlst[0]:
+                exact_mtime = ftp.call(remote_directory_mtime, ftp, path)
+                if exact_mtime is None:
+                    use_mlst[0] = False
+                else:
+                    mtime = exact_mtime
+            summary = self.cache.get(self.server, path, mtime)
+            if summary is not None and not use_mlst[0]:
+                # Sem MLST, as datas dos subdiretórios guardadas na cache podem estar desatualizadas
+                summary = summary[:2] + ([(name, None) for name, _ in summary[2]],)
+            if summary is None:
+                listing = ftp.call(list_remote_directory, ftp, path)
+                files = [i for i in range(len(listing)) if not listing.is_dir[i]]
+                summary = (len(files), sum(listing.sizes[i] for i in files),
+                           [(listing.names[i], listing.mtimes[i]) for i in range(len(listing)) if listing.is_dir[i]])
+                self.cache.put(self.server, path, mtime, summary)
+            with lock:
+                counters[0] += 1
+                counters[1] += summary[0]
+                counters[2] += summary[1]
+                self.progress.emit(*counters)
+            return summary, [(posixpath.join(path, name), sub_mtime) for name, sub_mtime in summary[2]]
+
+        try:
+            summaries, errors = walk_remote_tree(self.open_session, [self.path], self.cancelled, visit=visit,
+                                                 root_data=self.mtime)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        if self.cancelled.is_set():
+            return
+        if self.path not in summaries:
+            self.failed.emit(errors[0][1])
+            return
+
+        # Soma os totais de baixo para cima: caminho -> [arquivos, bytes, subdiretórios]
+        totals = {path: [summary[0], summary[1], len(summary[2])] for path, summary in summaries.items()}
+        for path in sorted(summaries, key=lambda path: path.count("/"), reverse=True):
+            for name, _ in summaries[path][2]:
+                child = totals.get(posixpath.join(path, name))
+                if child:
+                    totals[path][0] += child[0]
+                    totals[path][1] += child[1]
+                    totals[path][2] += child[2]
+        self.completed.emit(totals, errors)
+
+# Diálogo que mostra o total de um diretório remoto e de cada subdiretório
+class DirectorySizeDialog(QDialog):
+    def __init__(self, path, totals, errors, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Size of {path}")
+        self.resize(500, 400)
+        self.layout = QVBoxLayout()
+
+        files, size, directories = totals[path]
+        self.layout.addWidget(QLabel(f"{path}: {format_size(size)} in {files} files and {directories} folders"))
+        if errors:
+            self.layout.addWidget(QLabel(f"{len(errors)} folders could not be listed"))
+
+        # Subdiretórios diretos, do maior para o menor
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Folder", "Files", "Size"])
+        self.tree.setRootIsDecorated(False)
+        prefix = path.rstrip("/") + "/"
+        children = [(child, total) for child, total in totals.items()
+                    if child.startswith(prefix) and "/" not in child[len(prefix):]]
+        for child, (child_files, child_size, _) in sorted(children, key=lambda item: -item[1][1]):
+            self.tree.addTopLevelItem(QTreeWidgetItem([child[len(prefix):], str(child_files), format_size(child_size)]))
+        self.layout.addWidget(self.tree)
+
+        self.setLayout(self.layout)
+
+def pipeline_commands(ftp, groups, progress=None, window=PIPELINE_WINDOW):
+    # Envia grupos de comandos (ex.: RNFR + RNTO) sem esperar por cada resposta, com até `window` comandos
+    # em voo, e devolve por grupo (sucesso, última resposta). Se a conexão cair, os grupos sem resposta
+    # ficam marcados como não executados e a sessão é restabelecida.
+    commands = deque((index, command) for index, group in enumerate(groups) for command in group)
+    replies = [[] for _ in groups]
+    in_flight = deque()
+    done = 0
+    try:
+        while commands or in_flight:
+            while commands and len(in_flight) < window:
+                index, command = commands.popleft()
+                ftp.putcmd(command)
+                in_flight.append(index)
+            index = in_flight.popleft()
+            try:
+                replies[index].append(ftp.getresp())
+            except (error_perm, error_temp) as e:
+                if str(e).startswith("421"):
+                    raise
+                replies[index].append(str(e))
+            if len(replies[index]) == len(groups[index]):
+                done += 1
+                if progress:
+                    progress(done)
+    except Exception as e:
+        if not is_connection_lost(e):
+            raise
+        if isinstance(ftp, ReconnectingFTP) and ftp.credentials:
+            ftp.reconnect()
+    return [(len(reply) == len(group) and all(line[:1] in "23" for line in reply),
+             reply[-1] if len(reply) == len(group) else "Not completed: connection lost")
+            for group, reply in zip(groups, replies)]
+
+# Thread que executa uma operação em lote numa sessão própria, com os comandos em pipeline
+class BulkCommandWorker(QThread):
+    progress = pyqtSignal(int)
+    completed = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, open_session, groups, parent=None):
+        super().__init__(parent)
+        self.open_session = open_session
+        self.groups = groups
+
+    def run(self):
+        try:
+            ftp = self.open_session()
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        try:
+            self.completed.emit(pipeline_commands(ftp, self.groups, self.progress.emit))
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            close_session(ftp)
+
+def close_session(ftp):
+    # Termina uma sessão de trabalho, fechando o socket se o QUIT falhar
+    try:
+        ftp.quit()
+    except Exception:
+        ftp.close()
+    scheduler.release_session(ftp)
+
+def list_subdirectories(ftp, path, data):
+    # Visita de omissão de walk_remote_tree: devolve a listagem do diretório e os seus subdiretórios
+    listing = ftp.call(list_remote_directory, ftp, path)
+    return listing, [(join_remote_path(path, listing.names[i]), None) for i in range(len(listing)) if listing.is_dir[i]]
+
+def walk_remote_tree(open_session, roots, cancelled, progress=None, workers=DIRECTORY_WALK_WORKERS,
+                     visit=list_subdirectories, root_data=None):
+    # Percorre em paralelo toda a árvore abaixo dos diretórios indicados e devolve ({caminho: resultado}, erros).
+    # visit(ftp, caminho, dado) devolve o resultado do diretório (por omissão, a listagem) e os subdiretórios a
+    # visitar, como pares (caminho, dado); o dado das raízes é root_data. Um diretório cuja visita falhe
+    # fica só nos erros, sem interromper o resto da árvore
+    queue = Queue()
+    for root in roots:
+        queue.put((root, root_data))
+    listings = {}
+    errors = []
+    lock = threading.Lock()
+    outstanding = [len(roots)]
+    finished = threading.Event()
+    # Desiste das vagas ainda em espera quando a árvore acaba (ou a operação é cancelada)
+    stopped = threading.Event()
+    if not roots:
+        finished.set()
+
+    def walk():
+        try:
+            ftp = open_session(cancelled=stopped)
+        except Exception as e:
+            with lock:
+                errors.append(("", str(e)))
+            return
+        if ftp is None:
+            return
+        try:
+            while not cancelled.is_set() and not finished.is_set():
+                try:
+                    path, data = queue.get(timeout=0.2)
+                except Empty:
+                    continue
+                try:
+                    result, children = visit(ftp, path, data)
+                except Exception as e:
+                    result, children = None, []
+                    with lock:
+                        errors.append((path, str(e)))
+                with lock:
+                    if result is not None:
+                        listings[path] = result
+                    for child in children:
+                        outstanding[0] += 1
+                        queue.put(child)
+                    outstanding[0] -= 1
+                    if outstanding[0] == 0:
+                        finished.set()
+                        stopped.set()
+                    if progress:
+                        progress(len(listings))
+        finally:
+            close_session(ftp)
+
+    threads = [threading.Thread(target=walk, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            if cancelled.is_set():
+                stopped.set()
+            thread.join(0.2)
+    if not finished.is_set() and not cancelled.is_set():
+        raise RuntimeError(errors[0][1] if errors else "The directory walk did not finish")
+    return listings, errors
+
+# Thread que exclui árvores remotas: conta tudo primeiro e depois apaga os arquivos em paralelo
+# e os diretórios de baixo para cima
+class RecursiveDeleteWorker(QThread):
+    progress = pyqtSignal(str, int, int)
+    planned = pyqtSignal(int, int, int)
+    completed = pyqtSignal(int, list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, open_session, entries, plan=None, parent=None):
+        super().__init__(parent)
+        self.open_session = open_session
+        # Itens a excluir: lista de (caminho absoluto, é_diretório)
+        self.entries = entries
+        # Plano calculado numa execução anterior (contagem): (arquivos, diretórios, bytes)
+        self.plan = plan
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        # Interrompe com segurança: os lotes em curso terminam, mas não são enviados mais comandos
+        self.cancelled.set()
+
+    def run(self):
+        try:
+            if self.plan is None:
+                self.plan = self.build_plan()
+                if not self.cancelled.is_set():
+                    files, directories, size = self.plan
+                    self.planned.emit(len(files), len(directories), size)
+            else:
+                self.delete(*self.plan[:2])
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def build_plan(self):
+        # Percorre as árvores e devolve os arquivos, os diretórios (do mais profundo para o menos) e os bytes
+        roots = [path for path, is_dir in self.entries if is_dir]
+        listings, errors = walk_remote_tree(self.open_session, roots, self.cancelled,
+                                            lambda count: self.progress.emit("Counting", count, 0))
+        if errors:
+            raise RuntimeError(f"Could not list {errors[0][0]}: {errors[0][1]}")
+        files = [path for path, is_dir in self.entries if not is_dir]
+        size = 0
+        for path, listing in listings.items():
+            for i in range(len(listing)):
+                if not listing.is_dir[i]:
+                    files.append(join_remote_path(path, listing.names[i]))
+                    size += listing.sizes[i]
+        directories = sorted(listings, key=lambda path: path.count("/"), reverse=True)
+        return files, directories, size
+
+    def delete(self, files, directories):
+        # Apaga os arquivos com várias conexões e depois os diretórios, um nível de profundidade de cada vez
+        total = len(files) + len(directories)
+        counters = [0]
+        errors = []
+        lock = threading.Lock()
+
+        def run_batches(commands):
+            batches = Queue()
+            for start in range(0, len(commands), DELETE_BATCH_SIZE):
+                batches.put(commands[start:start + DELETE_BATCH_SIZE])
+
+            def work():
+                try:
+                    ftp = self.open_session()
+                except Exception as e:
+                    with lock:
+                        errors.append(("", str(e)))
+                    return
+                try:
+                    while not self.cancelled.is_set():
+                        try:
+                            batch = batches.get_nowait()
+                        except Empty:
+                            break
+                        results = pipeline_commands(ftp, [[command] for command in batch])
+                        with lock:
+                            for command, (ok, reply) in zip(batch, results):
+                                if ok:
+                                    counters[0] += 1
+                                else:
+                                    errors.append((command.split(" ", 1)[1], reply))
+                            self.progress.emit("Deleting", counters[0], total)
+                finally:
+                    close_session(ftp)
+
+            threads = [threading.Thread(target=work, daemon=True)
+                       for _ in range(min(DIRECTORY_WALK_WORKERS, batches.qsize()))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        run_batches(["DELE " + path for path in files])
+        depths = sorted({path.count("/") for path in directories}, reverse=True)
+        for depth in depths:
+            if self.cancelled.is_set():
+                break
+            run_batches(["RMD " + path for path in directories if path.count("/") == depth])
+        self.completed.emit(counters[0], errors)
+
+# Classe que liga um download a um upload através de um buffer circular em memória, de tamanho fixo:
+# quem escreve espera enquanto o buffer está cheio e quem lê espera enquanto está vazio
+class RelayBuffer:
+    def __init__(self, capacity=RELAY_BUFFER_SIZE):
+        self.buffer = bytearray(capacity)
+        self.start = 0
+        self.length = 0
+        self.closed = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def write(self, data):
+        # Copia os dados para o buffer, esperando por espaço livre (pressão de retorno sobre o download)
+        data = memoryview(data)
+        capacity = len(self.buffer)
+        while data:
+            with self.condition:
+                while self.length == capacity and self.error is None:
+                    self.condition.wait()
+                if self.error is not None:
+                    raise self.error
+                end = (self.start + self.length) % capacity
+                count = min(len(data), capacity - self.length, capacity - end)
+                self.buffer[end:end + count] = data[:count]
+                self.length += count
+                self.condition.notify_all()
+            data = data[count:]
+
+    def read(self, size=RELAY_BLOCK_SIZE):
+        # Devolve até size bytes, esperando por dados; devolve b"" quando o download terminou
+        with self.condition:
+            while not self.length and not self.closed and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise self.error
+            count = min(size, self.length, len(self.buffer) - self.start)
+            data = bytes(self.buffer[self.start:self.start + count])
+            self.start = (self.start + count) % len(self.buffer)
+            self.length -= count
+            self.condition.notify_all()
+            return data
+
+    def wait_ready(self):
+        # Espera pelos primeiros dados (ou pelo fim do download), para não criar o arquivo de destino
+        # quando o de origem não pode ser lido
+        with self.condition:
+            while not self.length and not self.closed and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise self.error
+
+    def close(self):
+        # Indica que não há mais dados a escrever
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def abort(self, error):
+        # Interrompe os dois lados da cópia com o erro indicado
+        with self.condition:
+            if self.error is None:
+                self.error = error
+            self.condition.notify_all()
+
+def relay_transfer(source, source_path, target, target_path):
+    # Copia um arquivo entre dois servidores passando pelo cliente: o RETR da origem corre numa thread e
+    # alimenta diretamente o STOR do destino, sem ocupar espaço em disco
+    buffer = RelayBuffer()
+    download_error = []
+
+    def download():
+        try:
+            source.retrbinary("RETR " + source_path, buffer.write, RELAY_BLOCK_SIZE)
+            buffer.close()
+        except Exception as e:
+            download_error.append(e)
+            buffer.abort(e)
+
+    thread = threading.Thread(target=download, daemon=True)
+    thread.start()
+    try:
+        buffer.wait_ready()
+        target.storbinary("STOR " + target_path, buffer, RELAY_BLOCK_SIZE)
+    except Exception as e:
+        buffer.abort(e)
+        thread.join()
+        raise download_error[0] if download_error else e
+    thread.join()
+
+# Erro usado quando um dos servidores recusa a ligação direta do FXP (PASV/PORT ou a conexão de dados)
+class FXPRefused(Exception):
+    pass
+
+def fxp_transfer(source, source_path, target, target_path):
+    # Copia um arquivo diretamente entre dois servidores (FXP): o de origem abre uma porta passiva (PASV)
+    # e o de destino liga-se a ela (PORT), pelo que os dados não passam pelo cliente. Só a recusa do
+    # PASV/PORT ou da conexão de dados (425) gera FXPRefused; os outros erros são do próprio arquivo
+    source.voidcmd("TYPE I")
+    target.voidcmd("TYPE I")
+    if source.features is None:
+        source.probe_features()
+    if "SIZE" in (source.features or ()):
+        # Confirma que o arquivo de origem existe antes de o STOR o criar (vazio) no destino
+        source.size(source_path)
+    try:
+        host, port = parse227(source.sendcmd("PASV"))
+        target.voidcmd("PORT " + ",".join(host.split(".") + [str(port >> 8), str(port & 0xFF)]))
+    except (error_perm, error_temp, error_reply) as e:
+        raise FXPRefused(str(e)) from e
+    try:
+        target.sendcmd("STOR " + target_path)
+        try:
+            source.sendcmd("RETR " + source_path)
+        except error_perm:
+            # A origem recusou o arquivo depois de o destino o ter criado: abandona o STOR e apaga o arquivo vazio
+            target.reconnect()
+            with contextlib.suppress(error_perm):
+                target.delete(target_path)
+            raise
+        source.voidresp()
+        target.voidresp()
+    except error_temp as e:
+        if str(e).startswith("425"):
+            raise FXPRefused(str(e)) from e
+        raise
+
+# Thread que copia arquivos e diretórios entre dois servidores, por FXP ou, se recusado, através do cliente
+class ServerToServerWorker(QThread):
+    progress = pyqtSignal(int, int)
+    completed = pyqtSignal(int, int, list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, open_source, open_target, entries, target_directory, parent=None):
+        super().__init__(parent)
+        self.open_source = open_source
+        self.open_target = open_target
+        # Itens de origem: lista de (caminho absoluto, é_diretório)
+        self.entries = entries
+        self.target_directory = target_directory
+        self.cancelled = threading.Event()
+        self.fxp_refused = False
+
+    def cancel(self):
+        # Interrompe a cópia no fim do arquivo em curso
+        self.cancelled.set()
+
+    def run(self):
+        # A árvore é listada antes de abrir o par de sessões, para que as sessões da listagem não fiquem
+        # à espera das vagas ocupadas pelo par
+        source = target = None
+        try:
+            directories, files = self.build_plan()
+            if not self.cancelled.is_set():
+                source = self.open_source(cancelled=self.cancelled)
+            if source is not None:
+                target = self.open_target(cancelled=self.cancelled, paired_with=source)
+        except Exception as e:
+            self.failed.emit(str(e))
+        if target is None:
+            # Cancelada (ou falhada) antes de ter as duas sessões
+            if source is not None:
+                close_session(source)
+            return
+        # Com as conexões de dados cifradas (PROT P), os dois servidores fariam o papel de servidor TLS na mesma
+        # conexão e cada arquivo ficaria parado até ao timeout: copia através do cliente
+        if getattr(source, "_prot_p", False) or getattr(target, "_prot_p", False):
+            self.fxp_refused = True
+        try:
+            for directory in directories:
+                try:
+                    target.call(target.mkd, directory, idempotent=False)
+                except error_perm:
+                    pass  # O diretório já existe
+            relayed = 0
+            errors = []
+            for done, (source_path, target_path) in enumerate(files):
+                if self.cancelled.is_set():
+                    break
+                try:
+                    relayed += self.copy_file(source, source_path, target, target_path) == "relay"
+                except Exception as e:
+                    errors.append((source_path, str(e)))
+                    # Ressincroniza as sessões, que podem ter ficado a meio de uma transferência
+                    source.reconnect()
+                    target.reconnect()
+                self.progress.emit(done + 1, len(files))
+            self.completed.emit(len(files) - len(errors), relayed, errors)
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            close_session(source)
+            close_session(target)
+
+    def build_plan(self):
+        # Devolve os diretórios a criar no destino (dos menos para os mais profundos) e os pares de arquivos
+        roots = [path for path, is_dir in self.entries if is_dir]
+        listings, errors = walk_remote_tree(self.open_source, roots, self.cancelled)
+        if errors:
+            raise RuntimeError(f"Could not list {errors[0][0]}: {errors[0][1]}")
+
+        def target_for(path):
+            # Caminho no destino: relativo ao diretório-pai do item selecionado na origem
+            for root, _ in self.entries:
+                if path == root or path.startswith(root.rstrip("/") + "/"):
+                    return join_remote_path(self.target_directory,
+                                            posixpath.relpath(path, posixpath.dirname(root)))
+            return join_remote_path(self.target_directory, posixpath.basename(path))
+
+        files = [(path, target_for(path)) for path, is_dir in self.entries if not is_dir]
+        for path, listing in listings.items():
+            for i in range(len(listing)):
+                if not listing.is_dir[i]:
+                    source_path = join_remote_path(path, listing.names[i])
+                    files.append((source_path, target_for(source_path)))
+        directories = [target_for(path) for path in sorted(listings, key=lambda path: path.count("/"))]
+        return directories, files
+
+    def copy_file(self, source, source_path, target, target_path):
+        # Tenta o FXP; se um dos servidores o recusar, volta a ligar as sessões e copia através do cliente
+        if not self.fxp_refused:
+            try:
+                fxp_transfer(source, source_path, target, target_path)
+                return "fxp"
+            except FXPRefused:
+                self.fxp_refused = True
+                source.reconnect()
+                target.reconnect()
+        source.call(relay_transfer, source, source_path, target, target_path)
+        return "relay"
+
+# Diálogo com o resultado de cada item de uma operação em lote
+class BulkResultDialog(QDialog):
+    def __init__(self, title, names, results, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.resize(600, 400)
+        self.layout = QVBoxLayout()
+
+        failures = sum(1 for ok, _ in results if not ok)
+        self.layout.addWidget(QLabel(f"{len(results) - failures} succeeded, {failures} failed"))
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Item", "Result"])
+        self.tree.setRootIsDecorated(False)
+        # Os itens que falharam aparecem primeiro
+        for name, (ok, reply) in sorted(zip(names, results), key=lambda item: item[1][0]):
+            self.tree.addTopLevelItem(QTreeWidgetItem([name, reply.strip() if ok else f"Failed: {reply.strip()}"]))
+        self.layout.addWidget(self.tree)
+
+        self.setLayout(self.layout)
+
+# Cache das listagens remotas, partilhada pelas abas, com validade e número de entradas limitados
+class ListingCache:
+    def __init__(self, max_entries=LISTING_CACHE_MAX_ENTRIES, ttl=LISTING_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (host, porta, utilizador, caminho) -> (instante, DirectoryListing), da menos para a mais recente
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, server, path):
+        # Devolve a listagem guardada se ainda for válida
+        key = server + (path,)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, server, path, listing):
+        # Guarda uma listagem, descartando as usadas há mais tempo
+        with self.lock:
+            self.entries[server + (path,)] = (time.monotonic(), listing)
+            self.entries.move_to_end(server + (path,))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, server, path):
+        # Remove a listagem do caminho e as de todos os seus subdiretórios
+        prefix = path.rstrip("/") + "/"
+        with self.lock:
+            for key in [key for key in self.entries if key[:-1] == server
+                        and (key[-1] == path or key[-1].startswith(prefix))]:
+                del self.entries[key]
+
+# Pré-carrega, numa conexão secundária, as listagens dos subdiretórios do diretório atual
+class ListingPrefetcher:
+    def __init__(self, open_session, server, cache):
+        self.open_session = open_session
+        self.server = server
+        self.cache = cache
+        # Caminhos por carregar, do mais para o menos prioritário
+        self.pending = []
+        self.condition = threading.Condition()
+        self.running = False
+
+    def schedule(self, paths):
+        # Substitui a fila pelos subdiretórios do novo diretório (até ao limite do orçamento)
+        with self.condition:
+            self.pending = [path for path in paths if self.cache.get(self.server, path) is None]
+            del self.pending[PREFETCH_MAX_DIRECTORIES:]
+            self._start()
+
+    def prioritize(self, path):
+        # Passa o caminho (linha selecionada ou sob o cursor) para o início da fila
+        if self.cache.get(self.server, path) is not None:
+            return
+        with self.condition:
+            if path in self.pending:
+                self.pending.remove(path)
+            self.pending.insert(0, path)
+            self._start()
+
+    def _start(self):
+        # Acorda a thread de pré-carregamento, criando-a se necessário (chamado com a condição adquirida)
+        if self.pending:
+            self.condition.notify()
+            if not self.running:
+                self.running = True
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        # Executado em segundo plano: lista os caminhos pendentes; termina após um período sem trabalho
+        ftp = None
+        while True:
+            with self.condition:
+                scheduler.wait_idle(self.condition, ftp, lambda: self.pending)
+                if not self.pending:
+                    self.running = False
+                    break
+                path = self.pending.pop(0)
+            if self.cache.get(self.server, path) is not None:
+                continue
+            try:
+                if ftp is None:
+                    # Sem vaga livre não há pré-carregamento: esperar por ela faria as sessões das transferências
+                    # cederem a vaga (scheduler.contended) a um trabalho apenas especulativo
+                    ftp = self.open_session(wait=False)
+                    if ftp is None:
+                        with self.condition:
+                            self.pending = []
+                        continue
+                self.cache.put(self.server, path, list_remote_directory(ftp, path))
+            except Exception:
+                # Falhas são ignoradas: a navegação normal voltará a listar o diretório
+                if ftp is not None:
+                    ftp.close()
+                    scheduler.release_session(ftp)
+                ftp = None
+        if ftp is not None:
+            close_session(ftp)
+
+# Sistema de arquivos local com a mesma interface do FTPFS, para que os dois painéis partilhem a navegação,
+# as operações sobre arquivos e as transferências
+class LocalFS:
+    def join(self, base, *names):
+        return os.path.join(base, *names)
+
+    def parent(self, path):
+        return os.path.dirname(path)
+
+    def relative_parts(self, path, start):
+        # Componentes de path relativamente a start (para recriar a árvore noutro sistema de arquivos)
+        return os.path.relpath(path, start).split(os.sep)
+
+    def list(self, path, cached=True):
+        # Devolve (caminho absoluto, listagem) do diretório
+        return os.path.abspath(path), DirectoryListing.from_local(path)
+
+    def stat(self, path):
+        # Devolve (é_diretório, tamanho, data de modificação), ou None se o caminho não existir
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        is_dir = os.path.isdir(path)
+        return is_dir, 0 if is_dir else stat.st_size, stat.st_mtime
+
+    def open(self, path, mode="rb", offset=0):
+        f = open(path, mode)
+        if offset:
+            f.seek(offset)
+        return f
+
+    def mkdir(self, path, exist_ok=False):
+        if exist_ok:
+            os.makedirs(path, exist_ok=True)
+        else:
+            os.mkdir(path)
+
+    def remove(self, path, is_dir):
+        if is_dir:
+            os.rmdir(path)
+        else:
+            os.remove(path)
+
+    def rename(self, old_path, new_path):
+        os.rename(old_path, new_path)
+
+    def walk(self, roots, cancelled):
+        # Lista toda a árvore abaixo dos diretórios indicados e devolve ({caminho: listagem}, erros);
+        # não segue ligações simbólicas para diretórios, que podem formar ciclos
+        listings = {}
+        errors = []
+        pending = list(roots)
+        while pending and not cancelled.is_set():
+            path = pending.pop()
+            try:
+                listing = DirectoryListing.from_local(path)
+            except OSError as e:
+                errors.append((path, str(e)))
+                continue
+            listings[path] = listing
+            for i in range(len(listing)):
+                child = os.path.join(path, listing.names[i])
+                if listing.is_dir[i] and not os.path.islink(child):
+                    pending.append(child)
+        return listings, errors
+
+    def session(self, priority=PRIORITY_BULK):
+        # O sistema de arquivos local pode ser usado diretamente por outras threads
+        return self
+
+    def close(self):
+        pass
+
+# Sistema de arquivos de um servidor FTP: as listagens passam pela cache partilhada (que as operações invalidam)
+# e as sessões próprias para threads são abertas com open_session
+class FTPFS:
+    def __init__(self, ftp, server=None, listing_cache=None, open_session=None):
+        self.ftp = ftp
+        self.server = server
+        self.listing_cache = listing_cache
+        self.open_session = open_session
+
+    def join(self, base, *names):
+        return join_remote_path(base, posixpath.join(*names)) if names else base
+
+    def parent(self, path):
+        return posixpath.dirname(path)
+
+    def relative_parts(self, path, start):
+        return posixpath.relpath(path, start).split("/")
+
+    def resolve(self, path):
+        # Muda de diretório no servidor e devolve o caminho absoluto resultante
+        self.ftp.cwd(path)
+        return self.ftp.pwd()
+
+    def cached_listing(self, path):
+        # Listagem do diretório guardada na cache, ou None (nunca acede ao servidor)
+        return self.listing_cache.get(self.server, path) if self.listing_cache else None
+
+    def list(self, path, cached=True):
+        # Devolve (caminho absoluto, listagem) do diretório; com cached=False volta sempre a listá-lo
+        if cached:
+            listing = self.cached_listing(path)
+            if listing is not None:
+                return path, listing
+            path = self.ftp.call(self.resolve, path)
+        listing = self.ftp.call(list_remote_directory, self.ftp, path)
+        if self.listing_cache:
+            self.listing_cache.put(self.server, path, listing)
+        return path, listing
+
+    def stat(self, path):
+        # Devolve (é_diretório, tamanho, data de modificação) a partir da listagem do diretório-pai
+        # (em cache, normalmente), ou None se o caminho não existir
+        try:
+            _, listing = self.list(self.parent(path))
+        except error_perm:
+            return None
+        name = posixpath.basename(path)
+        for i in range(len(listing)):
+            if listing.names[i] == name:
+                return bool(listing.is_dir[i]), listing.sizes[i], listing.mtimes[i]
+        return None
+
+    @contextlib.contextmanager
+    def open(self, path, mode="rb", offset=0):
+        # Abre o arquivo numa conexão de dados: leitura ("rb") ou escrita ("wb"), a partir de offset (REST),
+        # ou acrescento ao fim do arquivo ("ab", com APPE)
+        self.ftp.voidcmd("TYPE I")
+        command = {"rb": "RETR ", "wb": "STOR ", "ab": "APPE "}[mode]
+        conn = self.ftp.transfercmd(command + path, offset or None)
+        stream = conn.makefile("rb" if mode == "rb" else "wb")
+        try:
+            yield stream
+            stream.close()
+        except BaseException:
+            stream.close()
+            if mode == "rb":
+                abort_transfer(self.ftp, conn)
+            else:
+                conn.close()
+                with contextlib.suppress(Error, OSError, EOFError):
+                    self.ftp.voidresp()
+            raise
+        if mode == "rb" and conn.recv(1):
+            abort_transfer(self.ftp, conn)  # O arquivo não foi lido até ao fim
+            return
+        if hasattr(conn, "unwrap"):
+            conn.unwrap()  # Fecha a sessão TLS da conexão de dados, como o ftplib
+        conn.close()
+        self.ftp.voidresp()
+        self.invalidate(self.parent(path))
+
+    def mkdir(self, path, exist_ok=False):
+        try:
+            self.ftp.call(self.ftp.mkd, path, idempotent=False)
+        except error_perm:
+            if not exist_ok:
+                raise
+        self.invalidate(self.parent(path))
+
+    def remove(self, path, is_dir):
+        if is_dir:
+            self.ftp.call(self.ftp.rmd, path, idempotent=False)
+            self.invalidate(path)
+        else:
+            self.ftp.call(self.ftp.delete, path, idempotent=False)
+        self.invalidate(self.parent(path))
+
+    def rename(self, old_path, new_path):
+        self.ftp.call(self.ftp.rename, old_path, new_path, idempotent=False)
+        self.invalidate(old_path)
+        self.invalidate(self.parent(old_path))
+        self.invalidate(self.parent(new_path))
+
+    def invalidate(self, path):
+        # Descarta as listagens em cache do caminho e dos subdiretórios
+        if self.listing_cache:
+            self.listing_cache.invalidate(self.server, path)
+
+    def walk(self, roots, cancelled):
+        return walk_remote_tree(self.open_session, roots, cancelled)
+
+    def session(self, priority=PRIORITY_BULK):
+        # Cópia deste sistema de arquivos com uma sessão própria, para usar numa thread (a conexão é pedida
+        # ao escalonador com a prioridade indicada)
+        return FTPFS(self.open_session(priority), self.server, self.listing_cache, self.open_session)
+
+    def close(self):
+        close_session(self.ftp)
+
+# Thread que prepara a transferência de itens entre dois sistemas de arquivos: percorre os diretórios
+# na origem, cria-os no destino e devolve os pares (origem, destino) dos arquivos a transferir
+class TransferPlanWorker(QThread):
+    planned = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, source_fs, target_fs, entries, target_directory, parent=None):
+        super().__init__(parent)
+        self.source_fs = source_fs
+        self.target_fs = target_fs
+        # Itens a transferir: lista de (caminho na origem, é_diretório)
+        self.entries = entries
+        self.target_directory = target_directory
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        try:
+            roots = [path for path, is_dir in self.entries if is_dir]
+            listings, errors = self.source_fs.walk(roots, self.cancelled)
+            if errors:
+                raise RuntimeError(f"Could not list {errors[0][0]}: {errors[0][1]}")
+
+            def target_for(path, root):
+                # Caminho no destino: relativo ao diretório-pai do item selecionado na origem
+                return self.target_fs.join(self.target_directory,
+                                           *self.source_fs.relative_parts(path, self.source_fs.parent(root)))
+
+            files = [(path, target_for(path, path)) for path, is_dir in self.entries if not is_dir]
+            directories = []
+            for root in roots:
+                for path in sorted((path for path in listings if path == root or
+                                    self.source_fs.relative_parts(path, root)[0] != ".."),
+                                   key=lambda path: len(self.source_fs.relative_parts(path, root))):
+                    directories.append(target_for(path, root))
+                    listing = listings[path]
+                    for i in range(len(listing)):
+                        if not listing.is_dir[i]:
+                            source_path = self.source_fs.join(path, listing.names[i])
+                            files.append((source_path, target_for(source_path, root)))
+            if directories and not self.cancelled.is_set():
+                target = self.target_fs.session()
+                try:
+                    for directory in directories:
+                        target.mkdir(directory, exist_ok=True)
+                finally:
+                    target.close()
+            if not self.cancelled.is_set():
+                self.planned.emit(files)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+# Thread que procura os arquivos cujo nome corresponde a um padrão (glob ou expressão regular) num diretório
+# remoto, ou em toda a árvore abaixo dele; sem a listagem em cache, um glob é aplicado pelo servidor (NLST)
+class PatternMatchWorker(QThread):
+    progress = pyqtSignal(int)
+    matched = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, fs, directory, mode, pattern, recursive, case_sensitive=False, parent=None):
+        super().__init__(parent)
+        self.fs = fs
+        self.directory = directory
+        self.mode = mode
+        self.pattern = pattern
+        self.recursive = recursive
+        self.case_sensitive = case_sensitive
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        try:
+            if self.recursive:
+                listings, errors = walk_remote_tree(self.fs.open_session, [self.directory], self.cancelled,
+                                                    self.progress.emit)
+                if errors:
+                    raise RuntimeError(f"Could not list {errors[0][0]}: {errors[0][1]}")
+            else:
+                listing = self.fs.cached_listing(self.directory)
+                if listing is None:
+                    session = self.fs.session(PRIORITY_INTERACTIVE)
+                    try:
+                        paths = None
+                        if self.mode == "Glob":
+                            paths = session.ftp.call(nlst_matches, session.ftp, self.directory, self.pattern,
+                                                     self.case_sensitive)
+                        if paths:
+                            self.matched.emit(paths)
+                            return
+                        listing = session.list(self.directory, cached=False)[1]
+                    finally:
+                        session.close()
+                listings = {self.directory: listing}
+            paths = [join_remote_path(path, listing.names[i]) for path, listing in sorted(listings.items())
+                     for i in filter_listing(listing, self.mode, self.pattern, self.case_sensitive)
+                     if not listing.is_dir[i]]
+            if not self.cancelled.is_set():
+                self.matched.emit(paths)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+# Janela para escolher um padrão de nomes e o que fazer com os itens que lhe correspondem: selecioná-los na
+# lista ou descarregar os arquivos (também dos subdiretórios) para uma única pasta local
+class PatternSelectionDialog(QDialog):
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Select by Pattern")
+        self.layout = QVBoxLayout()
+        self.action = None
+
+        self.layout.addWidget(QLabel(f"Match names in {path}:"))
+        pattern_layout = QHBoxLayout()
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(["Glob", "Regex"])
+        pattern_layout.addWidget(self.mode_combo)
+        self.pattern_input = QLineEdit()
+        self.pattern_input.setPlaceholderText("e.g. *.csv.gz")
+        pattern_layout.addWidget(self.pattern_input)
+        self.layout.addLayout(pattern_layout)
+
+        # Distinguir maiúsculas (como os servidores Unix) permite que o servidor aplique o glob (NLST) a
+        # qualquer padrão; sem isso, só aos padrões sem letras. A escolha fica guardada
+        self.settings = QSettings("ftp_browser", "FTP Browser")
+        self.case_checkbox = QCheckBox("Match case")
+        self.case_checkbox.setChecked(self.settings.value("pattern/match_case", True, type=bool))
+        self.layout.addWidget(self.case_checkbox)
+
+        self.recursive_checkbox = QCheckBox("Include subfolders (download only)")
+        self.layout.addWidget(self.recursive_checkbox)
+
+        buttons_layout = QHBoxLayout()
+        self.select_button = QPushButton("Select")
+        self.select_button.clicked.connect(lambda: self.choose("select"))
+        self.recursive_checkbox.toggled.connect(lambda checked: self.select_button.setEnabled(not checked))
+        buttons_layout.addWidget(self.select_button)
+        self.download_button = QPushButton("Download...")
+        self.download_button.clicked.connect(lambda: self.choose("download"))
+        buttons_layout.addWidget(self.download_button)
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.reject)
+        buttons_layout.addWidget(cancel_button)
+        self.layout.addLayout(buttons_layout)
+
+        self.setLayout(self.layout)
+
+    def choose(self, action):
+        # Valida o padrão (uma expressão regular inválida não pode selecionar tudo) e fecha a janela
+        if not self.pattern_input.text():
+            return
+        if self.mode_combo.currentText() == "Regex":
+            try:
+                re.compile(self.pattern_input.text())
+            except re.error as e:
+                QMessageBox.critical(self, "Select by Pattern", f"Invalid regular expression: {e}")
+                return
+        self.settings.setValue("pattern/match_case", self.case_checkbox.isChecked())
+        self.action = action
+        self.accept()
+
+# Lista, numa conexão secundária, os diretórios pedidos pela árvore de pastas (os mais recentes primeiro)
+class DirectoryTreeLoader(QObject):
+    loaded = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, fs, parent=None):
+        super().__init__(parent)
+        self.fs = fs
+        self.pending = []
+        self.condition = threading.Condition()
+        self.running = False
+
+    def request(self, path):
+        # Pede a listagem do diretório; a thread é criada quando necessário e termina depois de um período parada
+        with self.condition:
+            if path in self.pending:
+                self.pending.remove(path)
+            self.pending.append(path)
+            self.condition.notify()
+            if not self.running:
+                self.running = True
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        fs = None
+        while True:
+            with self.condition:
+                scheduler.wait_idle(self.condition, fs and fs.ftp, lambda: self.pending)
+                if not self.pending:
+                    self.running = False
+                    break
+                path = self.pending.pop()
+            try:
+                if fs is None:
+                    fs = self.fs.session(PRIORITY_INTERACTIVE)
+                self.loaded.emit(path, fs.list(path, cached=False)[1])
+            except Exception as e:
+                if fs is not None:
+                    fs.close()
+                fs = None
+                self.failed.emit(path, str(e))
+        if fs is not None:
+            fs.close()
+
+# Nó da árvore de pastas remotas; children é None enquanto o diretório ainda não foi listado
+class RemoteTreeNode:
+    def __init__(self, name, path, parent=None):
+        self.name = name
+        self.path = path
+        self.parent = parent
+        self.children = None
+        # Posição do nó entre os irmãos (mantida ao inserir e remover nós)
+        self.position = 0
+        self.loading = False
+        self.error = None
+
+# Modelo da árvore de pastas de um servidor: cada nó só é listado quando é expandido (fetchMore), a partir da
+# cache de listagens ou do DirectoryTreeLoader; ao atualizar um nó, os filhos que continuam a existir são
+# mantidos, para que a vista conserve os nós expandidos
+class RemoteTreeModel(QAbstractItemModel):
+    def __init__(self, fs, parent=None):
+        super().__init__(parent)
+        self.fs = fs
+        self.invisible_root = RemoteTreeNode("", "")
+        self.root = RemoteTreeNode("/", "/", self.invisible_root)
+        self.invisible_root.children = [self.root]
+        self.loader = DirectoryTreeLoader(fs, self)
+        self.loader.loaded.connect(self.update_directory)
+        self.loader.failed.connect(self.load_failed)
+
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self.invisible_root
+
+    def index_for(self, node):
+        if node is self.invisible_root:
+            return QModelIndex()
+        return self.createIndex(node.position, 0, node)
+
+    def index(self, row, column, parent=QModelIndex()):
+        children = self.node(parent).children
+        if column != 0 or not children or not 0 <= row < len(children):
+            return QModelIndex()
+        return self.createIndex(row, column, children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.index_for(index.internalPointer().parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        children = self.node(parent).children
+        return len(children) if children else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        # Um diretório ainda por listar pode ter subdiretórios (mostra o indicador de expansão)
+        children = self.node(parent).children
+        return children is None or bool(children)
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        return node.children is None and not node.loading
+
+    def fetchMore(self, parent):
+        # Lista o diretório do nó: da cache, se possível, senão numa conexão secundária
+        node = self.node(parent)
+        listing = self.fs.cached_listing(node.path)
+        if listing is not None:
+            self.set_children(node, listing)
+        else:
+            node.loading = True
+            self.loader.request(node.path)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            return node.name + (" (loading...)" if node.loading else "")
+        if role == Qt.ToolTipRole:
+            return f"{node.path}: {node.error}" if node.error else node.path
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return "Folders"
+        return None
+
+    def find(self, path):
+        # Devolve o nó do caminho, se todos os diretórios até ele já estiverem listados
+        node = self.root
+        for name in path.strip("/").split("/") if path.strip("/") else []:
+            node = next((child for child in node.children or () if child.name == name), None)
+            if node is None:
+                return None
+        return node
+
+    def refresh(self, index):
+        # Volta a listar o diretório do nó no servidor
+        node = self.node(index)
+        if node is self.invisible_root or node.loading:
+            return
+        self.fs.invalidate(node.path)
+        node.loading = True
+        self.dataChanged.emit(index, index)
+        self.loader.request(node.path)
+
+    def update_directory(self, path, listing):
+        # Atualiza os filhos do nó com uma nova listagem (só para nós já expandidos ou a carregar)
+        node = self.find(path)
+        if node is not None and (node.children is not None or node.loading):
+            self.set_children(node, listing)
+
+    def load_failed(self, path, error):
+        node = self.find(path)
+        if node is not None and node.loading:
+            node.loading = False
+            node.error = error
+            if node.children is None:
+                node.children = []
+            index = self.index_for(node)
+            self.dataChanged.emit(index, index)
+
+    def set_children(self, node, listing):
+        # Aplica os subdiretórios da listagem ao nó, removendo e inserindo só as diferenças
+        names = sorted((listing.names[i] for i in range(len(listing)) if listing.is_dir[i]), key=natural_sort_key)
+        parent = self.index_for(node)
+        node.loading = False
+        node.error = None
+        if not node.children:
+            node.children = []
+            if names:
+                self.beginInsertRows(parent, 0, len(names) - 1)
+                node.children = [RemoteTreeNode(name, join_remote_path(node.path, name), node) for name in names]
+                self._renumber(node)
+                self.endInsertRows()
+            self.dataChanged.emit(parent, parent)
+            return
+        # Remove as linhas que desapareceram em intervalos contíguos, do fim para o início (as anteriores não
+        # mudam de posição), e renumera uma vez
+        keep = set(names)
+        row = len(node.children)
+        while row:
+            row -= 1
+            if node.children[row].name in keep:
+                continue
+            last = row
+            while row and node.children[row - 1].name not in keep:
+                row -= 1
+            self.beginRemoveRows(parent, row, last)
+            del node.children[row:last + 1]
+            self.endRemoveRows()
+        self._renumber(node)
+        # Insere os novos em intervalos contíguos, já nas posições finais (os nomes estão ordenados e os
+        # filhos que ficaram seguem a mesma ordem), e renumera uma vez
+        existing = {child.name for child in node.children}
+        row = 0
+        while row < len(names):
+            if names[row] in existing:
+                row += 1
+                continue
+            first = row
+            while row < len(names) and names[row] not in existing:
+                row += 1
+            self.beginInsertRows(parent, first, row - 1)
+            node.children[first:first] = [RemoteTreeNode(name, join_remote_path(node.path, name), node)
+                                          for name in names[first:row]]
+            self.endInsertRows()
+        self._renumber(node)
+        self.dataChanged.emit(parent, parent)
+
+    def _renumber(self, node):
+        for position, child in enumerate(node.children):
+            child.position = position
+
+def remote_file_size(ftp, path):
+    # Pergunta ao servidor o tamanho do arquivo (SIZE só é fiável em modo binário)
+    ftp.voidcmd("TYPE I")
+    return ftp.size(path)
+
+def fetch_remote_range(ftp, path, offset, length):
+    # Lê até length bytes do arquivo remoto a partir de offset (REST) e aborta (ABOR) o resto da transferência
+    ftp.voidcmd("TYPE I")
+    conn = ftp.transfercmd("RETR " + path, rest=offset or None)
+    chunks = []
+    remaining = length
+    try:
+        while remaining:
+            chunk = conn.recv(min(remaining, RELAY_BLOCK_SIZE))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+    finally:
+        if remaining:
+            conn.close()
+            ftp.voidresp()
+        else:
+            abort_transfer(ftp, conn)
+    return b"".join(chunks)
+
+def remote_range_hashes(ftp, path, ranges):
+    # Pede ao servidor o resumo de cada intervalo [início, fim) do arquivo (RANG + HASH, em pipeline) e devolve
+    # [(algoritmo do hashlib, resumo)], ou None se o servidor não anunciar ou não aceitar os dois comandos
+    if ftp.features is None:
+        ftp.probe_features()
+    if not {"HASH", "RANG"} <= ftp.features:
+        return None
+    try:
+        ftp.sendcmd("OPTS HASH SHA-256")
+    except (error_perm, error_temp):
+        pass  # Fica o algoritmo predefinido do servidor
+    groups = [[f"RANG {start} {end - 1}", f"HASH {path}"] for start, end in ranges]
+    hashes = []
+    for (ok, reply), (start, end) in zip(pipeline_commands(ftp, groups), ranges):
+        # Resposta: 213 <algoritmo> <primeiro byte>-<último byte> <resumo> <arquivo>
+        fields = reply.split()
+        if (not ok or len(fields) < 4 or fields[1].upper() not in HASH_ALGORITHMS
+                or fields[2] != f"{start}-{end - 1}"):
+            return None
+        hashes.append((HASH_ALGORITHMS[fields[1].upper()], fields[3].lower()))
+    return hashes
+
+def remote_file_hash(ftp, path):
+    # Resumo do arquivo inteiro calculado pelo servidor (HASH), como (algoritmo do hashlib, resumo), ou None
+    if ftp.features is None:
+        ftp.probe_features()
+    if "HASH" not in ftp.features:
+        return None
+    try:
+        fields = ftp.sendcmd(f"HASH {path}").split()
+    except (error_perm, error_temp):
+        return None
+    if len(fields) < 4 or fields[1].upper() not in HASH_ALGORITHMS:
+        return None
+    return HASH_ALGORITHMS[fields[1].upper()], fields[3].lower()
+
+def local_file_hash(f, algorithm):
+    # Resumo (em hexadecimal) de todo o conteúdo do arquivo aberto f, com o algoritmo do hashlib indicado
+    import hashlib
+    digest = hashlib.new(algorithm)
+    f.seek(0)
+    for block in iter(functools.partial(f.read, DELTA_BLOCK_SIZE), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+def abort_transfer(ftp, conn):
+    # Interrompe a transferência em curso e ressincroniza a conexão de controlo com um NOOP, já que o
+    # número de respostas ao ABOR (426 seguido de 226, ou só 226/225) varia entre servidores
+    try:
+        ftp.abort()
+    except Error:
+        pass
+    conn.close()
+    ftp.putcmd("NOOP")
+    while not ftp.getmultiline().startswith("200"):
+        pass
+
+def format_hex_dump(data, offset=0):
+    # Formata os dados como um dump hexadecimal (endereço, 16 bytes em hexadecimal e em ASCII)
+    lines = []
+    for start in range(0, len(data), 16):
+        row = data[start:start + 16]
+        text = "".join(chr(byte) if 32 <= byte < 127 else "." for byte in row)
+        lines.append(f"{offset + start:010x}  {row.hex(' '):<47}  {text}")
+    return "\n".join(lines)
+
+def looks_like_text(data):
+    # Considera texto os dados sem bytes nulos que se descodificam (quase) sem erros em UTF-8
+    sample = data[:8192]
+    if b"\0" in sample:
+        return False
+    decoded = sample.decode("utf-8", errors="replace")
+    return decoded.count("\ufffd") <= max(1, len(decoded) // 100)
+
+# Classe que guarda em memória os trechos de arquivos já pré-visualizados (LRU limitada em bytes)
+class PreviewCache:
+    def __init__(self, max_bytes=PREVIEW_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        # Devolve o trecho guardado (a chave inclui tamanho e data, pelo que não fica desatualizado)
+        data = self.entries.get(key)
+        if data is not None:
+            self.entries.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        # Guarda o trecho, descartando os menos usados recentemente acima do limite
+        if len(data) > self.max_bytes:
+            return
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.total -= len(previous)
+        self.entries[key] = data
+        self.total += len(data)
+        while self.total > self.max_bytes:
+            _, dropped = self.entries.popitem(last=False)
+            self.total -= len(dropped)
+
+# Thread que obtém, numa sessão secundária, o trecho a pré-visualizar: o início ou o fim do arquivo (neste caso,
+# pergunta o tamanho ao servidor se a listagem não o indicar)
+class PreviewFetchWorker(QThread):
+    fetched = pyqtSignal(object, object, bytes)
+    failed = pyqtSignal(str)
+
+    def __init__(self, open_session, path, size, from_end, length, parent=None):
+        super().__init__(parent)
+        self.open_session = open_session
+        self.path = path
+        self.size = size
+        self.from_end = from_end
+        self.length = length
+
+    def run(self):
+        try:
+            ftp = self.open_session(PRIORITY_INTERACTIVE)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        try:
+            size = self.size
+            if self.from_end and not size:
+                size = ftp.call(remote_file_size, ftp, self.path) or 0
+            offset = max(0, size - self.length) if self.from_end else 0
+            self.fetched.emit(size, offset, ftp.call(fetch_remote_range, ftp, self.path, offset, self.length))
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            close_session(ftp)
+
+# Diálogo de pré-visualização rápida de um arquivo remoto (início ou fim, em texto, hexadecimal ou imagem)
+class PreviewDialog(QDialog):
+    def __init__(self, ftp_client, file_name, size, mtime):
+        super().__init__(ftp_client)
+        self.ftp_client = ftp_client
+        self.file_name = file_name
+        self.remote_path = ftp_client.remote_path(file_name)
+        self.size = size
+        self.mtime = mtime
+        self.from_end = False
+        self.data = b""
+        self.offset = 0
+        self.length = 0
+        # Thread do pedido em curso; o resultado de um pedido substituído (ou feito antes de fechar) é ignorado
+        self.worker = None
+        self.setWindowTitle(f"Preview: {file_name}")
+        self.resize(800, 600)
+
+        self.layout = QVBoxLayout()
+        controls = QHBoxLayout()
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(["Text", "Hex", "Image"])
+        self.mode_combo.currentIndexChanged.connect(self.change_mode)
+        controls.addWidget(self.mode_combo)
+        self.end_button = QPushButton("Show End")
+        self.end_button.clicked.connect(self.toggle_end)
+        controls.addWidget(self.end_button)
+        self.download_button = QPushButton("Download...")
+        self.download_button.clicked.connect(self.download)
+        controls.addWidget(self.download_button)
+        self.status_label = QLabel()
+        controls.addWidget(self.status_label, 1)
+        self.layout.addLayout(controls)
+
+        self.text_view = QPlainTextEdit()
+        self.text_view.setReadOnly(True)
+        self.text_view.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.layout.addWidget(self.text_view)
+        self.image_view = QLabel()
+        self.image_view.setAlignment(Qt.AlignCenter)
+        self.layout.addWidget(self.image_view)
+        self.setLayout(self.layout)
+
+        if file_extension(file_name) in PREVIEW_IMAGE_EXTENSIONS:
+            self.mode_combo.setCurrentIndex(2)
+
+    def load(self):
+        # Mostra o trecho a pré-visualizar se estiver na cache; senão, pede-o ao servidor numa thread (a janela
+        # continua a responder enquanto chegam até PREVIEW_IMAGE_BYTES) e mostra-o quando chegar
+        length = PREVIEW_IMAGE_BYTES if self.mode_combo.currentIndex() == 2 else PREVIEW_BYTES
+        self.length = length
+        # Sem o tamanho na listagem, o fim só é conhecido depois do SIZE, feito pela thread
+        if not self.from_end or self.size:
+            offset = max(0, self.size - length) if self.from_end else 0
+            data = self.ftp_client.main_window.preview_cache.get(self.cache_key(offset))
+            if data is not None:
+                self.worker = None
+                self.show_data(offset, data)
+                return
+        self.status_label.setText("Loading...")
+        worker = PreviewFetchWorker(self.ftp_client.open_session, self.remote_path, self.size, self.from_end, length,
+                                    self.ftp_client)
+        worker.fetched.connect(self.fetched)
+        worker.failed.connect(self.fetch_failed)
+        worker.finished.connect(worker.deleteLater)
+        self.worker = worker
+        worker.start()
+
+    def cache_key(self, offset):
+        # A chave inclui tamanho e data, pelo que um trecho guardado não fica desatualizado
+        return (self.ftp_client.server, self.remote_path, self.size, self.mtime, offset, self.length)
+
+    def fetched(self, size, offset, data):
+        # Trecho obtido pela thread: guarda-o na cache e mostra-o
+        if self.sender() is not self.worker:
+            return
+        self.worker = None
+        self.size = size
+        self.ftp_client.main_window.preview_cache.put(self.cache_key(offset), data)
+        self.show_data(offset, data)
+
+    def fetch_failed(self, error):
+        if self.sender() is not self.worker:
+            return
+        self.worker = None
+        self.status_label.setText("")
+        QMessageBox.critical(self, "Preview Error", f"Could not preview the file: {error}")
+
+    def show_data(self, offset, data):
+        # Mostra o trecho; os dados binários passam para o modo hexadecimal
+        self.offset = offset
+        self.data = data
+        if self.mode_combo.currentIndex() == 0 and not looks_like_text(data):
+            self.mode_combo.setCurrentIndex(1)
+        self.render()
+
+    def done(self, result):
+        # Ao fechar, o resultado de um pedido ainda em curso deixa de interessar
+        self.worker = None
+        super().done(result)
+
+    def render(self):
+        # Mostra o trecho obtido no modo escolhido
+        mode = self.mode_combo.currentIndex()
+        self.text_view.setVisible(mode != 2)
+        self.image_view.setVisible(mode == 2)
+        if mode == 0:
+            self.text_view.setPlainText(self.data.decode("utf-8", errors="replace"))
+        elif mode == 1:
+            self.text_view.setPlainText(format_hex_dump(self.data, self.offset))
+        else:
+            pixmap = QPixmap()
+            if pixmap.loadFromData(self.data):
+                if pixmap.width() > self.image_view.width() or pixmap.height() > self.image_view.height():
+                    pixmap = pixmap.scaled(self.image_view.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                self.image_view.setPixmap(pixmap)
+            else:
+                self.image_view.setText("The image could not be decoded (it may be too large to preview).")
+        shown = f"bytes {self.offset}-{self.offset + len(self.data)}"
+        self.status_label.setText(f"{shown} of {format_size(self.size)}" if self.size else shown)
+
+    def change_mode(self, mode):
+        # Muda o modo de apresentação; o modo imagem precisa de um trecho maior do que o de texto
+        # (um trecho ainda a caminho é mostrado no novo modo quando chegar)
+        if mode == 2 and self.length < PREVIEW_IMAGE_BYTES and (self.worker is not None or len(self.data) == self.length):
+            self.load()
+        elif self.worker is None:
+            self.render()
+
+    def toggle_end(self):
+        # Alterna entre o início e o fim do arquivo
+        self.from_end = not self.from_end
+        self.end_button.setText("Show Beginning" if self.from_end else "Show End")
+        self.load()
+
+    def download(self):
+        # Fecha a pré-visualização e segue para a confirmação de download habitual
+        self.accept()
+        self.ftp_client.confirm_download(self.file_name)
+
+def remote_file_identity(ftp, path):
+    # Devolve (tamanho, data MDTM) do arquivo remoto, ou None se o servidor não os indicar
+    try:
+        size = remote_file_size(ftp, path)
+        modified = ftp.sendcmd("MDTM " + path).split()[1]
+    except (error_perm, IndexError):
+        return None
+    return (size, modified) if size is not None else None
+
+def clone_file(source, destination):
+    # Coloca uma cópia de source em destination da forma mais barata: reflink ou cópia. Uma ligação física não
+    # serve: os downloads reescrevem o destino no lugar, o que alteraria também a cache e as outras cópias
+    if os.path.exists(destination):
+        os.remove(destination)
+    if fcntl is not None:
+        try:
+            with open(source, "rb") as src, open(destination, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return "reflink"
+        except OSError:
+            os.remove(destination)
+    import shutil
+    shutil.copyfile(source, destination)
+    return "copy"
+
+# Classe que guarda os arquivos descarregados em disco, indexados por (servidor, caminho, tamanho, MDTM),
+# para que um download repetido de um arquivo inalterado não use a rede
+class DownloadCache:
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(CACHE_DIR, "downloads")
+        self.settings = QSettings("ftp_browser", "FTP Browser")
+        self._db = None
+        self._lock = threading.Lock()
+
+    def max_bytes(self):
+        # Limite de ocupação da cache, configurável nas definições
+        return self.settings.value("download_cache/max_mb", DOWNLOAD_CACHE_MAX_MB, type=int) * 1024 * 1024
+
+    def set_max_mb(self, megabytes):
+        # Altera o limite e descarta imediatamente o que o exceder
+        self.settings.setValue("download_cache/max_mb", int(megabytes))
+        with self._lock:
+            self._evict(self._connection())
+
+    def _connection(self):
+        # Abre o índice da cache apenas quando é usado pela primeira vez
+        if self._db is None:
+            import sqlite3
+            os.makedirs(self.directory, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                " key TEXT PRIMARY KEY, size INTEGER NOT NULL, stored_mtime INTEGER NOT NULL,"
+                " last_used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS downloads_lru ON downloads (last_used)")
+        return self._db
+
+    def _key(self, server, path, identity):
+        # Nome do arquivo na cache: resumo da identidade do arquivo remoto
+        import hashlib
+        return hashlib.sha256(repr((server, path) + tuple(identity)).encode()).hexdigest()
+
+    def fetch(self, server, path, identity, destination):
+        # Copia o arquivo guardado para destination; devolve False se não estiver na cache
+        key = self._key(server, path, identity)
+        blob = os.path.join(self.directory, key)
+        with self._lock:
+            db = self._connection()
+            row = db.execute("SELECT size, stored_mtime FROM downloads WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False
+            try:
+                stat = os.stat(blob)
+            except OSError:
+                stat = None
+            if stat is None or (stat.st_size, stat.st_mtime_ns) != tuple(row):
+                # O arquivo guardado desapareceu ou foi alterado
+                self._remove(db, key)
+                db.commit()
+                return False
+            db.execute("UPDATE downloads SET last_used = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+        clone_file(blob, destination)
+        return True
+
+    def store(self, server, path, identity, source):
+        # Guarda o arquivo descarregado e descarta os menos usados recentemente acima do limite
+        if not self.max_bytes():
+            return
+        key = self._key(server, path, identity)
+        blob = os.path.join(self.directory, key)
+        with self._lock:
+            db = self._connection()
+            clone_file(source, blob)
+            stat = os.stat(blob)
+            db.execute("INSERT OR REPLACE INTO downloads (key, size, stored_mtime, last_used) VALUES (?, ?, ?, ?)",
+                       (key, stat.st_size, stat.st_mtime_ns, time.time()))
+            self._evict(db)
+
+    def _evict(self, db):
+        # Remove entradas (das usadas há mais tempo) até a cache caber no limite
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM downloads").fetchone()[0]
+        limit = self.max_bytes()
+        for key, size in db.execute("SELECT key, size FROM downloads ORDER BY last_used").fetchall():
+            if total <= limit:
+                break
+            self._remove(db, key)
+            total -= size
+        db.commit()
+
+    def _remove(self, db, key):
+        # Apaga a entrada do índice e o arquivo correspondente
+        db.execute("DELETE FROM downloads WHERE key = ?", (key,))
+        try:
+            os.remove(os.path.join(self.directory, key))
+        except OSError:
+            pass
+
+# Diário (JSON Lines, só de acréscimo) das transferências em fila, em curso e terminadas, com a posição de
+# cada uma registada periodicamente, para retomar o trabalho interrompido no arranque seguinte
+class TransferJournal:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CONFIG_DIR, "transfers.jsonl")
+        self.file = None
+        self.lock = threading.Lock()
+
+    def append(self, record, durable=False):
+        # Acrescenta um registo; os que mudam o estado de uma transferência são forçados para o disco
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(line)
+            self.file.flush()
+            if durable:
+                os.fsync(self.file.fileno())
+
+    def replay(self):
+        # Reconstrói as transferências por terminar (id -> transferência) a partir dos registos
+        jobs = OrderedDict()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Última linha cortada por uma saída abrupta
+                    op = record.pop("op", None)
+                    if op == "queued":
+                        jobs[record["id"]] = record
+                    elif op == "finished":
+                        jobs.pop(record["id"], None)
+                    elif record.get("id") in jobs:
+                        jobs[record["id"]].update(record)
+        except FileNotFoundError:
+            pass
+        return jobs
+
+    def size(self):
+        # Tamanho atual do diário em disco
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def compact(self, jobs):
+        # Reescreve o diário só com as transferências por terminar (um registo cada) e substitui-o atomicamente
+        temporary = self.path + ".tmp"
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temporary, "w", encoding="utf-8") as f:
+                for job in jobs:
+                    f.write(json.dumps(dict(job, op="queued"), separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            os.replace(temporary, self.path)
+
+# Erro usado para interromper uma transferência cancelada pelo utilizador
+class TransferCancelled(Exception):
+    pass
+
+# Fila de espera que alterna entre donos (os servidores das transferências): cada get entrega o próximo item
+# do dono seguinte, para que um lote grande de uma aba não faça esperar as transferências das outras
+class RoundRobinQueue:
+    def __init__(self):
+        self.queues = OrderedDict()
+        self.condition = threading.Condition()
+
+    def put(self, item, owner=None):
+        with self.condition:
+            self.queues.setdefault(owner, deque()).append(item)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        # Retira um item do primeiro dono e passa esse dono para o fim da vez; levanta Empty após o timeout
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.queues, timeout):
+                raise Empty
+            owner, items = next(iter(self.queues.items()))
+            item = items.popleft()
+            if items:
+                self.queues.move_to_end(owner)
+            else:
+                del self.queues[owner]
+            return item
+
+# Fila de transferências executada em segundo plano, com o estado guardado no diário de transferências
+class TransferQueue(QObject):
+    job_changed = pyqtSignal(str)
+
+    # Campos de uma transferência guardados no diário (o estado e o erro só existem em memória)
+    JOURNAL_FIELDS = ("id", "direction", "host", "port", "user", "tls", "transfer_mode", "remote", "local",
+                      "size", "modified", "offset")
+
+    def __init__(self, journal=None, download_cache=None, workers=TRANSFER_WORKERS, parent=None):
+        super().__init__(parent)
+        self.journal = journal or TransferJournal()
+        self.download_cache = download_cache
+        self.settings = QSettings("ftp_browser", "FTP Browser")
+        self.jobs = OrderedDict()
+        self.cancelled = {}
+        # Palavras-passe conhecidas por servidor (host, porta, utilizador); nunca são escritas no diário
+        self.credentials = {}
+        self.lock = threading.Lock()
+        # Transferências por executar, atendidas alternadamente por servidor
+        self.pending = RoundRobinQueue()
+        self.compacting = False
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def delta_updates_enabled(self):
+        # Um arquivo local desatualizado é atualizado por diferenças (ligado por omissão)
+        return self.settings.value("transfers/delta_updates", True, type=bool)
+
+    def set_delta_updates(self, enabled):
+        # Liga ou desliga a atualização por diferenças e guarda a preferência
+        self.settings.setValue("transfers/delta_updates", bool(enabled))
+
+    def restore(self):
+        # Repõe as transferências interrompidas na última execução, compacta o diário e retoma as anónimas
+        with self.lock:
+            for job_id, job in self.journal.replay().items():
+                if job_id not in self.jobs:
+                    job.update(state="paused", error="Interrupted; resume to continue")
+                    self.jobs[job_id] = job
+        for job_id in list(self.jobs):
+            self.job_changed.emit(job_id)
+        self.compact_in_background()
+        for job in list(self.jobs.values()):
+            if job["user"] in ANONYMOUS_USERS:
+                self.credentials.setdefault((job["host"], job["port"], job["user"]), "")
+        for server in list(self.credentials):
+            self.resume_server(server)
+
+    def enqueue_download(self, ftp_client, remote_path, local_path):
+        # Acrescenta à fila o download de um arquivo da aba indicada
+        return self.enqueue(ftp_client, "download", [(remote_path, local_path)])[0]
+
+    def enqueue(self, ftp_client, direction, pairs):
+        # Acrescenta à fila transferências ("download" ou "upload") entre a aba indicada e o disco local,
+        # dadas como pares (caminho remoto, caminho local); o diário só é forçado para o disco uma vez
+        self.credentials[ftp_client.server] = ftp_client.ftp_passwd
+        jobs = [{"id": os.urandom(16).hex(), "direction": direction, "host": ftp_client.ftp_host,
+                 "port": ftp_client.ftp_port, "user": ftp_client.ftp_user, "tls": ftp_client.tls,
+                 "transfer_mode": ftp_client.transfer_mode, "remote": remote_path, "local": local_path,
+                 "size": None, "modified": None, "offset": 0} for remote_path, local_path in pairs]
+        with self.lock:
+            for number, job in enumerate(jobs, 1):
+                self.jobs[job["id"]] = dict(job, state="queued", error=None)
+                self.journal.append(dict(job, op="queued"), durable=number == len(jobs))
+        for job in jobs:
+            self.pending.put(job["id"], ftp_client.server)
+            self.job_changed.emit(job["id"])
+        return [job["id"] for job in jobs]
+
+    def set_credentials(self, server, passwd):
+        # Guarda a palavra-passe de um servidor (por exemplo, ao abrir uma aba) e retoma as transferências dele
+        self.credentials[server] = passwd
+        self.resume_server(server)
+
+    def resume_server(self, server):
+        # Retoma as transferências interrompidas de um servidor
+        for job_id, job in list(self.jobs.items()):
+            if (job["host"], job["port"], job["user"]) == server and job["state"] == "paused":
+                self.resume(job_id)
+
+    def resume(self, job_id):
+        # Volta a pôr na fila uma transferência interrompida ou que falhou
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["state"] not in ("paused", "failed"):
+                return
+            job.update(state="queued", error=None)
+        self.pending.put(job_id, (job["host"], job["port"], job["user"]))
+        self.job_changed.emit(job_id)
+
+    def cancel(self, job_id):
+        # Cancela uma transferência (a que está em curso é interrompida no bloco seguinte)
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["state"] in ("completed", "cancelled"):
+                return
+            if job["state"] == "active":
+                self.cancelled[job_id] = True
+            else:
+                self._finish(job, "cancelled")
+        self.job_changed.emit(job_id)
+
+    def clear_finished(self):
+        # Retira da lista as transferências terminadas ou canceladas
+        with self.lock:
+            for job_id in [job_id for job_id, job in self.jobs.items() if job["state"] in ("completed", "cancelled")]:
+                del self.jobs[job_id]
+
+    def _finish(self, job, state, error=None):
+        # Marca a transferência como terminada no diário (chamado com o lock da fila)
+        job.update(state=state, error=error)
+        self.journal.append({"op": "finished", "id": job["id"], "state": state}, durable=True)
+
+    def checkpoint(self, job, durable=False):
+        # Regista no diário os dados e a posição atuais da transferência
+        self.journal.append({"op": "progress", "id": job["id"], "size": job["size"], "modified": job["modified"],
+                             "offset": job["offset"]}, durable)
+
+    def compact_in_background(self):
+        # Compacta o diário numa thread, mantendo apenas as transferências por terminar
+        with self.lock:
+            if self.compacting:
+                return
+            self.compacting = True
+
+        def compact():
+            try:
+                with self.lock:
+                    unfinished = [{field: job[field] for field in self.JOURNAL_FIELDS}
+                                  for job in self.jobs.values() if job["state"] not in ("completed", "cancelled")]
+                    self.journal.compact(unfinished)
+            except OSError:
+                pass  # Fica para a próxima; o diário continua válido
+            finally:
+                self.compacting = False
+
+        threading.Thread(target=compact, daemon=True).start()
+
+    def _work(self):
+        # Executado por cada thread da fila: retira transferências e executa-as, reutilizando as sessões
+        sessions = {}
+        while True:
+            try:
+                job_id = self.pending.get(timeout=SCHEDULER_YIELD_INTERVAL)
+            except Empty:
+                self._yield_sessions(sessions)
+                continue
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None or job["state"] != "queued":
+                    continue
+                job["state"] = "active"
+                self.cancelled.pop(job_id, None)
+            self.job_changed.emit(job_id)
+            key = (job["host"], job["port"], job["user"], job["tls"])
+            try:
+                ftp = sessions.get(key)
+                if ftp is None:
+                    passwd = self.credentials.get(key[:3])
+                    if passwd is None:
+                        raise PermissionError("The password for this server is not known; reconnect to it first")
+                    ftp = sessions[key] = scheduler.open_session(job["host"], job["user"], passwd, job["port"],
+                                                                 ("queue",) + key[:3], tls=job["tls"])
+                    ftp.set_transfer_mode(job["transfer_mode"])
+                if job["direction"] == "upload":
+                    self._upload(ftp, job)
+                else:
+                    self._download(ftp, job)
+                with self.lock:
+                    self._finish(job, "completed")
+            except TransferCancelled:
+                close_session(sessions.pop(key))
+                with self.lock:
+                    self._finish(job, "cancelled")
+            except Exception as e:
+                ftp = sessions.pop(key, None)
+                if ftp is not None:
+                    close_session(ftp)
+                with self.lock:
+                    job.update(state="failed", error=str(e))
+                    self.checkpoint(job, durable=True)
+            self.job_changed.emit(job_id)
+            self._yield_sessions(sessions)
+            if self.journal.size() > JOURNAL_COMPACT_BYTES:
+                self.compact_in_background()
+
+    def _yield_sessions(self, sessions):
+        # Fecha as sessões reutilizáveis cuja vaga outro pedido (de outra aba ou interativo) está à espera
+        for key, ftp in list(sessions.items()):
+            if scheduler.contended(ftp):
+                close_session(sessions.pop(key))
+
+    def _download(self, ftp, job):
+        # Descarrega o arquivo a partir da posição registada (REST), servindo-o da cache quando inalterado
+        identity = ftp.call(remote_file_identity, ftp, job["remote"])
+        if identity is None or [job["size"], job["modified"]] != list(identity):
+            # Primeira tentativa, ou o arquivo remoto mudou desde a interrupção: começa do início
+            job["size"], job["modified"] = identity or (None, None)
+            job["offset"] = 0
+        self.checkpoint(job, durable=True)
+        server = (job["host"], job["port"], job["user"])
+        if (identity and not job["offset"] and self.download_cache
+                and self.download_cache.fetch(server, job["remote"], identity, job["local"])):
+            job["offset"] = job["size"]
+            return
+        with open(job["local"], "r+b" if os.path.exists(job["local"]) else "wb") as f:
+            advance = self._progress_callback(job, f.flush)
+            delta = None
+            if identity and not job["offset"] and self.delta_updates_enabled():
+                delta = ftp.call(self._delta_update, ftp, job, f, advance)
+
+            def write(data):
+                if self.cancelled.get(job["id"]):
+                    raise TransferCancelled()
+                f.write(data)
+                advance(len(data))
+
+            def retrieve():
+                # Continua a partir da última posição (também depois de uma reconexão automática)
+                f.seek(job["offset"])
+                f.truncate()
+                if job["size"] is None or job["offset"] < job["size"]:
+                    ftp.retrbinary("RETR " + job["remote"], write, rest=job["offset"] or None)
+            ftp.call(retrieve)
+            if delta == "sampled" and not self._verify_download(ftp, job, f):
+                # As amostras coincidiam mas o arquivo não: descarrega-o de novo por inteiro
+                job["offset"] = 0
+                ftp.call(retrieve)
+        if identity and self.download_cache:
+            try:
+                self.download_cache.store(server, job["remote"], identity, job["local"])
+            except OSError:
+                pass  # A cache é apenas uma otimização (por exemplo, disco cheio)
+
+    def _delta_update(self, ftp, job, f, advance):
+        # Atualiza no lugar a cópia local (aberta em f) de um arquivo remoto que mudou sem encolher: o início já
+        # descarregado é comparado por blocos e só os blocos diferentes voltam a ser pedidos (REST); o resto é
+        # depois acrescentado pelo download normal. Com resumos por intervalo (HASH + RANG) a comparação é
+        # exata ("exact"); sem eles, e só se o arquivo cresceu e o servidor calcula o resumo do arquivo inteiro
+        # (HASH), algumas amostras indicam que lhe foram apenas acrescentados dados ("sampled") e o resultado é
+        # depois confirmado por esse resumo. Devolve None quando é preciso descarregar tudo de novo.
+        import hashlib
+        job["offset"] = 0
+        local_size = f.seek(0, os.SEEK_END)
+        if not 0 < local_size <= job["size"]:
+            return None
+        ranges = [(start, min(start + DELTA_BLOCK_SIZE, local_size))
+                  for start in range(0, local_size, DELTA_BLOCK_SIZE)]
+        hashes = remote_range_hashes(ftp, job["remote"], ranges)
+        if hashes is None:
+            # Sem resumo do servidor não há como confirmar as amostras: um arquivo alterado a meio e depois
+            # aumentado ficaria corrompido sem aviso
+            if local_size == job["size"] or "HASH" not in ftp.features:
+                return None
+            # Amostras espalhadas pelo início já descarregado, incluindo os últimos bytes dele
+            length = min(DELTA_SAMPLE_SIZE, local_size)
+            for index in range(DELTA_SAMPLES):
+                start = (local_size - length) * index // (DELTA_SAMPLES - 1)
+                f.seek(start)
+                if fetch_remote_range(ftp, job["remote"], start, length) != f.read(length):
+                    return None
+            advance(local_size)
+            return "sampled"
+        for (start, end), (algorithm, digest) in zip(ranges, hashes):
+            if self.cancelled.get(job["id"]):
+                raise TransferCancelled()
+            f.seek(start)
+            if hashlib.new(algorithm, f.read(end - start)).hexdigest() != digest:
+                data = fetch_remote_range(ftp, job["remote"], start, end - start)
+                f.seek(start)
+                f.write(data)
+            advance(end - start)
+        return "exact"
+
+    def _verify_download(self, ftp, job, f):
+        # Confirma o arquivo atualizado por amostragem com o resumo do servidor (HASH); sem ele, não o aceita
+        expected = ftp.call(remote_file_hash, ftp, job["remote"])
+        f.flush()
+        return expected is not None and local_file_hash(f, expected[0]) == expected[1]
+
+    def _upload(self, ftp, job):
+        # Envia o arquivo local. Uma transferência interrompida continua a partir do tamanho já presente no
+        # servidor (REST + STOR, ou APPE quando o servidor não aceita REST no envio); o resultado é verificado
+        # pelo tamanho (e pelo resumo HASH, se foi retomado) e as falhas temporárias são repetidas com uma
+        # espera que duplica a cada tentativa
+        stat = os.stat(job["local"])
+        if [job["size"], job["modified"]] != [stat.st_size, stat.st_mtime]:
+            # Primeira tentativa, ou o arquivo local mudou desde a interrupção: começa do início
+            job["size"], job["modified"] = stat.st_size, stat.st_mtime
+            job["offset"] = 0
+        advance = self._progress_callback(job)
+        fs = FTPFS(ftp)
+        resumed = False
+        with open(job["local"], "rb") as f:
+            def send():
+                if job["offset"]:
+                    job["offset"] = self._uploaded_size(ftp, job)
+                self.checkpoint(job, durable=True)
+                if ftp.features is None:
+                    ftp.probe_features()
+                mode = "wb" if not job["offset"] or "REST" in ftp.features else "ab"
+                f.seek(job["offset"])
+                with fs.open(job["remote"], mode, job["offset"] if mode == "wb" else 0) as target:
+                    for block in iter(functools.partial(f.read, RELAY_BLOCK_SIZE), b""):
+                        if self.cancelled.get(job["id"]):
+                            raise TransferCancelled()
+                        target.write(block)
+                        advance(len(block))
+
+            for attempt in range(UPLOAD_RETRIES + 1):
+                try:
+                    resumed = resumed or job["offset"] > 0
+                    ftp.call(send, idempotent=False)
+                    if self._verify_upload(ftp, job, f, resumed):
+                        return
+                    job["offset"] = 0
+                    resumed = False
+                    error = Exception("The uploaded file does not match the local file")
+                except (TransferCancelled, TransferModeError, error_perm):
+                    raise
+                except Exception as e:
+                    error = e
+                if attempt == UPLOAD_RETRIES:
+                    raise error
+                delay = UPLOAD_RETRY_DELAY * 2 ** attempt
+                job["error"] = f"Retrying in {delay} s ({attempt + 1}/{UPLOAD_RETRIES}): {error}"
+                self.job_changed.emit(job["id"])
+                deadline = time.monotonic() + delay
+                while time.monotonic() < deadline:
+                    if self.cancelled.get(job["id"]):
+                        raise TransferCancelled()
+                    time.sleep(min(0.2, deadline - time.monotonic()))
+                job["error"] = None
+
+    def _uploaded_size(self, ftp, job):
+        # Bytes do upload já guardados no servidor (SIZE), ou 0 se o arquivo remoto não existir ou não servir
+        try:
+            size = remote_file_size(ftp, job["remote"])
+        except error_perm:
+            return 0
+        return size if size is not None and size <= job["size"] else 0
+
+    def _verify_upload(self, ftp, job, f, resumed):
+        # Confirma o upload pelo tamanho remoto (quando o servidor tem SIZE) e, se foi retomado, pelo resumo
+        # que o servidor calcula (HASH), quando disponível
+        try:
+            size = remote_file_size(ftp, job["remote"])
+        except error_perm:
+            size = None
+        if size is not None and size != job["size"]:
+            return False
+        expected = remote_file_hash(ftp, job["remote"]) if resumed else None
+        return expected is None or local_file_hash(f, expected[0]) == expected[1]
+
+    def _progress_callback(self, job, flush=None):
+        # Função chamada a cada bloco transferido: conta os bytes, regista a posição no diário
+        # periodicamente (depois de flush) e avisa o painel de transferências
+        last_checkpoint = last_update = time.monotonic()
+
+        def advance(length):
+            nonlocal last_checkpoint, last_update
+            job["offset"] += length
+            now = time.monotonic()
+            if now - last_checkpoint >= JOURNAL_CHECKPOINT_INTERVAL:
+                if flush:
+                    flush()
+                self.checkpoint(job)
+                last_checkpoint = now
+            if now - last_update >= TRANSFER_PROGRESS_INTERVAL:
+                self.job_changed.emit(job["id"])
+                last_update = now
+        return advance
+
+# Painel com a fila de transferências: progresso, estado e ações para retomar, cancelar e limpar
+class TransferPanel(QWidget):
+    def __init__(self, queue, parent=None):
         super().__init__(parent)
-        self.ftp_host = ftp_host
-        self.ftp_user = ftp_user
-        self.ftp_passwd = ftp_passwd
-        self.ftp_port = ftp_port
-        self.ftp = FTP()
+        self.queue = queue
+        self.items = {}
+        self.layout = QVBoxLayout()
+
+        self.transfer_list = QTreeWidget()
+        self.transfer_list.setHeaderLabels(["File", "Server", "Progress", "State"])
+        self.transfer_list.setRootIsDecorated(False)
+        self.transfer_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.layout.addWidget(self.transfer_list)
+
+        buttons = QHBoxLayout()
+        self.resume_button = QPushButton("Resume")
+        self.resume_button.clicked.connect(self.resume_selected)
+        buttons.addWidget(self.resume_button)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_selected)
+        buttons.addWidget(self.cancel_button)
+        self.clear_button = QPushButton("Clear Finished")
+        self.clear_button.clicked.connect(self.clear_finished)
+        buttons.addWidget(self.clear_button)
+        self.layout.addLayout(buttons)
+        self.setLayout(self.layout)
+
+        queue.job_changed.connect(self.update_job)
+
+    def update_job(self, job_id):
+        # Atualiza (ou acrescenta) a linha da transferência
+        job = self.queue.jobs.get(job_id)
+        if job is None:
+            return
+        item = self.items.get(job_id)
+        if item is None:
+            item = self.items[job_id] = QTreeWidgetItem(self.transfer_list)
+            item.setData(0, Qt.UserRole, job_id)
+            item.setText(0, posixpath.basename(job["remote"]))
+            if job["direction"] == "upload":
+                item.setToolTip(0, f"{job['local']} -> {job['remote']}")
+            else:
+                item.setToolTip(0, f"{job['remote']} -> {job['local']}")
+            item.setText(1, f"{job['user']}@{job['host']}:{job['port']}")
+        if job["size"]:
+            item.setText(2, f"{format_size(job['offset'])} / {format_size(job['size'])}"
+                            f" ({job['offset'] * 100 // job['size']}%)")
+        else:
+            item.setText(2, format_size(job["offset"]))
+        item.setText(3, job["state"].capitalize() + (f": {job['error']}" if job["error"] else ""))
+
+    def selected_jobs(self):
+        # Identificadores das transferências selecionadas
+        return [item.data(0, Qt.UserRole) for item in self.transfer_list.selectedItems()]
+
+    def resume_selected(self):
+        # Retoma as transferências selecionadas, pedindo a palavra-passe dos servidores sem aba aberta
+        for job_id in self.selected_jobs():
+            job = self.queue.jobs[job_id]
+            server = (job["host"], job["port"], job["user"])
+            if server not in self.queue.credentials:
+                passwd, ok = QInputDialog.getText(self, "Resume Transfers", f"Password for {job['user']}@{job['host']}:",
+                                                  QLineEdit.Password)
+                if not ok:
+                    continue
+                self.queue.credentials[server] = passwd
+            self.queue.resume(job_id)
+
+    def cancel_selected(self):
+        # Cancela as transferências selecionadas
+        for job_id in self.selected_jobs():
+            self.queue.cancel(job_id)
+
+    def clear_finished(self):
+        # Retira da lista as transferências terminadas ou canceladas
+        self.queue.clear_finished()
+        for job_id in [job_id for job_id in self.items if job_id not in self.queue.jobs]:
+            item = self.items.pop(job_id)
+            self.transfer_list.takeTopLevelItem(self.transfer_list.indexOfTopLevelItem(item))
+
+# Classe base dos painéis de arquivos (local e remoto): listagem com filtro, histórico de navegação,
+# operações sobre arquivos e arrastar e largar, tudo feito através do sistema de arquivos do painel (self.fs)
+class FilePane(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.main_window = parent
+        self.fs = None
+        self.current_path = None
 
         # Histórico de navegação para permitir avançar e voltar
         self.history = []
@@ -33,83 +3911,440 @@ class FTPClient(QDialog):
         self.toolbar.addWidget(self.forward_button)
         self.layout.addWidget(self.toolbar)
 
-        # Lista de arquivos e diretórios no servidor FTP
-        self.file_list = QListWidget()
-        self.file_list.itemDoubleClicked.connect(self.navigate_to_directory)
-        self.file_list.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.file_list.customContextMenuRequested.connect(self.show_context_menu)
-        self.layout.addWidget(self.file_list)
+        # Lista de arquivos e diretórios, com barra de filtro; os itens podem ser arrastados entre painéis
+        self.file_model = ListingModel(self)
+        self.file_model.drag_source = self.drag_payload
+        self.file_model.drop_target = self.handle_drop
+        self.filter_bar = FilterBar(self.file_model)
+        self.layout.addWidget(self.filter_bar)
+        self.file_list = create_listing_view(self, self.file_model)
+        self.file_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.splitter = QSplitter(Qt.Horizontal)
+        self.splitter.addWidget(self.file_list)
+        self.layout.addWidget(self.splitter)
 
         self.setLayout(self.layout)
 
-    def load_ftp_directory(self, path="/"):
-        # Conecta ao servidor FTP e carrega o diretório
+    def load_directory(self, path):
+        # Lista o diretório pelo sistema de arquivos do painel e mostra-o (os painéis podem fazê-lo numa thread)
         try:
-            if not self.ftp.sock:
-                self.ftp.connect(self.ftp_host, self.ftp_port)
-                self.ftp.login(self.ftp_user, self.ftp_passwd)
-            self.ftp.cwd(path)
-            self.update_file_list()
+            self.show_listing(*self.fs.list(path))
+        except Exception as e:
+            QMessageBox.critical(self, "Directory Load Error", f"Could not load directory: {e}")
 
-            # Atualiza o histórico
-            if not self.history or self.history[self.history_index] != path:
-                self.history = self.history[:self.history_index + 1]
-                self.history.append(path)
-                self.history_index += 1
+    def open_file(self, entry):
+        # Ação do duplo clique sobre um arquivo: mostra o caminho do arquivo selecionado
+        path = self.item_path(self.file_model.listing.names[entry])
+        QMessageBox.information(self, "File Selected", f"Selected file: {path}")
 
-        except Exception as e:
-            QMessageBox.critical(self, "Connection Error", f"Could not connect to FTP server: {e}")
+    def item_path(self, name):
+        # Caminho de um item do diretório atual
+        return self.fs.join(self.current_path, name)
+
+    def show_listing(self, path, listing):
+        # Mostra a listagem do diretório e regista-o no histórico
+        if path != self.current_path:
+            self.filter_bar.clear()
+        self.file_model.set_listing(listing)
+        self.current_path = path
+
+        # Atualiza o histórico
+        if not self.history or self.history[self.history_index] != path:
+            self.history = self.history[:self.history_index + 1]
+            self.history.append(path)
+            self.history_index += 1
 
+    @traced()
     def update_file_list(self):
-        # Atualiza a lista de arquivos e diretórios
-        self.file_list.clear()
-        files = []
-        self.ftp.retrlines('LIST', files.append)
-        for file in files:
-            self.file_list.addItem(file)
-
-    def navigate_to_directory(self, item):
-        # Navega para o diretório ou inicia a confirmação de download do arquivo
-        selected_item = item.text()
-        if selected_item.startswith('d'):
-            parts = selected_item.split()
-            directory_name = parts[-1]
-            try:
-                self.load_ftp_directory(directory_name)
-            except Exception as e:
-                QMessageBox.critical(self, "Navigation Error", f"Could not navigate to directory: {e}")
+        # Volta a listar o diretório atual, sem usar a cache
+        self.file_model.set_listing(self.fs.list(self.current_path, cached=False)[1])
+
+    def selected_entry(self):
+        # Devolve (nome, é_diretório) do item selecionado, ou None
+        entry = self.file_model.entry_index(self.file_list.currentIndex())
+        if entry is None:
+            return None
+        listing = self.file_model.listing
+        return listing.names[entry], bool(listing.is_dir[entry])
+
+    def selected_entries(self):
+        # Devolve (nome, é_diretório) de todos os itens selecionados
+        listing = self.file_model.listing
+        entries = [self.file_model.entry_index(index) for index in self.file_list.selectionModel().selectedRows()]
+        return [(listing.names[entry], bool(listing.is_dir[entry])) for entry in entries]
+
+    def select_entries(self, entries):
+        # Seleciona as linhas das entradas indicadas (as escondidas pelo filtro ficam de fora), juntando as
+        # linhas seguidas num só intervalo, e devolve quantas foram selecionadas
+        wanted = set(entries)
+        selection = QItemSelection()
+        last_column = self.file_model.columnCount() - 1
+        start = None
+        count = 0
+        for row, entry in enumerate(self.file_model.rows):
+            if entry in wanted:
+                count += 1
+                if start is None:
+                    start = row
+            elif start is not None:
+                selection.select(self.file_model.index(start, 0), self.file_model.index(row - 1, last_column))
+                start = None
+        if start is not None:
+            selection.select(self.file_model.index(start, 0),
+                             self.file_model.index(len(self.file_model.rows) - 1, last_column))
+        self.file_list.selectionModel().select(selection, QItemSelectionModel.ClearAndSelect)
+        return count
+
+    @traced()
+    def navigate_to_directory(self, index):
+        # Navega para o diretório selecionado ou abre o arquivo
+        entry = self.file_model.entry_index(index)
+        if entry is None:
+            return
+        listing = self.file_model.listing
+        if listing.is_dir[entry]:
+            self.load_directory(self.item_path(listing.names[entry]))
         else:
-            file_name = selected_item.split()[-1]
-            self.confirm_download(file_name)
+            self.open_file(entry)
 
     def navigate_back(self):
         # Navega para o diretório anterior no histórico
         if self.history_index > 0:
             self.history_index -= 1
-            self.load_ftp_directory(self.history[self.history_index])
+            self.load_directory(self.history[self.history_index])
 
     def navigate_forward(self):
         # Navega para o diretório seguinte no histórico
         if self.history_index < len(self.history) - 1:
             self.history_index += 1
-            self.load_ftp_directory(self.history[self.history_index])
+            self.load_directory(self.history[self.history_index])
+
+    def create_folder(self):
+        # Cria uma nova pasta no diretório atual
+        folder_name, ok = QInputDialog.getText(self, "Create Folder", "Folder Name:")
+        if ok and folder_name:
+            try:
+                self.fs.mkdir(self.item_path(folder_name))
+                self.update_file_list()
+            except Exception as e:
+                QMessageBox.critical(self, "Create Folder Error", f"Could not create folder: {e}")
+
+    def delete_item(self):
+        # Exclui o item selecionado (arquivo ou pasta), ou todos os selecionados
+        entries = self.selected_entries()
+        if len(entries) > 1:
+            self.delete_items(entries)
+            return
+        selected_item = self.selected_entry()
+        if selected_item:
+            item_name, is_dir = selected_item
+            try:
+                self.fs.remove(self.item_path(item_name), is_dir)
+                self.update_file_list()
+            except Exception as e:
+                QMessageBox.critical(self, "Delete Error", f"Could not delete item: {e}")
+
+    def delete_items(self, entries):
+        # Exclui vários itens de uma só vez
+        reply = QMessageBox.question(self, "Delete", f"Delete {len(entries)} selected items?")
+        if reply != QMessageBox.Yes:
+            return
+        errors = []
+        for name, is_dir in entries:
+            try:
+                self.fs.remove(self.item_path(name), is_dir)
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+        self.update_file_list()
+        if errors:
+            QMessageBox.critical(self, "Delete Error", "Could not delete:\n" + "\n".join(errors))
+
+    def rename_item(self):
+        # Renomeia o item selecionado
+        selected_item = self.selected_entry()
+        if selected_item:
+            old_name = selected_item[0]
+            new_name, ok = QInputDialog.getText(self, "Rename Item", "New Name:")
+            if ok and new_name:
+                try:
+                    self.fs.rename(self.item_path(old_name), self.item_path(new_name))
+                    self.update_file_list()
+                except Exception as e:
+                    QMessageBox.critical(self, "Rename Error", f"Could not rename item: {e}")
+
+    def drag_payload(self, entries):
+        # Descreve as entradas arrastadas deste painel: o painel de origem e os caminhos dos itens
+        listing = self.file_model.listing
+        return {"pane": id(self),
+                "entries": [[self.item_path(listing.names[i]), bool(listing.is_dir[i])] for i in entries]}
+
+    def handle_drop(self, payload, target_name):
+        # Recebe itens largados de outro painel (num subdiretório, se largados sobre uma pasta)
+        source = self.main_window.find_pane(payload.get("pane"))
+        if source is None or source is self:
+            return False
+        target_directory = self.item_path(target_name) if target_name else self.current_path
+        return self.receive_items(source, [tuple(entry) for entry in payload["entries"]], target_directory)
+
+    def receive_items(self, source, entries, target_directory):
+        # Transfere itens de outro painel para este (implementado por cada painel); devolve se os aceitou
+        return False
+
+    def transfer_items(self, ftp_client, direction, source, entries, target_directory):
+        # Percorre os itens na origem, cria as pastas no destino e põe os arquivos na fila de transferências
+        progress = QProgressDialog("Preparing transfer...", "Cancel", 0, 0, self)
+        progress.setWindowTitle("Transfer")
+        progress.setMinimumDuration(500)
+        worker = TransferPlanWorker(source.fs, self.fs, entries, target_directory, self)
+        progress.canceled.connect(worker.cancel)
+
+        def planned(files):
+            if direction == "upload":
+                pairs = [(target, source_path) for source_path, target in files]
+            else:
+                pairs = files
+            self.main_window.transfer_queue.enqueue(ftp_client, direction, pairs)
+            self.main_window.transfers_dock.raise_()
+
+        worker.planned.connect(planned)
+        worker.failed.connect(lambda error: QMessageBox.critical(self, "Transfer Error",
+                                                                 f"Could not prepare the transfer: {error}"))
+        worker.finished.connect(progress.close)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+# Classe que gerencia a conexão FTP e a exibição do diretório atual
+class FTPClient(FilePane):
+    def __init__(self, parent=None, ftp_host="", ftp_user="anonymous", ftp_passwd="", ftp_port=21, tls=None,
+                 transfer_mode=None):
+        super().__init__(parent)
+        self.ftp_host = ftp_host
+        self.ftp_user = ftp_user
+        self.ftp_passwd = ftp_passwd
+        self.ftp_port = ftp_port
+        # Proteção FTPS das conexões de dados ("P" ou "C"), ou None para FTP simples
+        self.tls = tls
+        self.server = (ftp_host, ftp_port, ftp_user)
+        # Modo de conexão de dados imposto (None = automático) e modo mais rápido aprendido para o host
+        self.transfer_mode = transfer_mode
+        self.learned_transfer_mode = parent.history_store.transfer_modes(ftp_host, ftp_user, ftp_port)[0]
+        self.ftp = create_ftp_session(tls)
+        self.ftp.set_transfer_mode(transfer_mode, self.learned_transfer_mode)
+        self.current_path = "/"
+        self.listing_cache = parent.listing_cache
+        self.fs = FTPFS(self.ftp, self.server, self.listing_cache, self.open_session)
+        self.prefetcher = ListingPrefetcher(self.open_session, self.server, self.listing_cache)
+        # Tempo (em segundos) gasto a estabelecer a conexão e a autenticar
+        self.connect_latency = None
+
+        # Estado da segurança da sessão (e custo dos handshakes TLS, com FTPS)
+        self.security_label = QLabel()
+        self.toolbar.addWidget(self.security_label)
+
+        # Árvore de pastas do servidor, à esquerda da lista; cada pasta só é listada quando é expandida
+        self.folder_model = RemoteTreeModel(self.fs, self)
+        self.folder_tree = QTreeView()
+        self.folder_tree.setModel(self.folder_model)
+        self.folder_tree.setUniformRowHeights(True)
+        self.folder_tree.clicked.connect(self.open_tree_directory)
+        self.folder_tree.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.folder_tree.customContextMenuRequested.connect(self.show_tree_context_menu)
+        self.splitter.insertWidget(0, self.folder_tree)
+        self.splitter.setStretchFactor(1, 1)
+
+        # Prioriza o pré-carregamento da linha selecionada ou sob o cursor
+        self.file_list.setMouseTracking(True)
+        self.file_list.entered.connect(self.prioritize_prefetch)
+        self.file_list.selectionModel().currentChanged.connect(self.prioritize_prefetch)
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(PREFETCH_IDLE_DELAY)
+        self.prefetch_timer.timeout.connect(self.schedule_prefetch)
+
+    def remote_path(self, name):
+        # Caminho absoluto de um item do diretório atual
+        return join_remote_path(self.current_path, name)
+
+    @traced()
+    def load_directory(self, path="/"):
+        # Conecta ao servidor FTP e carrega o diretório (da cache de listagens, quando possível)
+        try:
+            if not self.ftp.sock:
+                scheduler.adopt(self.ftp, self.ftp_host, id(self))
+                started = time.perf_counter()
+                self.ftp.connect(self.ftp_host, self.ftp_port)
+                self.ftp.login(self.ftp_user, self.ftp_passwd)
+                self.connect_latency = time.perf_counter() - started
+            path, listing = self.fs.list(self.remote_path(path))
+            self.show_listing(path, listing)
+            self.show_in_tree(path, listing)
+            self.update_security_label()
+            self.remember_transfer_mode()
+            self.prefetch_timer.start()
+            self.main_window.history_store.update_last_directory(
+                self.ftp_host, self.ftp_user, self.ftp_port, path)
+
+        except Exception as e:
+            QMessageBox.critical(self, "Connection Error", f"Could not connect to FTP server: {e}")
+
+    def remember_transfer_mode(self):
+        # Guarda no histórico o modo de conexão de dados mais rápido desta sessão, se mudou (só quando
+        # negociado automaticamente; um modo imposto não diz qual é o mais rápido)
+        mode = self.ftp.best_transfer_mode()
+        if mode and not self.transfer_mode and mode != self.learned_transfer_mode:
+            self.learned_transfer_mode = mode
+            self.main_window.history_store.update_transfer_mode(self.ftp_host, self.ftp_user, self.ftp_port, mode)
+
+    def update_security_label(self):
+        # Mostra se a sessão é cifrada e quanto custam os handshakes TLS
+        if isinstance(self.ftp, ReconnectingFTPS):
+            text = "  " + self.ftp.tls_summary()
+        else:
+            text = "  Plain FTP (unencrypted)"
+        mode = self.ftp.forced_transfer_mode or self.ftp.best_transfer_mode()
+        if mode:
+            text += f"  |  data: {TRANSFER_MODE_LABELS[mode]}"
+        self.security_label.setText(text)
+
+    def update_file_list(self):
+        # Atualiza a lista de arquivos e diretórios a partir do servidor
+        super().update_file_list()
+        self.folder_model.update_directory(self.current_path, self.file_model.listing)
+        self.remember_transfer_mode()
+
+    def show_in_tree(self, path, listing):
+        # Atualiza o nó do diretório na árvore de pastas (se já foi expandido) e seleciona-o
+        self.folder_model.update_directory(path, listing)
+        if self.folder_model.root.children is None:
+            self.folder_tree.expand(self.folder_model.index_for(self.folder_model.root))
+        node = self.folder_model.find(path)
+        if node is not None:
+            index = self.folder_model.index_for(node)
+            self.folder_tree.setCurrentIndex(index)
+            self.folder_tree.scrollTo(index)
+
+    def open_tree_directory(self, index):
+        # Mostra na lista o diretório clicado na árvore de pastas
+        node = self.folder_model.node(index)
+        if node.path != self.current_path:
+            self.load_directory(node.path)
+
+    def show_tree_context_menu(self, position):
+        # Menu contextual da árvore de pastas: voltar a listar a pasta no servidor
+        index = self.folder_tree.indexAt(position)
+        if not index.isValid():
+            return
+        menu = QMenu()
+        refresh_action = QAction("Refresh", self)
+        refresh_action.triggered.connect(lambda: self.folder_model.refresh(index))
+        menu.addAction(refresh_action)
+        menu.exec_(self.folder_tree.viewport().mapToGlobal(position))
+
+    def schedule_prefetch(self):
+        # Pré-carrega os subdiretórios do diretório atual: primeiro os visitados recentemente
+        listing = self.file_model.listing
+        subdirectories = [self.remote_path(listing.names[i]) for i in range(len(listing)) if listing.is_dir[i]]
+        recent = set(self.history)
+        self.prefetcher.schedule(sorted(subdirectories, key=lambda path: path not in recent))
+
+    def prioritize_prefetch(self, index):
+        # Dá prioridade ao subdiretório da linha selecionada ou sob o cursor
+        entry = self.file_model.entry_index(index)
+        if entry is not None and self.file_model.listing.is_dir[entry]:
+            self.prefetcher.prioritize(self.remote_path(self.file_model.listing.names[entry]))
+
+    def open_file(self, entry):
+        # O duplo clique num arquivo abre a pré-visualização
+        self.preview_file(entry)
+
+    def preview_file(self, entry=None):
+        # Pré-visualiza o arquivo selecionado obtendo só o início (ou o fim), sem o descarregar por inteiro
+        if entry is None:
+            entry = self.file_model.entry_index(self.file_list.currentIndex())
+        listing = self.file_model.listing
+        if entry is None or listing.is_dir[entry]:
+            return
+        dialog = PreviewDialog(self, listing.names[entry], listing.sizes[entry], listing.mtimes[entry])
+        dialog.load()
+        dialog.exec_()
 
     def confirm_download(self, file_name):
         # Aba de confirmação de download
-        tab = self.parent().parent().add_confirmation_tab(file_name, self.ftp)
-        tab.confirmation_button.clicked.connect(lambda: self.download_file(file_name, tab))
+        remote_path = self.remote_path(file_name)
+        tab = self.main_window.add_confirmation_tab(file_name, self.ftp)
+        tab.confirmation_button.clicked.connect(lambda: self.download_file(remote_path, tab))
+
+    def download_selected(self):
+        # Pede a confirmação de download do arquivo selecionado (o duplo clique abre a pré-visualização)
+        selected = self.selected_entry()
+        if selected is not None and not selected[1]:
+            self.confirm_download(selected[0])
+
+    def select_by_pattern(self):
+        # Seleciona os itens cujo nome corresponde a um padrão, ou descarrega os arquivos correspondentes
+        dialog = PatternSelectionDialog(self.current_path, self)
+        if not dialog.exec_():
+            return
+        mode = dialog.mode_combo.currentText()
+        pattern = dialog.pattern_input.text()
+        case_sensitive = dialog.case_checkbox.isChecked()
+        if dialog.action == "select":
+            listing = self.file_model.listing
+            matches = filter_listing(listing, mode, pattern, case_sensitive)
+            selected = self.select_entries(matches)
+            if selected < len(matches):
+                QMessageBox.information(self, "Select by Pattern",
+                                        f"{len(matches) - selected} matching items are hidden by the filter.")
+        else:
+            self.download_matching(mode, pattern, dialog.recursive_checkbox.isChecked(), case_sensitive)
+
+    def download_matching(self, mode, pattern, recursive, case_sensitive=False):
+        # Procura os arquivos que correspondem ao padrão e põe-nos todos na fila de transferências, com uma
+        # única pasta de destino (os subdiretórios, com recursive, são recriados dentro dela)
+        destination = QFileDialog.getExistingDirectory(self, "Download Matching Files To")
+        if not destination:
+            return
+        directory = self.current_path
+        progress = QProgressDialog("Looking for matching files...", "Cancel", 0, 0, self)
+        progress.setWindowTitle("Download by Pattern")
+        progress.setMinimumDuration(0)
+        worker = PatternMatchWorker(self.fs, directory, mode, pattern, recursive, case_sensitive, self)
+        worker.progress.connect(lambda listed: progress.setLabelText(
+            f"Looking for matching files...\n{listed} folders listed"))
+        progress.canceled.connect(worker.cancel)
 
-    def download_file(self, file_name, tab):
+        def matched(paths):
+            progress.close()
+            if not paths:
+                QMessageBox.information(self, "Download by Pattern", f"No files match {pattern}.")
+                return
+            pairs = [(path, os.path.join(destination, *posixpath.relpath(path, directory).split("/")))
+                     for path in paths]
+            try:
+                for local_directory in {os.path.dirname(local_path) for _, local_path in pairs}:
+                    os.makedirs(local_directory, exist_ok=True)
+            except OSError as e:
+                QMessageBox.critical(self, "Download Error", f"Could not create {e.filename}: {e.strerror}")
+                return
+            self.main_window.transfer_queue.enqueue(self, "download", pairs)
+            self.main_window.transfers_dock.raise_()
+
+        worker.matched.connect(matched)
+        worker.failed.connect(lambda error: QMessageBox.critical(self, "Download Error",
+                                                                 f"Could not find the files: {error}"))
+        worker.finished.connect(progress.close)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+    def download_file(self, remote_path, tab):
         # Realiza o download do arquivo após a confirmação
+        file_name = posixpath.basename(remote_path)
         save_path, _ = QFileDialog.getSaveFileName(self, "Save File", file_name)
         if save_path:
-            with open(save_path, 'wb') as f:
-                try:
-                    self.ftp.retrbinary(f"RETR {file_name}", f.write)
-                    QMessageBox.information(self, "Download Complete", f"File {file_name} downloaded successfully.")
-                    tab.close_tab()
-                except Exception as e:
-                    QMessageBox.critical(self, "Download Error", f"Could not download file: {e}")
+            # O download corre na fila de transferências (registada no diário, para sobreviver a um reinício)
+            self.main_window.transfer_queue.enqueue_download(self, remote_path, save_path)
+            self.main_window.transfers_dock.raise_()
+            tab.close_tab()
 
     def show_context_menu(self, position):
         # Menu contextual para criar, editar, renomear e excluir arquivos/pastas no servidor FTP
@@ -119,6 +4354,14 @@ class FTPClient(QDialog):
         create_folder_action.triggered.connect(self.create_folder)
         menu.addAction(create_folder_action)
 
+        preview_file_action = QAction("Preview", self)
+        preview_file_action.triggered.connect(lambda: self.preview_file())
+        menu.addAction(preview_file_action)
+
+        download_file_action = QAction("Download...", self)
+        download_file_action.triggered.connect(self.download_selected)
+        menu.addAction(download_file_action)
+
         delete_item_action = QAction("Delete", self)
         delete_item_action.triggered.connect(self.delete_item)
         menu.addAction(delete_item_action)
@@ -127,114 +4370,283 @@ class FTPClient(QDialog):
         rename_item_action.triggered.connect(self.rename_item)
         menu.addAction(rename_item_action)
 
+        move_items_action = QAction("Move To...", self)
+        move_items_action.triggered.connect(self.move_items)
+        menu.addAction(move_items_action)
+
+        select_by_pattern_action = QAction("Select by Pattern...", self)
+        select_by_pattern_action.triggered.connect(self.select_by_pattern)
+        menu.addAction(select_by_pattern_action)
+
+        delete_recursively_action = QAction("Delete Recursively...", self)
+        delete_recursively_action.triggered.connect(self.delete_recursively)
+        menu.addAction(delete_recursively_action)
+
+        chmod_items_action = QAction("Change Permissions...", self)
+        chmod_items_action.triggered.connect(self.chmod_items)
+        menu.addAction(chmod_items_action)
+
+        calculate_size_action = QAction("Calculate Size", self)
+        calculate_size_action.triggered.connect(self.calculate_size)
+        menu.addAction(calculate_size_action)
+
         menu.exec_(self.file_list.viewport().mapToGlobal(position))
 
-    def create_folder(self):
-        # Cria uma nova pasta no servidor FTP
-        folder_name, ok = QInputDialog.getText(self, "Create Folder", "Folder Name:")
-        if ok and folder_name:
-            try:
-                self.ftp.mkd(folder_name)
-                self.update_file_list()
-            except Exception as e:
-                QMessageBox.critical(self, "Create Folder Error", f"Could not create folder: {e}")
+    def open_session(self, priority=PRIORITY_BULK, cancelled=None, paired_with=None, wait=True):
+        # Abre uma conexão adicional ao mesmo servidor, para trabalho em segundo plano (espera pela vez no
+        # escalonador de conexões, partilhado por todas as abas); devolve None se a espera for cancelada, ou
+        # sem wait se não houver vaga livre
+        ftp = scheduler.open_session(self.ftp_host, self.ftp_user, self.ftp_passwd, self.ftp_port, id(self),
+                                     priority, self.tls, wait, cancelled=cancelled, paired_with=paired_with)
+        if ftp is None:
+            return None
+        ftp.set_transfer_mode(self.transfer_mode, self.ftp.best_transfer_mode() or self.learned_transfer_mode)
+        return ftp
 
-    def delete_item(self):
-        # Exclui o item selecionado (arquivo ou pasta) no servidor FTP
-        selected_item = self.file_list.currentItem().text()
-        if selected_item:
-            parts = selected_item.split()
-            item_name = parts[-1]
+    def calculate_size(self):
+        # Calcula o tamanho do diretório selecionado (ou do atual) percorrendo a árvore remota
+        entry = self.file_model.entry_index(self.file_list.currentIndex())
+        listing = self.file_model.listing
+        if entry is not None and listing.is_dir[entry]:
+            path = posixpath.join(self.current_path, listing.names[entry])
+            mtime = listing.mtimes[entry]
+        else:
+            path, mtime = self.current_path, 0.0
+
+        progress = QProgressDialog(f"Calculating size of {path}...", "Cancel", 0, 0, self)
+        progress.setWindowTitle("Calculate Size")
+        progress.setMinimumDuration(0)
+        worker = DirectorySizeWorker(self.open_session, (self.ftp_host, self.ftp_port, self.ftp_user), path, mtime,
+                                     self.main_window.size_cache, self)
+        worker.progress.connect(lambda directories, files, size: progress.setLabelText(
+            f"Calculating size of {path}...\n{directories} folders, {files} files, {format_size(size)}"))
+        worker.completed.connect(lambda totals, errors: DirectorySizeDialog(path, totals, errors, self).exec_())
+        worker.failed.connect(lambda error: QMessageBox.critical(self, "Calculate Size Error",
+                                                                 f"Could not calculate size: {error}"))
+        worker.finished.connect(progress.close)
+        worker.finished.connect(worker.deleteLater)
+        progress.canceled.connect(worker.cancel)
+        worker.start()
+
+    def run_bulk_commands(self, title, names, groups, invalidated=()):
+        # Executa os comandos em lote numa sessão secundária, mostra o resultado por item e atualiza a vista uma vez
+        progress = QProgressDialog(f"{title}...", None, 0, len(groups), self)
+        progress.setWindowTitle(title)
+        progress.setMinimumDuration(500)
+        worker = BulkCommandWorker(self.open_session, groups, self)
+        worker.progress.connect(progress.setValue)
+
+        def completed(results):
+            for path in invalidated:
+                self.listing_cache.invalidate(self.server, path)
             try:
-                if selected_item.startswith('d'):
-                    self.ftp.rmd(item_name)
-                else:
-                    self.ftp.delete(item_name)
                 self.update_file_list()
             except Exception as e:
-                QMessageBox.critical(self, "Delete Error", f"Could not delete item: {e}")
+                QMessageBox.critical(self, "Refresh Error", f"Could not refresh the listing: {e}")
+            BulkResultDialog(title, names, results, self).exec_()
 
-    def rename_item(self):
-        # Renomeia o item selecionado no servidor FTP
-        selected_item = self.file_list.currentItem().text()
-        if selected_item:
-            parts = selected_item.split()
-            old_name = parts[-1]
-            new_name, ok = QInputDialog.getText(self, "Rename Item", "New Name:")
-            if ok and new_name:
+        worker.completed.connect(completed)
+        worker.failed.connect(lambda error: QMessageBox.critical(self, f"{title} Error", error))
+        worker.finished.connect(progress.close)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+    def delete_items(self, entries):
+        # Exclui vários itens de uma só vez, com os comandos em lote numa sessão secundária
+        reply = QMessageBox.question(self, "Delete", f"Delete {len(entries)} selected items?")
+        if reply != QMessageBox.Yes:
+            return
+        paths = [self.remote_path(name) for name, _ in entries]
+        groups = [[("RMD " if is_dir else "DELE ") + path] for path, (_, is_dir) in zip(paths, entries)]
+        self.run_bulk_commands("Delete", [name for name, _ in entries], groups,
+                               [path for path, (_, is_dir) in zip(paths, entries) if is_dir])
+
+    def receive_items(self, source, entries, target_directory):
+        # Itens de outra aba são copiados diretamente entre os servidores; os do painel local são enviados
+        if isinstance(source, FTPClient):
+            self.copy_from_server(source, entries, target_directory)
+        else:
+            self.transfer_items(self, "upload", source, entries, target_directory)
+        return True
+
+    def copy_from_server(self, source, entries, target_directory):
+        # Copia itens de outra aba para este servidor (FXP, com alternativa através do cliente)
+        progress = QProgressDialog("Copying between servers...", "Cancel", 0, 0, self)
+        progress.setWindowTitle("Server to Server Copy")
+        progress.setMinimumDuration(0)
+        worker = ServerToServerWorker(source.open_session, self.open_session, entries, target_directory, self)
+        worker.progress.connect(lambda done, total: (progress.setMaximum(total), progress.setValue(done)))
+        progress.canceled.connect(worker.cancel)
+
+        def completed(copied, relayed, errors):
+            self.listing_cache.invalidate(self.server, target_directory)
+            if target_directory == self.current_path:
                 try:
-                    self.ftp.rename(old_name, new_name)
                     self.update_file_list()
                 except Exception as e:
-                    QMessageBox.critical(self, "Rename Error", f"Could not rename item: {e}")
+                    QMessageBox.critical(self, "Refresh Error", f"Could not refresh the listing: {e}")
+            message = f"Copied {copied} files."
+            if relayed:
+                message += f" FXP was refused, so {relayed} files were relayed through this computer."
+            if errors:
+                message += f"\n{len(errors)} files could not be copied, e.g. {errors[0][0]}: {errors[0][1]}"
+            QMessageBox.information(self, "Server to Server Copy", message)
 
-# Classe que gerencia a navegação local
-class LocalFileBrowser(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.layout = QVBoxLayout()
+        worker.completed.connect(completed)
+        worker.failed.connect(lambda error: QMessageBox.critical(self, "Copy Error", f"Could not copy: {error}"))
+        worker.finished.connect(progress.close)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
 
-        # Histórico de navegação para permitir avançar e voltar
-        self.history = []
-        self.history_index = -1
+    def delete_recursively(self):
+        # Conta o conteúdo dos itens selecionados e, após confirmação, exclui tudo em paralelo
+        entries = [(self.remote_path(name), is_dir) for name, is_dir in self.selected_entries()]
+        if not entries:
+            return
+        progress = QProgressDialog("Counting items to delete...", "Cancel", 0, 0, self)
+        progress.setWindowTitle("Delete Recursively")
+        progress.setMinimumDuration(0)
+        counter = RecursiveDeleteWorker(self.open_session, entries, parent=self)
+        counter.progress.connect(lambda phase, done, total: progress.setLabelText(
+            f"Counting items to delete...\n{done} folders listed"))
+        progress.canceled.connect(counter.cancel)
 
-        # Toolbar para navegação
-        self.toolbar = QToolBar()
-        self.back_button = QPushButton("Back")
-        self.back_button.clicked.connect(self.navigate_back)
-        self.forward_button = QPushButton("Forward")
-        self.forward_button.clicked.connect(self.navigate_forward)
-        self.toolbar.addWidget(self.back_button)
-        self.toolbar.addWidget(self.forward_button)
-        self.layout.addWidget(self.toolbar)
+        def planned(files, directories, size):
+            progress.close()
+            reply = QMessageBox.question(
+                self, "Delete Recursively",
+                f"Delete {files} files ({format_size(size)}) and {directories} folders? This cannot be undone.")
+            if reply == QMessageBox.Yes:
+                self.start_recursive_delete(entries, counter.plan)
 
-        # Lista de arquivos e diretórios locais
-        self.file_list = QListWidget()
-        self.file_list.itemDoubleClicked.connect(self.navigate_to_directory)
-        self.file_list.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.file_list.customContextMenuRequested.connect(self.show_context_menu)
-        self.layout.addWidget(self.file_list)
+        counter.planned.connect(planned)
+        counter.failed.connect(lambda error: QMessageBox.critical(self, "Delete Error", f"Could not delete: {error}"))
+        counter.finished.connect(progress.close)
+        counter.finished.connect(counter.deleteLater)
+        counter.start()
 
-        self.setLayout(self.layout)
-        self.load_local_directory(os.path.expanduser("~"))
+    def start_recursive_delete(self, entries, plan):
+        # Executa a exclusão planeada, com progresso e possibilidade de interromper
+        progress = QProgressDialog("Deleting...", "Abort", 0, len(plan[0]) + len(plan[1]), self)
+        progress.setWindowTitle("Delete Recursively")
+        progress.setMinimumDuration(0)
+        worker = RecursiveDeleteWorker(self.open_session, entries, plan, self)
+        worker.progress.connect(lambda phase, done, total: progress.setValue(done))
+        progress.canceled.connect(worker.cancel)
 
-    def load_local_directory(self, path):
-        # Carrega a lista de arquivos e diretórios locais
-        self.file_list.clear()
-        try:
-            for item in os.listdir(path):
-                self.file_list.addItem(item)
-            self.current_path = path
+        def completed(deleted, errors):
+            for path, is_dir in entries:
+                if is_dir:
+                    self.listing_cache.invalidate(self.server, path)
+            try:
+                self.update_file_list()
+            except Exception as e:
+                QMessageBox.critical(self, "Refresh Error", f"Could not refresh the listing: {e}")
+            message = f"Deleted {deleted} items."
+            if worker.cancelled.is_set():
+                message += " The deletion was aborted."
+            if errors:
+                message += f"\n{len(errors)} items could not be deleted, e.g. {errors[0][0]}: {errors[0][1]}"
+            QMessageBox.information(self, "Delete Recursively", message)
+
+        worker.completed.connect(completed)
+        worker.failed.connect(lambda error: QMessageBox.critical(self, "Delete Error", f"Could not delete: {error}"))
+        worker.finished.connect(progress.close)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+    def move_items(self):
+        # Move os itens selecionados para outro diretório remoto
+        entries = self.selected_entries()
+        if not entries:
+            return
+        destination, ok = QInputDialog.getText(self, "Move To", "Destination Folder:", text=self.current_path)
+        if ok and destination:
+            destination = self.remote_path(destination)
+            paths = [self.remote_path(name) for name, _ in entries]
+            groups = [["RNFR " + path, "RNTO " + join_remote_path(destination, name)]
+                      for path, (name, _) in zip(paths, entries)]
+            self.run_bulk_commands("Move", [name for name, _ in entries], groups, paths + [destination])
 
-            # Atualiza o histórico
-            if not self.history or self.history[self.history_index] != path:
-                self.history = self.history[:self.history_index + 1]
-                self.history.append(path)
-                self.history_index += 1
+    def chmod_items(self):
+        # Altera as permissões dos itens selecionados com SITE CHMOD
+        entries = self.selected_entries()
+        if not entries:
+            return
+        mode, ok = QInputDialog.getText(self, "Change Permissions", "Mode (octal, e.g. 644):")
+        if ok and mode:
+            if not re.fullmatch(r"[0-7]{3,4}", mode):
+                QMessageBox.critical(self, "Change Permissions Error", f"Invalid mode: {mode}")
+                return
+            groups = [[f"SITE CHMOD {mode} {self.remote_path(name)}"] for name, _ in entries]
+            self.run_bulk_commands("Change Permissions", [name for name, _ in entries], groups)
+
+
+# Thread que lê um diretório local (que pode estar num disco lento ou em rede, como uma home em NFS)
+class LocalScanWorker(QThread):
+    completed = pyqtSignal(int, str, object)
+    failed = pyqtSignal(int, str, str)
+
+    def __init__(self, fs, generation, path, parent=None):
+        super().__init__(parent)
+        self.fs = fs
+        self.generation = generation
+        self.path = path
 
+    def run(self):
+        try:
+            with tracer.span("LocalFS.list", "local", path=self.path):
+                path, listing = self.fs.list(self.path)
+            self.completed.emit(self.generation, path, listing)
         except Exception as e:
-            QMessageBox.critical(self, "Directory Load Error", f"Could not load directory: {e}")
+            self.failed.emit(self.generation, self.path, str(e))
 
-    def navigate_to_directory(self, item):
-        # Navega até o diretório local selecionado ou abre o arquivo
-        selected_item = item.text()
-        new_path = os.path.join(self.current_path, selected_item)
-        if os.path.isdir(new_path):
-            self.load_local_directory(new_path)
-        else:
-            QMessageBox.information(self, "File Selected", f"Selected file: {new_path}")
+# Classe que gerencia a navegação local
+class LocalFileBrowser(FilePane):
+    directory_loaded = pyqtSignal(str)
 
-    def navigate_back(self):
-        # Navega para o diretório anterior no histórico
-        if self.history_index > 0:
-            self.history_index -= 1
-            self.load_local_directory(self.history[self.history_index])
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.fs = LocalFS()
+        # Número da leitura de diretório mais recente (os resultados de leituras anteriores são ignorados)
+        self.scan_generation = 0
 
-    def navigate_forward(self):
-        # Navega para o diretório seguinte no histórico
-        if self.history_index < len(self.history) - 1:
-            self.history_index += 1
-            self.load_local_directory(self.history[self.history_index])
+        # A pasta pessoal é lida depois de a janela aparecer, numa thread
+        QTimer.singleShot(0, lambda: self.load_directory(os.path.expanduser("~")))
+
+    @traced()
+    def load_directory(self, path):
+        # Inicia a leitura do diretório local numa thread; a lista é atualizada quando terminar
+        self.scan_generation += 1
+        worker = LocalScanWorker(self.fs, self.scan_generation, path, self)
+        worker.completed.connect(self.show_local_listing)
+        worker.failed.connect(self.show_scan_error)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+    @traced()
+    def show_local_listing(self, generation, path, listing):
+        # Mostra a listagem lida (se ainda for a pedida mais recentemente)
+        if generation != self.scan_generation:
+            return
+        self.show_listing(path, listing)
+        self.directory_loaded.emit(path)
+
+    def show_scan_error(self, generation, path, error):
+        # Informa que o diretório não pôde ser lido (se ainda for o pedido mais recentemente)
+        if generation == self.scan_generation:
+            QMessageBox.critical(self, "Directory Load Error", f"Could not load directory: {error}")
+
+    def update_file_list(self):
+        # Volta a ler o diretório atual (também numa thread)
+        self.load_directory(self.current_path)
+
+    def receive_items(self, source, entries, target_directory):
+        # Itens largados de uma aba FTP são descarregados (pela fila de transferências) para este diretório
+        if not isinstance(source, FTPClient):
+            return False
+        self.transfer_items(source, "download", source, entries, target_directory)
+        return True
 
     def show_context_menu(self, position):
         # Menu contextual para criar, renomear e excluir arquivos/pastas localmente
@@ -254,52 +4666,30 @@ class LocalFileBrowser(QDialog):
 
         menu.exec_(self.file_list.viewport().mapToGlobal(position))
 
-    def create_folder(self):
-        # Cria uma nova pasta localmente
-        folder_name, ok = QInputDialog.getText(self, "Create Folder", "Folder Name:")
-        if ok and folder_name:
-            try:
-                os.mkdir(os.path.join(self.current_path, folder_name))
-                self.load_local_directory(self.current_path)
-            except Exception as e:
-                QMessageBox.critical(self, "Create Folder Error", f"Could not create folder: {e}")
-
-    def delete_item(self):
-        # Exclui o item selecionado (arquivo ou pasta) localmente
-        selected_item = self.file_list.currentItem().text()
-        if selected_item:
-            item_path = os.path.join(self.current_path, selected_item)
-            try:
-                if os.path.isdir(item_path):
-                    os.rmdir(item_path)
-                else:
-                    os.remove(item_path)
-                self.load_local_directory(self.current_path)
-            except Exception as e:
-                QMessageBox.critical(self, "Delete Error", f"Could not delete item: {e}")
-
-    def rename_item(self):
-        # Renomeia o item selecionado localmente
-        selected_item = self.file_list.currentItem().text()
-        if selected_item:
-            old_path = os.path.join(self.current_path, selected_item)
-            new_name, ok = QInputDialog.getText(self, "Rename Item", "New Name:")
-            if ok and new_name:
-                try:
-                    new_path = os.path.join(self.current_path, new_name)
-                    os.rename(old_path, new_path)
-                    self.load_local_directory(self.current_path)
-                except Exception as e:
-                    QMessageBox.critical(self, "Rename Error", f"Could not rename item: {e}")
-
 # Classe principal que gerencia a interface gráfica e a navegação entre abas
 class FTPBrower(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("FTP Browser")
         self.resize(800, 600)
+        self.settings = QSettings("ftp_browser", "FTP Browser")
+        DirectoryListing.memory_limit = self.settings.value(
+            "listings/memory_limit_mb", LISTING_MEMORY_LIMIT_MB, type=int) * 1024 * 1024
+        scheduler.set_limits(self.settings.value("connections/max_total", MAX_CONNECTIONS_TOTAL, type=int),
+                             self.settings.value("connections/max_per_host", MAX_CONNECTIONS_PER_HOST, type=int))
+        ReconnectingFTPS.unverified_hosts = set(self.settings.value("tls/unverified_hosts", [], type=list))
+        self.history_store = ConnectionHistoryStore()
+        self.size_cache = DirectorySizeCache()
+        self.listing_cache = ListingCache()
+        self.preview_cache = PreviewCache()
+        self.download_cache = DownloadCache()
+        self.transfer_queue = TransferQueue(download_cache=self.download_cache, parent=self)
+        self.session_warmer = SessionWarmer(self.history_store, self.transfer_queue.credentials, self)
 
         self.tab_widget = QTabWidget()
+        # Ao arrastar itens sobre uma aba, ela passa a ser a aba visível (para largar itens entre servidores)
+        self.tab_widget.tabBar().setChangeCurrentOnDrag(True)
+        self.tab_widget.tabBar().setAcceptDrops(True)
         self.setCentralWidget(self.tab_widget)
 
         self.connection_tab = QWidget()
@@ -327,6 +4717,28 @@ class FTPBrower(QMainWindow):
         self.port_input.setText("21")
         self.connection_layout.addWidget(self.port_input)
 
+        self.tls_checkbox = QCheckBox("Use explicit FTPS (AUTH TLS)")
+        self.connection_layout.addWidget(self.tls_checkbox)
+        self.protect_data_checkbox = QCheckBox("Encrypt listings and file transfers (PROT P)")
+        self.protect_data_checkbox.setChecked(True)
+        self.protect_data_checkbox.setEnabled(False)
+        self.tls_checkbox.toggled.connect(self.protect_data_checkbox.setEnabled)
+        self.connection_layout.addWidget(self.protect_data_checkbox)
+        self.unverified_checkbox = QCheckBox("Accept this host's certificate without verifying it (self-signed)")
+        self.unverified_checkbox.setEnabled(False)
+        self.tls_checkbox.toggled.connect(self.unverified_checkbox.setEnabled)
+        self.host_input.textChanged.connect(
+            lambda host: self.unverified_checkbox.setChecked(host in ReconnectingFTPS.unverified_hosts))
+        self.connection_layout.addWidget(self.unverified_checkbox)
+
+        transfer_mode_layout = QHBoxLayout()
+        transfer_mode_layout.addWidget(QLabel("Data connection mode:"))
+        self.transfer_mode_combo = QComboBox()
+        for mode, label in TRANSFER_MODE_LABELS.items():
+            self.transfer_mode_combo.addItem(label, mode)
+        transfer_mode_layout.addWidget(self.transfer_mode_combo)
+        self.connection_layout.addLayout(transfer_mode_layout)
+
         self.connect_button = QPushButton("Connect")
         self.connect_button.clicked.connect(self.connect_to_ftp)
         self.connection_layout.addWidget(self.connect_button)
@@ -335,20 +4747,135 @@ class FTPBrower(QMainWindow):
         self.history_button.clicked.connect(self.show_connection_history)
         self.connection_layout.addWidget(self.history_button)
 
+        self.warmup_checkbox = QCheckBox("Pre-connect to frequently used hosts in the background "
+                                         "(anonymous logins and accounts already open in a tab)")
+        self.warmup_checkbox.setChecked(self.session_warmer.is_enabled())
+        self.warmup_checkbox.toggled.connect(self.session_warmer.set_enabled)
+        self.connection_layout.addWidget(self.warmup_checkbox)
+
+        cache_layout = QHBoxLayout()
+        cache_layout.addWidget(QLabel("Local download cache limit (MB, 0 to disable):"))
+        self.download_cache_spin = QSpinBox()
+        self.download_cache_spin.setRange(0, 1024 * 1024)
+        self.download_cache_spin.setValue(self.download_cache.max_bytes() // (1024 * 1024))
+        self.download_cache_spin.valueChanged.connect(self.download_cache.set_max_mb)
+        cache_layout.addWidget(self.download_cache_spin)
+        self.connection_layout.addLayout(cache_layout)
+
+        self.delta_checkbox = QCheckBox("Update existing local files in place, fetching only the changed parts")
+        self.delta_checkbox.setChecked(self.transfer_queue.delta_updates_enabled())
+        self.delta_checkbox.toggled.connect(self.transfer_queue.set_delta_updates)
+        self.connection_layout.addWidget(self.delta_checkbox)
+
+        listing_memory_layout = QHBoxLayout()
+        listing_memory_layout.addWidget(QLabel("Memory per directory listing (MB, the rest is kept on disk):"))
+        self.listing_memory_spin = QSpinBox()
+        self.listing_memory_spin.setRange(1, 64 * 1024)
+        self.listing_memory_spin.setValue(DirectoryListing.memory_limit // (1024 * 1024))
+        self.listing_memory_spin.valueChanged.connect(self.set_listing_memory_limit)
+        listing_memory_layout.addWidget(self.listing_memory_spin)
+        self.connection_layout.addLayout(listing_memory_layout)
+
+        # Máximos de conexões simultâneas por servidor e ao todo (partilhados por todas as abas)
+        connection_limits_layout = QHBoxLayout()
+        connection_limits_layout.addWidget(QLabel("Max connections per server:"))
+        self.max_per_host_spin = QSpinBox()
+        self.max_per_host_spin.setRange(2, 64)
+        self.max_per_host_spin.setValue(scheduler.max_per_host)
+        self.max_per_host_spin.valueChanged.connect(self.set_connection_limits)
+        connection_limits_layout.addWidget(self.max_per_host_spin)
+        connection_limits_layout.addWidget(QLabel("in total:"))
+        self.max_total_spin = QSpinBox()
+        self.max_total_spin.setRange(2, 256)
+        self.max_total_spin.setValue(scheduler.max_total)
+        self.max_total_spin.valueChanged.connect(self.set_connection_limits)
+        connection_limits_layout.addWidget(self.max_total_spin)
+        self.connection_layout.addLayout(connection_limits_layout)
+
         self.connection_tab.setLayout(self.connection_layout)
         self.tab_widget.addTab(self.connection_tab, "Connect to FTP")
 
         # Adicionando o explorador de arquivos locais encapsulado no QDockWidget à direita
         self.local_file_browser = QDockWidget("Local File Explorer", self)
-        self.local_file_browser.setWidget(LocalFileBrowser(self))
+        self.local_browser = LocalFileBrowser(self)
+        self.local_file_browser.setWidget(self.local_browser)
         self.addDockWidget(Qt.RightDockWidgetArea, self.local_file_browser)
 
-    def add_new_tab(self, ftp_host, ftp_user, ftp_passwd, ftp_port):
-        # Adiciona uma nova aba para o cliente FTP
-        new_tab = FTPClient(self, ftp_host, ftp_user, ftp_passwd, ftp_port)
-        new_tab.load_ftp_directory()
+        # Fila de transferências, em baixo; retoma as transferências interrompidas na última execução
+        self.transfers_dock = QDockWidget("Transfers", self)
+        self.transfers_dock.setWidget(TransferPanel(self.transfer_queue, self))
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.transfers_dock)
+        QTimer.singleShot(0, self.transfer_queue.restore)
+        # Diretórios (servidor ou None, caminho) a atualizar depois de transferências terminadas
+        self.refreshed_directories = set()
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(TRANSFER_REFRESH_DELAY)
+        self.refresh_timer.timeout.connect(self.refresh_transferred_directories)
+        self.transfer_queue.job_changed.connect(self.transfer_changed)
+
+        # Pré-conecta aos hosts mais usados depois de a janela aparecer
+        QTimer.singleShot(0, self.session_warmer.warm_most_used)
+
+        # Menu de diagnóstico: registo de spans e exportação do trace
+        tools_menu = self.menuBar().addMenu("Tools")
+        self.trace_action = QAction("Record Trace", self)
+        self.trace_action.setCheckable(True)
+        self.trace_action.setChecked(tracer.enabled)
+        self.trace_action.toggled.connect(tracer.set_enabled)
+        tools_menu.addAction(self.trace_action)
+        export_trace_action = QAction("Export Trace...", self)
+        export_trace_action.triggered.connect(self.export_trace)
+        tools_menu.addAction(export_trace_action)
+
+    def add_new_tab(self, ftp_host, ftp_user, ftp_passwd, ftp_port, path="/", tls=None, transfer_mode=None):
+        # Adiciona uma nova aba para o cliente FTP, reaproveitando uma sessão pré-conectada se existir
+        new_tab = FTPClient(self, ftp_host, ftp_user, ftp_passwd, ftp_port, tls, transfer_mode)
+        warmed = self.session_warmer.take(ftp_host, ftp_user, ftp_port, tls, ftp_passwd)
+        if warmed:
+            new_tab.ftp = new_tab.fs.ftp = warmed[0]
+            new_tab.ftp.set_transfer_mode(transfer_mode, new_tab.learned_transfer_mode)
+            self.listing_cache.put(new_tab.server, warmed[1], warmed[2])
+        new_tab.load_directory(path)
+        if new_tab.ftp.sock:
+            self.transfer_queue.set_credentials(new_tab.server, ftp_passwd)
         self.tab_widget.addTab(new_tab, f"{ftp_host}:{ftp_port}")
         self.tab_widget.setCurrentWidget(new_tab)
+        return new_tab
+
+    def find_pane(self, pane_id):
+        # Devolve o painel (aba FTP ou painel local) com o identificador indicado (usado ao largar itens)
+        if id(self.local_browser) == pane_id:
+            return self.local_browser
+        for index in range(self.tab_widget.count()):
+            widget = self.tab_widget.widget(index)
+            if isinstance(widget, FTPClient) and id(widget) == pane_id:
+                return widget
+        return None
+
+    def transfer_changed(self, job_id):
+        # Quando uma transferência termina, atualiza (agrupadamente) o painel que mostra o diretório de destino
+        job = self.transfer_queue.jobs.get(job_id)
+        if job is None or job["state"] != "completed":
+            return
+        if job["direction"] == "upload":
+            self.listing_cache.invalidate((job["host"], job["port"], job["user"]), posixpath.dirname(job["remote"]))
+            self.refreshed_directories.add(((job["host"], job["port"], job["user"]), posixpath.dirname(job["remote"])))
+        else:
+            self.refreshed_directories.add((None, os.path.dirname(job["local"])))
+        self.refresh_timer.start()
+
+    def refresh_transferred_directories(self):
+        # Atualiza uma vez cada painel que mostra um diretório onde terminaram transferências
+        directories, self.refreshed_directories = self.refreshed_directories, set()
+        panes = [self.local_browser] + [self.tab_widget.widget(index) for index in range(self.tab_widget.count())]
+        for pane in panes:
+            server = pane.server if isinstance(pane, FTPClient) else None
+            if isinstance(pane, FilePane) and (server, pane.current_path) in directories:
+                try:
+                    pane.update_file_list()
+                except Exception as e:
+                    QMessageBox.critical(self, "Refresh Error", f"Could not refresh the listing: {e}")
 
     def add_confirmation_tab(self, file_name, ftp_client):
         # Adiciona uma aba de confirmação para download
@@ -363,27 +4890,86 @@ class FTPBrower(QMainWindow):
         ftp_user = self.user_input.text()
         ftp_passwd = self.passwd_input.text()
         ftp_port = int(self.port_input.text())
-        self.add_new_tab(ftp_host, ftp_user, ftp_passwd, ftp_port)
-        self.record_connection_history(ftp_host, ftp_user, ftp_port)
+        tls = None
+        if self.tls_checkbox.isChecked():
+            tls = "P" if self.protect_data_checkbox.isChecked() else "C"
+            self.set_certificate_verification(ftp_host, not self.unverified_checkbox.isChecked())
+        transfer_mode = self.transfer_mode_combo.currentData()
+        new_tab = self.add_new_tab(ftp_host, ftp_user, ftp_passwd, ftp_port, tls=tls, transfer_mode=transfer_mode)
+        self.record_connection_history(new_tab)
+
+    def record_connection_history(self, ftp_client):
+        # Registra o histórico de conexões (com a latência, a segurança e os modos de conexão de dados da aba)
+        self.history_store.record_connection(
+            ftp_client.ftp_host, ftp_client.ftp_user, ftp_client.ftp_port, ftp_client.connect_latency,
+            ftp_client.tls, ftp_client.transfer_mode, ftp_client.learned_transfer_mode)
 
-    def record_connection_history(self, ftp_host, ftp_user, ftp_port):
-        # Registra o histórico de conexões
-        with open("connection_history.txt", "a") as f:
-            f.write(f"{ftp_host},{ftp_user},{ftp_port}\n")
+    def set_certificate_verification(self, host, verify):
+        # Guarda a escolha, por host, de verificar ou não o certificado TLS do servidor
+        if verify:
+            ReconnectingFTPS.unverified_hosts.discard(host)
+        else:
+            ReconnectingFTPS.unverified_hosts.add(host)
+        self.settings.setValue("tls/unverified_hosts", sorted(ReconnectingFTPS.unverified_hosts))
+
+    def set_listing_memory_limit(self, megabytes):
+        # Altera a memória máxima dos textos de cada listagem (aplica-se às listagens obtidas a partir de agora)
+        self.settings.setValue("listings/memory_limit_mb", int(megabytes))
+        DirectoryListing.memory_limit = int(megabytes) * 1024 * 1024
+
+    def set_connection_limits(self):
+        # Aplica e guarda os máximos de conexões escolhidos
+        self.settings.setValue("connections/max_per_host", self.max_per_host_spin.value())
+        self.settings.setValue("connections/max_total", self.max_total_spin.value())
+        scheduler.set_limits(self.max_total_spin.value(), self.max_per_host_spin.value())
 
     def show_connection_history(self):
         # Exibe o histórico de conexões para seleção
         history_manager = ConnectionHistoryManager(self)
         history_manager.exec_()
 
+    def export_trace(self):
+        # Grava os spans registados num ficheiro JSON para abrir em chrome://tracing ou no Perfetto
+        path, _ = QFileDialog.getSaveFileName(self, "Export Trace", "ftp_browser_trace.json", "Trace (*.json)")
+        if path:
+            try:
+                count = tracer.export(path)
+                QMessageBox.information(self, "Export Trace", f"Wrote {count} spans to {path}.")
+            except OSError as e:
+                QMessageBox.critical(self, "Export Trace", f"Could not write the trace: {e}")
+
+    def closeEvent(self, event):
+        # Fecha as sessões pré-conectadas ao sair (e grava o trace pedido pela variável de ambiente)
+        self.session_warmer.close_all()
+        if tracer.output:
+            try:
+                tracer.export()
+            except OSError:
+                pass
+        super().closeEvent(event)
+
 # Classe para gerenciar o histórico de conexões
 class ConnectionHistoryManager(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Connection History")
         self.layout = QVBoxLayout()
+        self.store = parent.history_store
+        self.loaded_count = 0
+        self.has_more = True
+
+        # Campo de pesquisa por host ou utilizador
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search host or user")
+        self.search_input.textChanged.connect(self.load_history)
+        self.layout.addWidget(self.search_input)
 
         self.history_list = QListWidget()
+        self.history_list.itemDoubleClicked.connect(self.connect_selected)
+        # Pré-conecta ao host sob o cursor (se a pré-conexão estiver ligada)
+        self.history_list.setMouseTracking(True)
+        self.history_list.itemEntered.connect(self.warm_item)
+        self.history_list.verticalScrollBar().valueChanged.connect(self.load_more_if_needed)
         self.layout.addWidget(self.history_list)
 
         self.select_button = QPushButton("Connect")
@@ -394,24 +4980,54 @@ class ConnectionHistoryManager(QDialog):
         self.load_history()
 
     def load_history(self):
-        # Carrega o histórico de conexões a partir de um arquivo
-        try:
-            with open("connection_history.txt", "r") as f:
-                lines = f.readlines()
-                for line in lines:
-                    self.history_list.addItem(line.strip())
-        except FileNotFoundError:
-            pass
+        # Carrega a primeira página do histórico que corresponde à pesquisa
+        self.history_list.clear()
+        self.loaded_count = 0
+        self.has_more = True
+        self.load_next_page()
+
+    def load_next_page(self):
+        # Carrega mais uma página de entradas (ordenadas da mais recente para a mais antiga)
+        rows = self.store.search(self.search_input.text(), HISTORY_PAGE_SIZE, self.loaded_count)
+        for row in rows:
+            text = f"{row['user']}@{row['host']}:{row['port']}  ({row['use_count']}x"
+            if row["tls"]:
+                text += f", FTPS/PROT {row['tls']}"
+            mode = row["forced_transfer_mode"] or row["transfer_mode"]
+            if mode:
+                text += f", {mode}" + (" forced" if row["forced_transfer_mode"] else "")
+            if row["last_latency"] is not None:
+                text += f", {row['last_latency'] * 1000:.0f} ms"
+            text += ")"
+            if row["last_directory"]:
+                text += f"  {row['last_directory']}"
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole,
+                         (row["host"], row["user"], row["port"], row["last_directory"] or "/", row["tls"],
+                          row["forced_transfer_mode"]))
+            self.history_list.addItem(item)
+        self.loaded_count += len(rows)
+        self.has_more = len(rows) == HISTORY_PAGE_SIZE
+
+    def warm_item(self, item):
+        # Inicia a pré-conexão ao host da entrada sob o cursor
+        ftp_host, ftp_user, ftp_port, last_directory, tls, _ = item.data(Qt.UserRole)
+        self.parent().session_warmer.warm(ftp_host, ftp_user, ftp_port, last_directory, tls)
+
+    def load_more_if_needed(self, value):
+        # Carrega a página seguinte quando a lista chega ao fim
+        if self.has_more and value == self.history_list.verticalScrollBar().maximum():
+            self.load_next_page()
 
     def connect_selected(self):
         # Conecta à seleção do histórico
         selected_item = self.history_list.currentItem()
         if selected_item:
-            connection_info = selected_item.text().split(",")
-            ftp_host = connection_info[0]
-            ftp_user = connection_info[1]
-            ftp_port = int(connection_info[2])
-            self.parent().add_new_tab(ftp_host, ftp_user, "", ftp_port)
+            ftp_host, ftp_user, ftp_port, last_directory, tls, transfer_mode = selected_item.data(Qt.UserRole)
+            ftp_passwd = self.parent().session_warmer.password_for(ftp_host, ftp_user, ftp_port) or ""
+            new_tab = self.parent().add_new_tab(ftp_host, ftp_user, ftp_passwd, ftp_port, last_directory, tls,
+                                                transfer_mode)
+            self.parent().record_connection_history(new_tab)
             self.close()
 
 # Classe que gerencia as abas de confirmação de download
@@ -436,9 +5052,68 @@ class ConfirmationTab(QWidget):
         index = parent.indexOf(self)
         parent.removeTab(index)
 
+# Mede o tempo de arranque: até à primeira pintura da janela e até à pasta local aparecer
+class StartupBenchmark(QObject):
+    def __init__(self, app, window, budget_ms=STARTUP_BUDGET_MS):
+        super().__init__(app)
+        self.app = app
+        self.budget_ms = budget_ms
+        self.first_paint_ms = None
+        self.local_listing_ms = None
+        app.installEventFilter(self)
+        window.local_browser.directory_loaded.connect(self.local_directory_loaded)
+        # Não espera indefinidamente se algo bloquear
+        QTimer.singleShot(max(budget_ms, 1000) * 10, self.report)
+
+    def elapsed_ms(self):
+        # Medido desde o lançamento do processo (indicado pelo processo que o lançou) ou, sem ele, desde o
+        # início da execução do módulo
+        origin = float(os.environ.get(STARTUP_ORIGIN_VARIABLE, STARTUP_STARTED))
+        return (time.perf_counter() - origin) * 1000
+
+    def eventFilter(self, watched, event):
+        # Regista a primeira pintura de qualquer widget da janela
+        if self.first_paint_ms is None and event.type() == QEvent.Paint:
+            self.first_paint_ms = self.elapsed_ms()
+            self.app.removeEventFilter(self)
+            self.report_when_done()
+        return False
+
+    def local_directory_loaded(self, path):
+        if self.local_listing_ms is None:
+            self.local_listing_ms = self.elapsed_ms()
+            self.report_when_done()
+
+    def report_when_done(self):
+        if self.first_paint_ms is not None and self.local_listing_ms is not None:
+            self.report()
+
+    def report(self):
+        # Escreve os tempos e termina com código 1 se a primeira pintura exceder o orçamento
+        def show(value):
+            return "timed out" if value is None else f"{value:.0f} ms"
+        print(f"first paint: {show(self.first_paint_ms)}; local directory listed: {show(self.local_listing_ms)};"
+              f" budget: {self.budget_ms} ms")
+        within_budget = self.first_paint_ms is not None and self.first_paint_ms <= self.budget_ms
+        self.app.exit(0 if within_budget else 1)
+
 # Função principal para iniciar a aplicação
 if __name__ == "__main__":
+    # --benchmark-startup[=ms]: mede o arranque a frio e falha se ultrapassar o orçamento
+    budget_ms = None
+    for argument in sys.argv[1:]:
+        if argument.startswith("--benchmark-startup"):
+            budget = argument.partition("=")[2]
+            budget_ms = int(budget) if budget else STARTUP_BUDGET_MS
+    if budget_ms is not None and STARTUP_ORIGIN_VARIABLE not in os.environ:
+        # Mede um processo novo, lançado daqui: assim a medição inclui o arranque do interpretador e a
+        # compilação do script, que acontecem antes de qualquer linha do módulo
+        import subprocess
+        env = dict(os.environ, **{STARTUP_ORIGIN_VARIABLE: repr(time.perf_counter())})
+        sys.exit(subprocess.call([sys.executable] + sys.argv, env=env))
     app = QApplication(sys.argv)
     window = FTPBrower()
     window.show()
+    if budget_ms is not None:
+        benchmark = StartupBenchmark(app, window, budget_ms)
     sys.exit(app.exec_())
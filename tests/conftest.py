@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import threading
+import logging
+
+import pytest
+
+# O módulo lê os diretórios de configuração e de cache ao ser importado: os testes usam diretórios temporários
+SANDBOX = tempfile.mkdtemp(prefix="ftp_browser_tests_")
+os.environ["XDG_CONFIG_HOME"] = os.path.join(SANDBOX, "config")
+os.environ["XDG_CACHE_HOME"] = os.path.join(SANDBOX, "cache")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    # Aplicação Qt partilhada pelos testes que criam widgets ou objetos com sinais
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def ftp_server():
+    # Inicia servidores FTP locais (pyftpdlib), cada um com o seu ciclo de eventos, e pára-os no fim do teste.
+    # Devolve uma função start(raiz, handler=None) -> porta; o utilizador "u" tem a palavra-passe "p"
+    pytest.importorskip("pyftpdlib")
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.ioloop import IOLoop
+    from pyftpdlib.servers import FTPServer
+    logging.getLogger("pyftpdlib").setLevel(logging.CRITICAL)
+    servers = []
+
+    def start(root, handler=None):
+        authorizer = DummyAuthorizer()
+        authorizer.add_user("u", "p", root, perm="elradfmwMT")
+        handler_class = type("Handler", (handler or FTPHandler,), {"authorizer": authorizer})
+        server = FTPServer(("127.0.0.1", 0), handler_class, ioloop=IOLoop())
+        threading.Thread(target=server.serve_forever, kwargs={"timeout": 0.05}, daemon=True).start()
+        servers.append(server)
+        return server.address[1]
+
+    yield start
+    for server in servers:
+        server.close_all()
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("pyftpdlib")
+from pyftpdlib.handlers import FTPHandler  # noqa: E402
+
+import ftp_browserV5 as browser  # noqa: E402
+
+
+class FlakyHandler(FTPHandler):
+    # Servidor que responde 450 ao MLST de "busy" e recusa listar "locked"
+    def ftp_MLST(self, path):
+        if path.endswith("/busy"):
+            self.respond("450 Directory is busy.")
+            return
+        return super().ftp_MLST(path)
+
+    def ftp_LIST(self, path):
+        if path.endswith("/locked"):
+            self.respond("550 Permission denied.")
+            return
+        return super().ftp_LIST(path)
+
+
+@pytest.fixture
+def tree(ftp_server, tmp_path):
+    for directory in ("top/a/deep", "top/busy/inner", "top/locked"):
+        (tmp_path / directory).mkdir(parents=True)
+    (tmp_path / "top" / "a" / "one.bin").write_bytes(b"1" * 100)
+    (tmp_path / "top" / "a" / "deep" / "two.bin").write_bytes(b"2" * 20)
+    (tmp_path / "top" / "busy" / "inner" / "three.bin").write_bytes(b"3" * 3)
+    (tmp_path / "top" / "locked" / "hidden.bin").write_bytes(b"4" * 4)
+    port = ftp_server(str(tmp_path), FlakyHandler)
+    return lambda cancelled=None: browser.scheduler.open_session("127.0.0.1", "u", "p", port, "walk",
+                                                                 cancelled=cancelled)
+
+
+def run_size_worker(qapp, open_session):
+    worker = browser.DirectorySizeWorker(open_session, ("127.0.0.1", 21, "u"), "/top", 0.0,
+                                         browser.DirectorySizeCache())
+    results = []
+    worker.completed.connect(lambda totals, errors: results.append((totals, errors)))
+    worker.failed.connect(results.append)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    thread.join(20)
+    assert not thread.is_alive(), "the directory walk hung"
+    qapp.processEvents()
+    return results
+
+
+def test_directory_size_survives_failing_directories(qapp, tree):
+    [(totals, errors)] = run_size_worker(qapp, tree)
+    # "busy" (450 ao MLST) fica de fora com a sua subárvore; "locked" não pode ser listado
+    assert sorted(path for path, _ in errors) == ["/top/busy", "/top/locked"]
+    assert totals["/top"][:2] == [2, 120]
+    assert totals["/top/a"] == [2, 120, 1]
+
+
+def test_directory_walk_reports_errors_and_lists_the_rest(tree):
+    listings, errors = browser.walk_remote_tree(tree, ["/top"], threading.Event())
+    assert [path for path, _ in errors] == ["/top/locked"]
+    assert sorted(listings) == ["/top", "/top/a", "/top/a/deep", "/top/busy", "/top/busy/inner"]
+    assert list(listings["/top/busy/inner"].names) == ["three.bin"]
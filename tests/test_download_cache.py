@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+pytest.importorskip("PyQt5")
+import ftp_browserV5 as browser  # noqa: E402
+
+SERVER = ("example.com", 21, "u")
+IDENTITY = (11, "20260101000000")
+
+
+def rewrite_in_place(path, data):
+    # Como o download retomado ou por diferenças: reescreve o arquivo existente aberto em "r+b"
+    with open(path, "r+b") as f:
+        f.seek(0)
+        f.truncate()
+        f.write(data)
+
+
+def test_clones_are_independent_copies(tmp_path):
+    blob = tmp_path / "blob"
+    blob.write_bytes(b"cached data")
+    first, second = tmp_path / "a", tmp_path / "c"
+    assert browser.clone_file(str(blob), str(first)) in ("reflink", "copy")
+    browser.clone_file(str(blob), str(second))
+    assert os.stat(first).st_ino != os.stat(blob).st_ino
+    rewrite_in_place(first, b"changed!")
+    assert blob.read_bytes() == b"cached data"
+    assert second.read_bytes() == b"cached data"
+
+
+def test_rewriting_a_served_file_leaves_the_cache_intact(tmp_path):
+    cache = browser.DownloadCache(str(tmp_path / "cache"))
+    downloaded = tmp_path / "downloaded.bin"
+    downloaded.write_bytes(b"hello world")
+    cache.store(SERVER, "/file.bin", IDENTITY, str(downloaded))
+    served = tmp_path / "served.bin"
+    assert cache.fetch(SERVER, "/file.bin", IDENTITY, str(served))
+    rewrite_in_place(downloaded, b"other data!")
+    rewrite_in_place(served, b"local edit")
+    again = tmp_path / "again.bin"
+    assert cache.fetch(SERVER, "/file.bin", IDENTITY, str(again))
+    assert again.read_bytes() == b"hello world"
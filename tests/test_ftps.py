@@ -0,0 +1,56 @@
+import os
+import ssl
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("OpenSSL")  # O TLS do pyftpdlib usa o pyOpenSSL
+pytest.importorskip("pyftpdlib")
+from pyftpdlib.handlers import TLS_FTPHandler  # noqa: E402
+
+import ftp_browserV5 as browser  # noqa: E402
+
+# Certificado autoassinado (e chave) para 127.0.0.1 e localhost, válido até 2126
+CERTIFICATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ftps_localhost.pem")
+
+
+class TLSHandler(TLS_FTPHandler):
+    certfile = CERTIFICATE
+
+
+@pytest.fixture
+def ftps_port(ftp_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(browser.ReconnectingFTPS, "unverified_hosts", set())
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_text(name)
+    return ftp_server(str(tmp_path), TLSHandler)
+
+
+def test_ftps_rejects_an_untrusted_certificate(ftps_port):
+    with pytest.raises(ssl.SSLCertVerificationError):
+        browser.open_ftp_session("127.0.0.1", "u", "p", ftps_port, tls="P")
+
+
+def test_ftps_accepts_a_self_signed_certificate_for_an_opted_out_host(ftps_port):
+    browser.ReconnectingFTPS.unverified_hosts.add("127.0.0.1")
+    ftp = browser.open_ftp_session("127.0.0.1", "u", "p", ftps_port, tls="P")
+    try:
+        assert sorted(ftp.nlst()) == ["a.txt", "b.txt", "c.txt"]
+    finally:
+        ftp.quit()
+
+
+def test_ftps_verifies_a_trusted_certificate_and_resumes_data_sessions(ftps_port, monkeypatch):
+    # O certificado de teste passa a ser uma autoridade de confiança (lida por ssl.create_default_context)
+    monkeypatch.setenv("SSL_CERT_FILE", CERTIFICATE)
+    ftp = browser.open_ftp_session("127.0.0.1", "u", "p", ftps_port, tls="P")
+    try:
+        assert ftp.sock.getpeercert()["subject"] == ((("commonName", "localhost"),),)
+        for name in ("a.txt", "b.txt", "c.txt"):
+            chunks = []
+            ftp.retrbinary(f"RETR {name}", chunks.append)
+            assert b"".join(chunks) == name.encode()
+        assert ftp.data_handshakes == 3
+        assert ftp.data_handshakes_resumed == 3
+    finally:
+        ftp.quit()
@@ -0,0 +1,131 @@
+import fnmatch
+import re
+import time
+
+import pytest
+
+pytest.importorskip("PyQt5")
+import ftp_browserV5 as browser  # noqa: E402
+
+STEMS = ("Report", "data", "imagem-çã", "backup", "draft")
+EXTENSIONS = ("txt", "csv", "gz", "JPG")
+NAMES = [f"{STEMS[i % 5]}_{i}.{EXTENSIONS[i % 4]}" for i in range(1200)] + ["plain", "x" * 300]
+
+
+def make_listing(spill):
+    listing = browser.DirectoryListing()
+    for i, name in enumerate(NAMES):
+        listing.append(f"{name}-{i}" if i % 7 == 0 else name, i % 5 == 0, i, float(i))
+    listing.seal()
+    assert (listing.names.spill is not None) == spill
+    return listing
+
+
+@pytest.fixture(params=[False, True], ids=["memory", "spilled"])
+def listing(request, monkeypatch):
+    if request.param:
+        # Limite pequeno: a maior parte dos nomes vai para o arquivo temporário
+        monkeypatch.setattr(browser.DirectoryListing, "memory_limit", 4096)
+    return make_listing(request.param)
+
+
+def expected(listing, mode, text):
+    names = list(listing.names)
+    if mode == "Substring":
+        return [i for i, name in enumerate(names) if text.lower() in name.lower()]
+    if mode == "Prefix":
+        return [i for i, name in enumerate(names) if name.lower().startswith(text.lower())]
+    if mode == "Glob":
+        return [i for i, name in enumerate(names) if fnmatch.fnmatchcase(name.lower(), text.lower())]
+    return [i for i, name in enumerate(names) if re.search(text, name, re.IGNORECASE)]
+
+
+@pytest.mark.parametrize("mode, text", [
+    ("Substring", "a"), ("Substring", "REPORT_1"), ("Substring", "çã"), ("Substring", "-7"),
+    ("Prefix", "d"), ("Prefix", "data_1"), ("Glob", "*.txt"), ("Glob", "data*.csv"), ("Glob", "*_1*"),
+    ("Glob", "im?gem*[gj]?"), ("Glob", "plain"), ("Regex", r"^d.*\d\.csv$"), ("Regex", "x{300}"),
+])
+def test_filter_matches_a_reference_implementation(listing, mode, text):
+    assert browser.filter_listing(listing, mode, text) == expected(listing, mode, text)
+
+
+@pytest.mark.parametrize("mode, text", [
+    ("Substring", "Report"), ("Substring", "report"), ("Glob", "*.JPG"), ("Glob", "*_1*"), ("Glob", "data*.csv"),
+    ("Regex", "^Rep"), ("Prefix", "D"), ("Substring", "plain"), ("Substring", "PLAIN"), ("Glob", "*Data_1?.*"),
+])
+def test_case_sensitive_filter_matches_a_reference_implementation(listing, mode, text):
+    names = list(listing.names)
+    reference = {"Substring": lambda name: text in name, "Prefix": lambda name: name.startswith(text),
+                 "Glob": lambda name: fnmatch.fnmatchcase(name, text), "Regex": lambda name: re.search(text, name)}
+    assert browser.filter_listing(listing, mode, text, case_sensitive=True) == [
+        i for i, name in enumerate(names) if reference[mode](name)]
+
+
+def test_incremental_filter_narrows_the_previous_mask(listing):
+    mask = browser.filter_mask(listing, "Substring", "a")
+    for text in ("da", "dat", "data_1", "data_1z"):
+        mask = browser.filter_mask(listing, "Substring", text, mask)
+        assert [i for i in range(len(listing)) if mask[i]] == expected(listing, "Substring", text)
+
+
+def test_dense_candidates_are_decoded_in_batches(listing, monkeypatch):
+    # Com muitos candidatos, os nomes não são descodificados um a um
+    mask = browser.filter_mask(listing, "Substring", "a")
+    monkeypatch.setattr(browser.TextColumn, "__getitem__", lambda self, index: pytest.fail("decoded one name"))
+    browser.filter_mask(listing, "Substring", "at", mask)
+
+
+def test_model_keeps_sort_order_while_filtering(qapp, listing):
+    model = browser.ListingModel()
+    model.set_listing(listing)
+    model.sort(1, browser.Qt.DescendingOrder)
+    for text in ("a", "at", "ata"):
+        model.set_filter("Substring", text)
+        rows = list(model.rows)
+        assert sorted(rows) == expected(listing, "Substring", text)
+        assert rows == sorted(rows, key=lambda i: -listing.sizes[i])
+    model.set_filter("Glob", "*.csv")
+    assert sorted(model.rows) == expected(listing, "Glob", "*.csv")
+    model.set_filter("Substring", "")
+    assert len(model.rows) == len(listing)
+
+
+def test_sealed_listing_already_has_the_lowercase_names(listing, monkeypatch):
+    # O índice em minúsculas é construído em seal(), fora da thread da interface, e não na primeira tecla
+    monkeypatch.setattr(browser.TextColumn, "extend", lambda self, texts: pytest.fail("names_lower rebuilt"))
+    assert list(listing.names_lower) == [name.lower() for name in listing.names]
+
+
+def test_filter_bar_applies_the_filter_once_typing_stops(qapp, listing, monkeypatch):
+    model = browser.ListingModel()
+    model.set_listing(listing)
+    calls = []
+    set_filter = model.set_filter
+    monkeypatch.setattr(model, "set_filter", lambda mode, text: (calls.append(text), set_filter(mode, text)))
+    bar = browser.FilterBar(model)
+    for text in ("d", "da", "dat", "data"):
+        bar.filter_input.setText(text)
+        qapp.processEvents()
+    assert calls == []
+    deadline = time.monotonic() + 5
+    while not calls and time.monotonic() < deadline:
+        qapp.processEvents()
+        time.sleep(0.01)
+    assert calls == ["data"]
+    assert sorted(model.rows) == expected(listing, "Substring", "data")
+    bar.clear()
+    assert calls == ["data", ""] and len(model.rows) == len(listing)
+
+
+@pytest.mark.parametrize("column_name", ["Name", "Type"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_sort_of_a_spilled_listing_matches_the_in_memory_sort(monkeypatch, column_name, descending):
+    # Blocos pequenos: a ordenação da listagem despejada junta vários blocos ordenados
+    column = browser.LISTING_COLUMNS.index(column_name)
+    monkeypatch.setattr(browser, "TEXT_COLUMN_BATCH", 100)
+    reference = make_listing(False)
+    monkeypatch.setattr(browser.DirectoryListing, "memory_limit", 4096)
+    spilled = make_listing(True)
+    assert list(spilled.sort_order(column, descending)) == list(reference.sort_order(column, descending))
+    ranks = spilled.sort_ranks(column, descending)
+    assert [ranks[i] for i in spilled.sort_order(column, descending)] == list(range(len(spilled)))
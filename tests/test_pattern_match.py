@@ -0,0 +1,54 @@
+import fnmatch
+import os
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("pyftpdlib")
+from pyftpdlib.handlers import FTPHandler  # noqa: E402
+
+import ftp_browserV5 as browser  # noqa: E402
+
+
+class GlobbingHandler(FTPHandler):
+    # Servidor que aplica o glob do NLST distinguindo maiúsculas de minúsculas, como a maioria dos servidores Unix
+    globs = []
+
+    def ftp_NLST(self, path):
+        directory, pattern = os.path.split(path)
+        if not any(char in pattern for char in "*?["):
+            return super().ftp_NLST(path)
+        self.globs.append(pattern)
+        names = [name for name in sorted(os.listdir(directory)) if fnmatch.fnmatchcase(name, pattern)]
+        if not names:
+            self.respond("550 No files found.")
+            return
+        self.push_dtp_data("".join(name + "\r\n" for name in names).encode(), isproducer=False, cmd="NLST")
+
+
+@pytest.fixture
+def ftp(ftp_server, tmp_path):
+    GlobbingHandler.globs = []
+    for name in ("report_2024.csv", "SUMMARY_2024.CSV", "notes.txt"):
+        (tmp_path / name).write_text(name)
+    (tmp_path / "old_2024").mkdir()
+    ftp = browser.open_ftp_session("127.0.0.1", "u", "p", ftp_server(str(tmp_path), GlobbingHandler))
+    yield ftp
+    ftp.quit()
+
+
+def test_case_sensitive_patterns_are_applied_by_the_server(ftp):
+    assert browser.nlst_matches(ftp, "/", "*.csv", case_sensitive=True) == ["/report_2024.csv"]
+    assert GlobbingHandler.globs == ["*.csv"]
+
+
+def test_case_insensitive_patterns_with_letters_are_not_sent_to_the_server(ftp):
+    # "*.csv" também corresponde a SUMMARY_2024.CSV, que o NLST do servidor deixaria de fora
+    assert browser.nlst_matches(ftp, "/", "*.csv", case_sensitive=False) is None
+    assert GlobbingHandler.globs == []
+
+
+def test_case_insensitive_patterns_without_letters_use_nlst_and_keep_only_files(ftp):
+    paths = browser.nlst_matches(ftp, "/", "*_2024*", case_sensitive=False)
+    assert paths == ["/SUMMARY_2024.CSV", "/report_2024.csv"]
+    assert GlobbingHandler.globs == ["*_2024*"]
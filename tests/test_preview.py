@@ -0,0 +1,80 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("pyftpdlib")
+from PyQt5.QtWidgets import QWidget  # noqa: E402
+
+import ftp_browserV5 as browser  # noqa: E402
+
+CONTENT = b"".join(b"line %06d\n" % i for i in range(20000))
+
+
+class FakeClient(QWidget):
+    # O mínimo de uma aba FTP usado pela pré-visualização; a conexão principal não pode ser usada
+    def __init__(self, port):
+        super().__init__()
+        self.port = port
+        self.server = ("127.0.0.1", port, "u")
+        self.main_window = SimpleNamespace(preview_cache=browser.PreviewCache())
+        self.session_threads = []
+
+    def remote_path(self, name):
+        return "/" + name
+
+    def open_session(self, priority=browser.PRIORITY_BULK):
+        self.session_threads.append(threading.current_thread())
+        return browser.open_ftp_session("127.0.0.1", "u", "p", self.port)
+
+
+@pytest.fixture
+def client(qapp, ftp_server, tmp_path):
+    (tmp_path / "log.txt").write_bytes(CONTENT)
+    return FakeClient(ftp_server(str(tmp_path)))
+
+
+def wait_until_loaded(qapp, dialog):
+    deadline = time.monotonic() + 10
+    while dialog.worker is not None and time.monotonic() < deadline:
+        qapp.processEvents()
+        time.sleep(0.01)
+    assert dialog.worker is None
+
+
+def test_preview_is_fetched_outside_the_gui_thread(qapp, client):
+    dialog = browser.PreviewDialog(client, "log.txt", len(CONTENT), 1.0)
+    dialog.load()
+    assert dialog.status_label.text() == "Loading..."
+    wait_until_loaded(qapp, dialog)
+    assert dialog.data == CONTENT[:browser.PREVIEW_BYTES]
+    assert client.session_threads and threading.main_thread() not in client.session_threads
+
+
+def test_end_of_a_file_without_a_listed_size_asks_the_server(qapp, client):
+    dialog = browser.PreviewDialog(client, "log.txt", 0, 1.0)
+    dialog.toggle_end()
+    wait_until_loaded(qapp, dialog)
+    assert dialog.size == len(CONTENT)
+    assert dialog.offset == len(CONTENT) - browser.PREVIEW_BYTES
+    assert dialog.data == CONTENT[-browser.PREVIEW_BYTES:]
+    # O trecho fica na cache: voltar a pedi-lo não abre outra sessão
+    sessions = len(client.session_threads)
+    dialog.toggle_end()
+    wait_until_loaded(qapp, dialog)
+    dialog.toggle_end()
+    assert dialog.worker is None
+    assert dialog.data == CONTENT[-browser.PREVIEW_BYTES:]
+    assert len(client.session_threads) == sessions + 1
+
+
+def test_a_result_arriving_after_the_dialog_closed_is_ignored(qapp, client):
+    dialog = browser.PreviewDialog(client, "log.txt", len(CONTENT), 1.0)
+    dialog.load()
+    worker = dialog.worker
+    dialog.reject()
+    worker.wait(10000)
+    qapp.processEvents()
+    assert dialog.data == b""
@@ -0,0 +1,102 @@
+import errno
+import os
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("pyftpdlib")
+from pyftpdlib.handlers import FTPHandler  # noqa: E402
+
+import ftp_browserV5 as browser  # noqa: E402
+
+
+class DroppingHandler(FTPHandler):
+    # Fecha a conexão de controlo (sem responder) no próximo comando em "drop", ou responde 421 aos comandos em
+    # "busy"; regista os comandos recebidos
+    drop = set()
+    busy = set()
+    commands = []
+
+    def pre_process_command(self, line, cmd, arg):
+        self.commands.append(cmd)
+        if cmd in self.drop:
+            self.drop.discard(cmd)
+            self.close()
+            return
+        if cmd in self.busy:
+            self.busy.discard(cmd)
+            self.respond("421 Service not available, closing control connection.")
+            self.close_when_done()
+            return
+        return super().pre_process_command(line, cmd, arg)
+
+
+@pytest.fixture
+def session(ftp_server, tmp_path):
+    DroppingHandler.drop = set()
+    DroppingHandler.busy = set()
+    DroppingHandler.commands = []
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.txt").write_bytes(b"x" * 1000)
+    ftp = browser.ReconnectingFTP(timeout=10)
+    ftp.connect("127.0.0.1", ftp_server(str(tmp_path), DroppingHandler))
+    ftp.login("u", "p")
+    ftp.cwd("sub")
+    yield ftp, tmp_path
+    ftp.close()
+
+
+def test_dropped_connection_is_reopened_in_the_same_directory(session):
+    ftp, root = session
+    DroppingHandler.drop = {"NLST"}
+    assert ftp.call(ftp.nlst) == ["a.txt"]
+    assert ftp.reconnect_count == 1
+    assert ftp.pwd() == "/sub"
+    assert DroppingHandler.commands.count("NLST") == 2
+
+
+def test_non_idempotent_command_is_not_repeated_after_a_drop(session):
+    ftp, root = session
+    DroppingHandler.drop = {"MKD"}
+    with pytest.raises(EOFError):
+        ftp.call(ftp.mkd, "new", idempotent=False)
+    assert ftp.reconnect_count == 1
+    assert DroppingHandler.commands.count("MKD") == 1
+    assert ftp.pwd() == "/sub"
+
+
+def test_command_refused_with_421_is_repeated_even_if_not_idempotent(session):
+    ftp, root = session
+    DroppingHandler.busy = {"MKD"}
+    ftp.call(ftp.mkd, "new", idempotent=False)
+    assert ftp.reconnect_count == 1
+    assert (root / "sub" / "new").is_dir()
+
+
+def test_local_file_errors_do_not_reconnect(session):
+    ftp, root = session
+
+    def write(data):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+    with pytest.raises(OSError) as raised:
+        ftp.call(ftp.retrbinary, "RETR a.txt", write)
+    assert raised.value.errno == errno.ENOSPC
+    assert ftp.reconnect_count == 0
+    assert DroppingHandler.commands.count("RETR") == 1
+
+
+@pytest.mark.parametrize("error, lost", [
+    (EOFError(), True),
+    (ConnectionResetError(errno.ECONNRESET, "reset"), True),
+    (BrokenPipeError(errno.EPIPE, "broken pipe"), True),
+    (browser.socket.timeout("timed out"), True),
+    (OSError(errno.ENETUNREACH, "unreachable"), True),
+    (browser.error_temp("421 Timeout"), True),
+    (browser.error_temp("425 Can't open data connection"), False),
+    (OSError(errno.ENOSPC, "no space"), False),
+    (PermissionError(errno.EACCES, "denied"), False),
+    (FileNotFoundError(errno.ENOENT, "missing"), False),
+])
+def test_only_socket_errors_count_as_connection_loss(error, lost):
+    assert browser.is_connection_lost(error) is lost
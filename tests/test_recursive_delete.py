@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("pyftpdlib")
+from pyftpdlib.handlers import FTPHandler  # noqa: E402
+
+import ftp_browserV5 as browser  # noqa: E402
+
+
+class RecordingHandler(FTPHandler):
+    # Regista por ordem as exclusões recebidas (DELE e RMD) e chama on_delete a cada DELE
+    deletions = []
+    on_delete = None
+
+    def ftp_DELE(self, path):
+        self.deletions.append(("DELE", self.fs.fs2ftp(path)))
+        if self.on_delete:
+            self.on_delete()
+        return super().ftp_DELE(path)
+
+    def ftp_RMD(self, path):
+        self.deletions.append(("RMD", self.fs.fs2ftp(path)))
+        return super().ftp_RMD(path)
+
+
+@pytest.fixture
+def tree(ftp_server, tmp_path):
+    RecordingHandler.deletions = []
+    RecordingHandler.on_delete = None
+    for directory in ("top/a/deep", "top/b"):
+        (tmp_path / directory).mkdir(parents=True)
+    (tmp_path / "top" / "a" / "one.bin").write_bytes(b"1" * 100)
+    (tmp_path / "top" / "a" / "deep" / "two.bin").write_bytes(b"2" * 20)
+    (tmp_path / "top" / "b" / "three.bin").write_bytes(b"3" * 3)
+    (tmp_path / "loose.txt").write_bytes(b"4" * 4)
+    port = ftp_server(str(tmp_path), RecordingHandler)
+    return (lambda cancelled=None: browser.scheduler.open_session("127.0.0.1", "u", "p", port, "delete",
+                                                                  cancelled=cancelled)), tmp_path
+
+
+def run_worker(qapp, worker):
+    results = []
+    worker.planned.connect(lambda *counts: results.append(counts))
+    worker.completed.connect(lambda deleted, errors: results.append((deleted, errors)))
+    worker.failed.connect(results.append)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    thread.join(20)
+    assert not thread.is_alive(), "the recursive delete hung"
+    qapp.processEvents()
+    return results
+
+
+def test_counting_pass_deletes_nothing(qapp, tree):
+    open_session, root = tree
+    worker = browser.RecursiveDeleteWorker(open_session, [("/top", True), ("/loose.txt", False)])
+    assert run_worker(qapp, worker) == [(4, 4, 123)]
+    files, directories, size = worker.plan
+    assert sorted(files) == ["/loose.txt", "/top/a/deep/two.bin", "/top/a/one.bin", "/top/b/three.bin"]
+    assert directories[0] == "/top/a/deep" and directories[-1] == "/top"
+    assert RecordingHandler.deletions == []
+    assert (root / "top" / "a" / "deep" / "two.bin").exists()
+
+
+def test_files_are_deleted_before_their_directories(qapp, tree):
+    open_session, root = tree
+    entries = [("/top", True), ("/loose.txt", False)]
+    counter = browser.RecursiveDeleteWorker(open_session, entries)
+    run_worker(qapp, counter)
+    worker = browser.RecursiveDeleteWorker(open_session, entries, counter.plan)
+    assert run_worker(qapp, worker) == [(8, [])]
+    assert not (root / "top").exists() and not (root / "loose.txt").exists()
+    order = {path: index for index, (command, path) in enumerate(RecordingHandler.deletions)}
+    assert len(order) == 8
+    for path, index in order.items():
+        parent = path.rsplit("/", 1)[0]
+        if parent:
+            assert order[parent] > index, f"{parent} was removed before {path}"
+
+
+def test_abort_stops_after_the_batches_in_flight(qapp, tree, monkeypatch):
+    open_session, root = tree
+    monkeypatch.setattr(browser, "DELETE_BATCH_SIZE", 2)
+    for i in range(40):
+        (root / "top" / "b" / f"extra{i:02}.bin").write_bytes(b"5")
+    entries = [("/top", True)]
+    counter = browser.RecursiveDeleteWorker(open_session, entries)
+    run_worker(qapp, counter)
+    worker = browser.RecursiveDeleteWorker(open_session, entries, counter.plan)
+    RecordingHandler.on_delete = worker.cancel
+    [(deleted, errors)] = run_worker(qapp, worker)
+    assert worker.cancelled.is_set() and errors == []
+    # Cada conexão termina só o lote que já tinha enviado; os diretórios não são tocados
+    assert 0 < deleted <= 2 * browser.DIRECTORY_WALK_WORKERS
+    assert [command for command, _ in RecordingHandler.deletions] == ["DELE"] * deleted
+    assert sum(path.is_file() for path in (root / "top").rglob("*")) == len(counter.plan[0]) - deleted
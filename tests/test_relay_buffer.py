@@ -0,0 +1,75 @@
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("PyQt5")
+import ftp_browserV5 as browser  # noqa: E402
+
+
+def test_data_wraps_around_the_end_of_the_buffer():
+    # Um buffer pequeno e blocos de tamanhos que não o dividem obrigam a dar a volta muitas vezes
+    buffer = browser.RelayBuffer(capacity=10)
+    data = os.urandom(5000)
+
+    def write():
+        for start in range(0, len(data), 7):
+            buffer.write(data[start:start + 7])
+        buffer.close()
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    received = []
+    for block in iter(lambda: buffer.read(3), b""):
+        assert len(block) <= 3
+        received.append(block)
+    writer.join(5)
+    assert b"".join(received) == data
+    assert buffer.length == 0
+
+
+def test_abort_releases_a_writer_waiting_for_space():
+    buffer = browser.RelayBuffer(capacity=4)
+    errors = []
+
+    def write():
+        try:
+            buffer.write(b"0123456789")
+        except ConnectionResetError as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    buffer.wait_ready()
+    buffer.abort(ConnectionResetError("upload failed"))
+    writer.join(5)
+    assert not writer.is_alive()
+    assert [str(e) for e in errors] == ["upload failed"]
+
+
+def test_abort_releases_a_reader_waiting_for_data():
+    buffer = browser.RelayBuffer(capacity=4)
+    errors = []
+
+    def read():
+        try:
+            buffer.read()
+        except ConnectionResetError as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    reader.join(0.1)
+    buffer.abort(ConnectionResetError("download failed"))
+    reader.join(5)
+    assert not reader.is_alive()
+    assert len(errors) == 1
+    with pytest.raises(ConnectionResetError):
+        buffer.wait_ready()
+
+
+def test_an_empty_download_ends_the_upload():
+    buffer = browser.RelayBuffer(capacity=4)
+    buffer.close()
+    buffer.wait_ready()
+    assert buffer.read() == b""
@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+import ftp_browserV5 as browser  # noqa: E402
+
+
+def directories(*names):
+    listing = browser.DirectoryListing()
+    for name in names:
+        listing.append(name, True, 0, 0.0)
+    listing.append("file.txt", False, 1, 0.0)
+    listing.seal()
+    return listing
+
+
+@pytest.fixture
+def model(qapp):
+    # Sem servidor nem vista: os nós só são preenchidos pelo teste
+    return browser.RemoteTreeModel(fs=None)
+
+
+def child_names(node):
+    assert [child.position for child in node.children] == list(range(len(node.children)))
+    return [child.name for child in node.children]
+
+
+def test_set_children_applies_the_difference_in_contiguous_ranges(model):
+    root = model.root
+    model.set_children(root, directories(*(f"d{i}" for i in range(10))))
+    # Um subdiretório já expandido tem de sobreviver às alterações dos irmãos
+    kept = root.children[7]
+    model.set_children(kept, directories("inner"))
+    inserted, removed = [], []
+    # Cada linha inserida já é encontrada pelo modelo quando a vista é avisada
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append(
+        (first, last, [model.index(row, 0, parent).internalPointer().name for row in range(first, last + 1)])))
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+
+    names = ["d0", "d1", "d1a", "d1b", "d5", "d6", "d7", "d7a", "d9", "d10", "d11"]
+    model.set_children(root, directories(*names))
+    assert child_names(root) == names
+    assert root.children[6] is kept and child_names(kept) == ["inner"]
+    assert removed == [(8, 8), (2, 4)]
+    assert inserted == [(2, 3, ["d1a", "d1b"]), (7, 7, ["d7a"]), (9, 10, ["d10", "d11"])]
+    assert model.parent(model.index(0, 0, model.index_for(kept))) == model.index_for(kept)
@@ -0,0 +1,157 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("PyQt5")
+import ftp_browserV5 as browser  # noqa: E402
+
+HOST = "ftp.example.com"
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    # Escalonador novo (4 por host, 12 ao todo) e sessões falsas, sem rede
+    scheduler = browser.ConnectionScheduler(max_total=12, max_per_host=4)
+    monkeypatch.setattr(browser, "scheduler", scheduler)
+    monkeypatch.setattr(browser, "open_ftp_session", lambda *args, **kwargs: SimpleNamespace(scheduler_slot=None))
+    return scheduler
+
+
+def open_tabs(scheduler, count):
+    # Sessões principais das abas, contadas sem esperar pela vez
+    for tab in range(count):
+        scheduler.acquire(HOST, ("tab", tab), browser.PRIORITY_INTERACTIVE, force=True)
+
+
+def test_bulk_leaves_a_slot_for_browsing_after_the_first_connection(scheduler):
+    open_tabs(scheduler, 2)
+    first = scheduler.open_session(HOST, "u", "p", 21, "copy")
+    assert first is not None
+    assert scheduler.per_host[HOST] == 3
+    assert scheduler.open_session(HOST, "u", "p", 21, "other", wait=False) is None
+
+
+def test_same_host_pair_shares_one_reservation(scheduler):
+    # Duas abas no mesmo host: a cópia entre elas precisa de origem e destino ao mesmo tempo
+    open_tabs(scheduler, 2)
+    source = scheduler.open_session(HOST, "u", "p", 21, "copy")
+    target = scheduler.open_session(HOST, "u", "p", 21, "copy", wait=False, paired_with=source)
+    assert target is not None
+    assert scheduler.per_host[HOST] == 4
+    browser.scheduler.release_session(target)
+    browser.scheduler.release_session(source)
+    assert scheduler.per_host[HOST] == 2
+    assert not scheduler.bulk_per_host
+
+
+def test_pair_on_another_host_still_waits_for_its_turn(scheduler):
+    scheduler.set_limits(12, 1)
+    open_tabs(scheduler, 1)
+    source = scheduler.open_session("other.example.com", "u", "p", 21, "copy")
+    assert scheduler.open_session(HOST, "u", "p", 21, "copy", wait=False, paired_with=source) is None
+
+
+def test_waiting_for_a_slot_can_be_cancelled(scheduler):
+    scheduler.set_limits(12, 1)
+    open_tabs(scheduler, 1)
+    cancelled = threading.Event()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(
+        scheduler.open_session(HOST, "u", "p", 21, "copy", cancelled=cancelled)))
+    thread.start()
+    time.sleep(0.1)
+    assert thread.is_alive()
+    cancelled.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert result == [None]
+    assert not scheduler.waiting
+    assert scheduler.per_host[HOST] == 1
+
+
+def test_directory_walk_finishes_when_only_one_session_fits(scheduler):
+    # Com duas abas abertas só cabe uma sessão em massa: as outras threads da listagem desistem no fim
+    open_tabs(scheduler, 2)
+    tree = {"/": ["a", "b"], "/a": ["c"], "/b": [], "/a/c": []}
+
+    def list_directory(function, ftp, path):
+        listing = browser.DirectoryListing()
+        for name in tree[path]:
+            listing.append(name, True, 0, 0.0)
+        return listing
+
+    def open_session(cancelled=None):
+        ftp = scheduler.open_session(HOST, "u", "p", 21, "walk", cancelled=cancelled)
+        if ftp is not None:
+            ftp.call = list_directory
+            ftp.quit = lambda: None
+        return ftp
+
+    started = time.monotonic()
+    listings, errors = browser.walk_remote_tree(open_session, ["/"], threading.Event(), workers=4)
+    assert sorted(listings) == sorted(tree)
+    assert not errors
+    assert time.monotonic() - started < 5
+    assert scheduler.per_host[HOST] == 2
+    assert not scheduler.waiting
+
+
+def test_copy_between_two_tabs_on_the_same_host_finishes(qapp, ftp_server, tmp_path, monkeypatch):
+    # Duas abas no mesmo servidor ocupam duas das quatro vagas; a cópia entre elas não pode ficar à espera
+    pytest.importorskip("pyftpdlib")
+    scheduler = browser.ConnectionScheduler(max_total=12, max_per_host=4)
+    monkeypatch.setattr(browser, "scheduler", scheduler)
+    (tmp_path / "src" / "tree").mkdir(parents=True)
+    (tmp_path / "src" / "tree" / "a.txt").write_bytes(b"a" * 1000)
+    (tmp_path / "src" / "b.txt").write_bytes(b"b" * 10)
+    (tmp_path / "src" / "dst").mkdir()
+    port = ftp_server(str(tmp_path / "src"))
+    open_tabs(scheduler, 2)
+
+    def open_session(cancelled=None, paired_with=None):
+        return scheduler.open_session(HOST, "u", "p", port, "copy", cancelled=cancelled, paired_with=paired_with)
+
+    open_ftp_session = browser.open_ftp_session
+    monkeypatch.setattr(browser, "open_ftp_session", lambda host, *args, **kwargs: open_ftp_session(
+        "127.0.0.1", *args, **kwargs))
+    results = []
+    worker = browser.ServerToServerWorker(open_session, open_session, [("/tree", True), ("/b.txt", False)], "/dst")
+    worker.completed.connect(lambda copied, relayed, errors: results.append((copied, errors)))
+    worker.failed.connect(results.append)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    thread.join(20)
+    assert not thread.is_alive()
+    qapp.processEvents()
+    assert results == [(2, [])]
+    assert (tmp_path / "src" / "dst" / "tree" / "a.txt").read_bytes() == b"a" * 1000
+    assert scheduler.per_host[HOST] == 2
+
+
+def test_prefetch_does_not_wait_for_a_slot(scheduler, monkeypatch):
+    # Com as vagas ocupadas, o pré-carregamento desiste em vez de pôr um pedido em espera (que faria as sessões
+    # da fila de transferências cederem a vaga)
+    open_tabs(scheduler, 4)
+    cache = browser.ListingCache()
+    waited = []
+    acquire = scheduler.acquire
+
+    def recording_acquire(*args, **kwargs):
+        granted = acquire(*args, **kwargs)
+        waited.append(bool(scheduler.waiting))
+        return granted
+
+    monkeypatch.setattr(scheduler, "acquire", recording_acquire)
+    prefetcher = browser.ListingPrefetcher(
+        lambda wait=True: scheduler.open_session(HOST, "u", "p", 21, "tab", wait=wait), (HOST, 21, "u"), cache)
+    prefetcher.schedule(["/a", "/b"])
+    deadline = time.monotonic() + 5
+    while not waited and time.monotonic() < deadline:
+        time.sleep(0.02)
+    time.sleep(0.1)
+    assert not prefetcher.pending
+    assert waited == [False]
+    assert not scheduler.waiting
+    assert scheduler.per_host[HOST] == 4
@@ -0,0 +1,103 @@
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("pyftpdlib")
+from pyftpdlib.handlers import FTPHandler  # noqa: E402
+
+import ftp_browserV5 as browser  # noqa: E402
+
+
+# Certificado autoassinado de tests/test_ftps.py
+CERTIFICATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ftps_localhost.pem")
+
+
+class NoPortHandler(FTPHandler):
+    # Servidor que não aceita ligações de dados ativas, como os que desativam o FXP
+    def ftp_PORT(self, line):
+        self.respond("500 PORT is disabled.")
+
+
+class LockedHandler(FTPHandler):
+    # Servidor que indica o tamanho de a.txt mas recusa enviá-lo
+    def ftp_RETR(self, file):
+        if file.endswith("a.txt"):
+            self.respond("550 File is locked.")
+            return
+        return super().ftp_RETR(file)
+
+
+@pytest.fixture
+def servers(ftp_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(browser, "scheduler", browser.ConnectionScheduler())
+    (tmp_path / "source").mkdir()
+    (tmp_path / "target").mkdir()
+    (tmp_path / "source" / "a.txt").write_bytes(b"a" * 5000)
+    (tmp_path / "source" / "b.txt").write_bytes(b"b" * 10)
+
+    def start(target_handler=None, source_handler=None, tls=None):
+        def opener(port):
+            return lambda cancelled=None, paired_with=None: browser.scheduler.open_session(
+                "127.0.0.1", "u", "p", port, "copy", tls=tls, cancelled=cancelled, paired_with=paired_with)
+        target_port = ftp_server(str(tmp_path / "target"), target_handler)
+        return opener(ftp_server(str(tmp_path / "source"), source_handler)), opener(target_port)
+    return start, tmp_path / "target"
+
+
+def copy(qapp, open_source, open_target, entries):
+    worker = browser.ServerToServerWorker(open_source, open_target, entries, "/")
+    results = []
+    worker.completed.connect(lambda copied, relayed, errors: results.append((copied, relayed, errors)))
+    worker.failed.connect(results.append)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    thread.join(20)
+    assert not thread.is_alive()
+    qapp.processEvents()
+    return worker, results
+
+
+def test_a_missing_file_is_an_error_and_not_a_refused_fxp(qapp, servers):
+    start, target = servers
+    worker, [(copied, relayed, errors)] = copy(qapp, *start(), [("/a.txt", False), ("/missing.txt", False),
+                                                                ("/b.txt", False)])
+    assert (copied, relayed) == (2, 0)
+    assert [path for path, _ in errors] == ["/missing.txt"]
+    assert not worker.fxp_refused
+    assert (target / "a.txt").read_bytes() == b"a" * 5000
+    assert (target / "b.txt").read_bytes() == b"b" * 10
+    assert not (target / "missing.txt").exists()
+
+
+def test_a_file_the_source_refuses_to_send_is_not_left_empty_on_the_target(qapp, servers):
+    start, target = servers
+    worker, [(copied, relayed, errors)] = copy(qapp, *start(source_handler=LockedHandler),
+                                               [("/a.txt", False), ("/b.txt", False)])
+    assert (copied, relayed) == (1, 0)
+    assert [path for path, _ in errors] == ["/a.txt"]
+    assert not worker.fxp_refused
+    assert not (target / "a.txt").exists()
+    assert (target / "b.txt").read_bytes() == b"b" * 10
+
+
+def test_a_rejected_port_falls_back_to_relaying(qapp, servers):
+    start, target = servers
+    worker, [(copied, relayed, errors)] = copy(qapp, *start(NoPortHandler), [("/a.txt", False), ("/b.txt", False)])
+    assert (copied, relayed, errors) == (2, 2, [])
+    assert worker.fxp_refused
+    assert (target / "a.txt").read_bytes() == b"a" * 5000
+
+
+def test_copy_between_ftps_servers_is_relayed(qapp, servers, monkeypatch):
+    # Com PROT P nos dois lados não há FXP possível: a cópia passa pelo cliente em vez de esperar pelo timeout
+    pytest.importorskip("OpenSSL")
+    from pyftpdlib.handlers import TLS_FTPHandler
+    handler = type("TLSHandler", (TLS_FTPHandler,), {"certfile": CERTIFICATE})
+    monkeypatch.setattr(browser.ReconnectingFTPS, "unverified_hosts", {"127.0.0.1"})
+    start, target = servers
+    worker, [(copied, relayed, errors)] = copy(qapp, *start(handler, handler, tls="P"),
+                                               [("/a.txt", False), ("/b.txt", False)])
+    assert (copied, relayed, errors) == (2, 2, [])
+    assert (target / "a.txt").read_bytes() == b"a" * 5000
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("pyftpdlib")
+from pyftpdlib.handlers import FTPHandler  # noqa: E402
+
+import ftp_browserV5 as browser  # noqa: E402
+
+
+class CountingHandler(FTPHandler):
+    # Regista as tentativas de autenticação e os NOOP recebidos pelo servidor
+    logins = []
+    noops = 0
+
+    def ftp_PASS(self, line):
+        self.logins.append((self.username, line))
+        return super().ftp_PASS(line)
+
+    def ftp_NOOP(self, line):
+        CountingHandler.noops += 1
+        return super().ftp_NOOP(line)
+
+
+@pytest.fixture
+def warmer(qapp, ftp_server, tmp_path, monkeypatch):
+    CountingHandler.logins = []
+    CountingHandler.noops = 0
+    monkeypatch.setattr(browser, "scheduler", browser.ConnectionScheduler())
+    port = ftp_server(str(tmp_path), CountingHandler)
+    credentials = {}
+    warmer = browser.SessionWarmer(browser.ConnectionHistoryStore(str(tmp_path / "history.sqlite3")), credentials)
+    monkeypatch.setattr(warmer, "is_enabled", lambda: True)
+    yield warmer, port, credentials
+    warmer.close_all()
+
+
+def wait_for(warmer, key):
+    deadline = time.monotonic() + 10
+    while key in warmer.pending and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+
+def test_accounts_without_a_known_password_are_only_resolved(warmer, monkeypatch):
+    warmer, port, credentials = warmer
+    resolved = []
+    getaddrinfo = browser.socket.getaddrinfo
+    monkeypatch.setattr(browser.socket, "getaddrinfo", lambda host, *args, **kwargs: (
+        resolved.append(host), getaddrinfo(host, *args, **kwargs))[1])
+    warmer.warm("127.0.0.1", "u", port)
+    deadline = time.monotonic() + 10
+    while not resolved and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert resolved == ["127.0.0.1"]
+    assert not warmer.sessions and not warmer.pending
+    assert CountingHandler.logins == []
+
+
+def test_accounts_open_in_a_tab_are_warmed_with_their_password(warmer):
+    warmer, port, credentials = warmer
+    credentials[("127.0.0.1", port, "u")] = "p"
+    warmer.warm("127.0.0.1", "u", port)
+    wait_for(warmer, ("127.0.0.1", "u", port))
+    assert CountingHandler.logins == [("u", "p")]
+    assert warmer.take("127.0.0.1", "u", port, passwd="other") is None
+    warmer.warm("127.0.0.1", "u", port)
+    wait_for(warmer, ("127.0.0.1", "u", port))
+    entry = warmer.take("127.0.0.1", "u", port, passwd="p")
+    assert entry is not None
+    browser.close_session(entry[0])
+
+
+def test_a_taken_session_becomes_interactive_without_a_probe(warmer):
+    warmer, port, credentials = warmer
+    credentials[("127.0.0.1", port, "u")] = "p"
+    warmer.warm("127.0.0.1", "u", port)
+    wait_for(warmer, ("127.0.0.1", "u", port))
+    assert browser.scheduler.bulk_per_host == {"127.0.0.1": 1}
+    entry = warmer.take("127.0.0.1", "u", port, passwd="p")
+    # A validação fica para o primeiro comando da aba, fora da thread da interface
+    assert CountingHandler.noops == 0
+    assert entry[0].scheduler_slot == ("127.0.0.1", browser.PRIORITY_INTERACTIVE)
+    assert browser.scheduler.bulk_per_host == {}
+    assert browser.scheduler.per_host == {"127.0.0.1": 1}
+    browser.close_session(entry[0])
+    assert browser.scheduler.per_host == {}
@@ -0,0 +1,38 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ftp_browserV5.py")
+
+
+def test_benchmark_startup_reports_first_paint_within_budget(tmp_path):
+    # Arranque real num processo novo (imports a frio incluídos), sem ecrã
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", XDG_CONFIG_HOME=str(tmp_path / "config"),
+               XDG_CACHE_HOME=str(tmp_path / "cache"))
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, SCRIPT, "--benchmark-startup"], cwd=str(tmp_path), env=env,
+                            capture_output=True, text=True, timeout=60)
+    wall_ms = (time.perf_counter() - started) * 1000
+    assert result.returncode == 0, result.stdout + result.stderr
+    timings = re.search(r"first paint: (\d+) ms; local directory listed: (\d+) ms", result.stdout)
+    assert timings, result.stdout
+    first_paint, local_listing = map(int, timings.groups())
+    assert 0 < first_paint <= wall_ms
+    assert local_listing <= wall_ms
+
+
+def test_benchmark_startup_measures_from_the_process_launch(tmp_path):
+    # O processo medido conta o tempo desde o instante indicado por quem o lançou (aqui, dois segundos antes)
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", XDG_CONFIG_HOME=str(tmp_path / "config"),
+               XDG_CACHE_HOME=str(tmp_path / "cache"), FTP_BROWSER_STARTUP_ORIGIN=repr(time.perf_counter() - 2))
+    result = subprocess.run([sys.executable, SCRIPT, "--benchmark-startup=1000"], cwd=str(tmp_path), env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 1, result.stdout + result.stderr
+    first_paint = int(re.search(r"first paint: (\d+) ms", result.stdout).group(1))
+    assert first_paint >= 2000
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+pytest.importorskip("PyQt5")
+import ftp_browserV5 as browser  # noqa: E402
+
+
+def job(job_id, remote):
+    return {"id": job_id, "direction": "download", "host": "example.com", "port": 21, "user": "u", "tls": None,
+            "transfer_mode": None, "remote": remote, "local": "/tmp/" + job_id, "size": None, "modified": None,
+            "offset": 0}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = browser.TransferJournal(str(tmp_path / "state" / "transfers.jsonl"))
+    journal.append(dict(job("a", "/a.bin"), op="queued"))
+    journal.append(dict(job("b", "/b.bin"), op="queued"))
+    journal.append(dict(job("c", "/c.bin"), op="queued"), durable=True)
+    journal.append({"op": "progress", "id": "a", "size": 1000, "modified": "20260101000000", "offset": 400})
+    journal.append({"op": "finished", "id": "b", "state": "completed"}, durable=True)
+    journal.append({"op": "progress", "id": "a", "size": 1000, "modified": "20260101000000", "offset": 700})
+    return journal
+
+
+def test_replay_keeps_unfinished_jobs_with_their_last_position(journal):
+    jobs = journal.replay()
+    assert list(jobs) == ["a", "c"]
+    assert jobs["a"]["offset"] == 700
+    assert jobs["a"]["size"] == 1000
+    assert jobs["c"] == job("c", "/c.bin")
+
+
+def test_replay_ignores_a_truncated_last_line(journal):
+    # Uma saída abrupta a meio de uma escrita deixa a última linha cortada
+    record = json.dumps({"op": "progress", "id": "c", "size": 50, "modified": None, "offset": 30})
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write(record[:len(record) // 2])
+    jobs = journal.replay()
+    assert list(jobs) == ["a", "c"]
+    assert jobs["c"]["offset"] == 0
+
+
+def test_replay_of_a_missing_journal_is_empty(tmp_path):
+    assert browser.TransferJournal(str(tmp_path / "none.jsonl")).replay() == {}
+
+
+def test_compaction_keeps_one_record_per_unfinished_job(journal):
+    before = journal.replay()
+    size = journal.size()
+    journal.compact(list(before.values()))
+    with open(journal.path, encoding="utf-8") as f:
+        lines = f.readlines()
+    assert len(lines) == 2
+    assert journal.size() < size
+    assert journal.replay() == before
+    # O diário continua a receber registos depois de ser substituído
+    journal.append({"op": "finished", "id": "a", "state": "completed"}, durable=True)
+    assert list(journal.replay()) == ["c"]
+
+
+def test_restore_pauses_interrupted_jobs_and_compacts_the_journal(qapp, journal):
+    queue = browser.TransferQueue(journal, workers=0)
+    queue.restore()
+    assert [(job_id, job["state"], job["offset"]) for job_id, job in queue.jobs.items()] == [
+        ("a", "paused", 700), ("c", "paused", 0)]
@@ -0,0 +1,241 @@
+import contextlib
+import hashlib
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("pyftpdlib")
+from pyftpdlib.handlers import FTPHandler  # noqa: E402
+
+import ftp_browserV5 as browser  # noqa: E402
+
+MB = 1024 * 1024
+
+
+class HashHandler(FTPHandler):
+    # Servidor com resumos por intervalo (HASH + RANG), como os anunciados pelo draft-bryan-ftp-hash
+    proto_cmds = dict(FTPHandler.proto_cmds)
+    proto_cmds["HASH"] = dict(perm="r", auth=True, arg=True, help="Syntax: HASH <SP> file-name")
+    proto_cmds["RANG"] = dict(perm=None, auth=True, arg=True, help="Syntax: RANG <SP> start <SP> end")
+    features = ["HASH SHA-256*", "RANG STREAM"]
+    rang = None
+
+    def ftp_FEAT(self, line):
+        lines = ["EPSV", "PASV", "REST STREAM", "SIZE", "MDTM"] + self.features
+        self.push("211-Features supported:\r\n" + "".join(f" {line}\r\n" for line in lines) + "211 End FEAT.\r\n")
+
+    def ftp_RANG(self, line):
+        self.rang = tuple(map(int, line.split()))
+        self.respond(f"350 Restarting at {self.rang[0]}. Ending at {self.rang[1]}.")
+
+    def ftp_HASH(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        start, end = self.rang or (0, len(data) - 1)
+        self.rang = None
+        self.respond(f"213 SHA-256 {start}-{end} {hashlib.sha256(data[start:end + 1]).hexdigest()} {path}")
+
+
+class WholeHashHandler(HashHandler):
+    # Servidor que só calcula o resumo do arquivo inteiro (sem RANG)
+    proto_cmds = {name: value for name, value in HashHandler.proto_cmds.items() if name != "RANG"}
+    features = ["HASH SHA-256*"]
+
+
+class PlainHandler(FTPHandler):
+    pass
+
+
+class LoggingHandler(FTPHandler):
+    # Regista os comandos de transferência recebidos pelo servidor
+    commands = []
+
+    def pre_process_command(self, line, cmd, arg):
+        if cmd in ("REST", "STOR", "APPE"):
+            self.commands.append(cmd)
+        return super().pre_process_command(line, cmd, arg)
+
+
+# As threads de uma fila nunca terminam: as filas dos testes ficam vivas até ao fim, para não emitirem sinais
+# de um objeto já destruído
+QUEUES = []
+
+
+@pytest.fixture
+def queue(qapp, tmp_path):
+    queue = browser.TransferQueue(browser.TransferJournal(str(tmp_path / "journal.jsonl")), download_cache=None)
+    QUEUES.append(queue)
+    return queue
+
+
+def client(port):
+    return SimpleNamespace(server=("127.0.0.1", port, "u"), ftp_host="127.0.0.1", ftp_port=port, ftp_user="u",
+                           ftp_passwd="p", tls=None, transfer_mode=None)
+
+
+def run_job(queue, port, direction, remote, local):
+    job_id = queue.enqueue(client(port), direction, [(remote, local)])[0]
+    deadline = time.monotonic() + 30
+    while queue.jobs[job_id]["state"] in ("queued", "active") and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return queue.jobs[job_id]
+
+
+def count_received(monkeypatch):
+    # Conta os bytes recebidos pelas conexões de dados (downloads e leituras parciais)
+    received = [0]
+    retrbinary = browser.ReconnectingFTP.retrbinary
+    fetch_remote_range = browser.fetch_remote_range
+
+    def counting_retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        def counting_callback(data):
+            received[0] += len(data)
+            callback(data)
+        return retrbinary(self, cmd, counting_callback, blocksize, rest)
+
+    def counting_fetch(ftp, path, offset, length):
+        data = fetch_remote_range(ftp, path, offset, length)
+        received[0] += len(data)
+        return data
+
+    monkeypatch.setattr(browser.ReconnectingFTP, "retrbinary", counting_retrbinary)
+    monkeypatch.setattr(browser, "fetch_remote_range", counting_fetch)
+    return received
+
+
+def modify_and_grow(path, offset, appended):
+    # Altera bytes a meio do arquivo e acrescenta outros no fim, com uma data de modificação nova
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(b"0123456789")
+        f.seek(0, os.SEEK_END)
+        f.write(appended)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+
+@pytest.mark.parametrize("handler", [HashHandler, WholeHashHandler, PlainHandler])
+def test_delta_update_never_keeps_a_stale_prefix(queue, ftp_server, tmp_path, handler):
+    root = tmp_path / "server"
+    root.mkdir()
+    remote = root / "data.bin"
+    remote.write_bytes(os.urandom(6 * MB))
+    port = ftp_server(str(root), handler)
+    local = str(tmp_path / "data.bin")
+    assert run_job(queue, port, "download", "/data.bin", local)["state"] == "completed"
+
+    modify_and_grow(remote, 3 * MB + 7, os.urandom(MB))
+    job = run_job(queue, port, "download", "/data.bin", local)
+    assert job["state"] == "completed", job["error"]
+    assert open(local, "rb").read() == remote.read_bytes()
+
+
+def test_delta_update_fetches_only_changed_blocks(queue, ftp_server, tmp_path, monkeypatch):
+    root = tmp_path / "server"
+    root.mkdir()
+    remote = root / "data.bin"
+    remote.write_bytes(os.urandom(12 * MB))
+    port = ftp_server(str(root), HashHandler)
+    local = str(tmp_path / "data.bin")
+    assert run_job(queue, port, "download", "/data.bin", local)["state"] == "completed"
+
+    received = count_received(monkeypatch)
+    modify_and_grow(remote, 5 * MB, os.urandom(MB))
+    assert run_job(queue, port, "download", "/data.bin", local)["state"] == "completed"
+    assert open(local, "rb").read() == remote.read_bytes()
+    # Um bloco alterado mais o acrescento, em vez dos 13 MB do arquivo
+    assert received[0] == browser.DELTA_BLOCK_SIZE + MB
+
+
+def test_delta_update_without_hashes_downloads_everything(queue, ftp_server, tmp_path, monkeypatch):
+    root = tmp_path / "server"
+    root.mkdir()
+    remote = root / "data.bin"
+    remote.write_bytes(os.urandom(4 * MB))
+    port = ftp_server(str(root), PlainHandler)
+    local = str(tmp_path / "data.bin")
+    assert run_job(queue, port, "download", "/data.bin", local)["state"] == "completed"
+
+    received = count_received(monkeypatch)
+    with open(remote, "ab") as f:
+        f.write(os.urandom(MB))
+    assert run_job(queue, port, "download", "/data.bin", local)["state"] == "completed"
+    assert received[0] == 5 * MB
+
+
+def interrupt_uploads(monkeypatch, failures, after):
+    # As primeiras `failures` conexões de dados de envio caem depois de `after` bytes, com a conexão de controlo
+    plan = {"failures": failures}
+    open_stream = browser.FTPFS.open
+
+    @contextlib.contextmanager
+    def flaky_open(self, path, mode="rb", offset=0):
+        with open_stream(self, path, mode, offset) as stream:
+            if mode == "rb" or not plan["failures"]:
+                yield stream
+                return
+            plan["failures"] -= 1
+            sent = [0]
+            fs = self
+
+            class Interrupted:
+                def write(self, block):
+                    if sent[0] + len(block) > after:
+                        stream.write(block[:after - sent[0]])
+                        stream.flush()
+                        fs.ftp.sock.close()
+                        raise ConnectionResetError("connection reset")
+                    sent[0] += len(block)
+                    stream.write(block)
+            yield Interrupted()
+
+    monkeypatch.setattr(browser.FTPFS, "open", flaky_open)
+    monkeypatch.setattr(browser, "UPLOAD_RETRY_DELAY", 0.1)
+
+
+@pytest.fixture
+def upload(queue, ftp_server, tmp_path):
+    LoggingHandler.commands = []
+    root = tmp_path / "server"
+    root.mkdir()
+    local = tmp_path / "upload.bin"
+    local.write_bytes(os.urandom(6 * MB))
+    port = ftp_server(str(root), LoggingHandler)
+
+    def run():
+        job = run_job(queue, port, "upload", "/upload.bin", str(local))
+        assert job["state"] == "completed", job["error"]
+        assert (root / "upload.bin").read_bytes() == local.read_bytes()
+        return LoggingHandler.commands
+    return run
+
+
+def test_interrupted_upload_resumes_with_rest(upload, monkeypatch):
+    interrupt_uploads(monkeypatch, 1, 2 * MB)
+    assert upload() == ["STOR", "REST", "STOR"]
+
+
+def test_interrupted_upload_resumes_with_appe_without_rest(upload, monkeypatch):
+    interrupt_uploads(monkeypatch, 2, MB)
+    probe_features = browser.ReconnectingFTP.probe_features
+
+    def without_rest(self):
+        probe_features(self)
+        self.features.discard("REST")
+
+    monkeypatch.setattr(browser.ReconnectingFTP, "probe_features", without_rest)
+    assert upload() == ["STOR", "APPE", "APPE"]
+
+
+def test_upload_gives_up_after_the_retries(queue, ftp_server, tmp_path, monkeypatch):
+    interrupt_uploads(monkeypatch, browser.UPLOAD_RETRIES + 1, 100000)
+    monkeypatch.setattr(browser, "UPLOAD_RETRY_DELAY", 0.01)
+    (tmp_path / "server").mkdir()
+    local = tmp_path / "upload.bin"
+    local.write_bytes(os.urandom(2 * MB))
+    job = run_job(queue, ftp_server(str(tmp_path / "server")), "upload", "/upload.bin", str(local))
+    assert job["state"] == "failed"
+    assert "connection reset" in job["error"]